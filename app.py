@@ -1,9 +1,9 @@
 import streamlit as st
 from utils.auth import login_form, check_authentication, logout
-from utils.database import init_database, get_week_data, get_all_playbook_rules, get_current_week_range
+from utils.database import (init_database, get_all_playbook_rules, get_current_week_range,
+                            get_current_week_rollup)
+from utils.charts import get_week_figure
 from datetime import datetime
-import pandas as pd
-import json
 
 st.set_page_config(
     page_title="Mind Balance",
@@ -390,8 +390,8 @@ else:
     </div>
     """, unsafe_allow_html=True)
 
-    # Lấy data tuần HIỆN TẠI — get_week_data đã filter theo tuần rồi
-    df_week = get_week_data(st.session_state.username)
+    # Số liệu tuần HIỆN TẠI lấy từ bảng tổng hợp (1 lần tra), data từng ngày chỉ tải khi vẽ biểu đồ
+    week_summary = get_current_week_rollup(st.session_state.username)
 
     df_playbook = get_all_playbook_rules(st.session_state.username)
 
@@ -407,13 +407,12 @@ else:
     # KPIs
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        days_tracked = len(df_week)
+        days_tracked = week_summary['checkin_count']
         st.metric("📅 Ngày đã theo dõi", f"{days_tracked}/7")
     with col2:
         if days_tracked > 0:
-            energy_series = pd.to_numeric(df_week['energy_level'], errors='coerce')
-            avg_energy = energy_series.mean()
-            if pd.isna(avg_energy):
+            avg_energy = week_summary['avg_energy']
+            if avg_energy is None:
                 st.metric("⚡ Năng lượng TB", "—/10")
             else:
                 st.metric("⚡ Năng lượng TB", f"{avg_energy:.1f}/10")
@@ -425,15 +424,7 @@ else:
         st.metric("📚 Playbook Rules", f"{verified_count} verified")
     with col4:
         if days_tracked > 0:
-            def _count_tasks(x):
-                if isinstance(x, list):
-                    return len(x)
-                try:
-                    return len(json.loads(x))
-                except Exception:
-                    return 0
-            total_tasks = sum(df_week['tasks'].apply(_count_tasks))
-            st.metric("📋 Tổng công việc", total_tasks)
+            st.metric("📋 Tổng công việc", week_summary['task_total'])
         else:
             st.metric("📋 Tổng công việc", "—")
 
@@ -479,9 +470,9 @@ else:
 
         with tab1:
             if days_tracked >= 3:
-                from utils.charts import create_energy_trend
-                fig = create_energy_trend(df_week)
-                st.plotly_chart(fig, use_container_width=True)
+                fig = get_week_figure(st.session_state.username, "energy_trend")
+                if fig is not None:
+                    st.plotly_chart(fig, use_container_width=True)
                 st.info(f"Bạn đã check-in {days_tracked} ngày tuần này. {'✅ Tuyệt vời!' if days_tracked >= 6 else '💪 Hãy tiếp tục!'}")
             else:
                 st.warning(f"Cần ít nhất 3 ngày để hiển thị biểu đồ. Bạn đang có {days_tracked}/3 ngày.")
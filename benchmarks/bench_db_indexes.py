@@ -0,0 +1,177 @@
+"""
+Benchmark: thời gian các query tra cứu theo user khi bảng lớn dần.
+
+Tạo 1 schema tạm, chạy migration vào đó, bơm dữ liệu giả tới từng mốc số
+dòng (mặc định 10k → 100k → 1M mỗi bảng) và đo p50/p95 của đúng các câu
+query mà utils/database.py dùng. Có index thì thời gian gần như phẳng;
+chạy thêm --no-index để so sánh với sequential scan.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_db_indexes
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_db_indexes --sizes 10000 1000000 --no-index
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+import psycopg2
+import psycopg2.extras
+
+from utils.migrations import MIGRATIONS, run_migrations
+
+SCHEMA = "bench_indexes"
+ROWS_PER_USER = 50
+
+# Giữ đúng câu query của utils/database.py
+QUERIES = {
+    'get_task_metadata': (
+        "SELECT * FROM task_metadata WHERE username = %s AND checkin_date = %s ORDER BY id",
+        lambda user, day: (user, day),
+    ),
+    'get_fixed_schedule': (
+        "SELECT * FROM fixed_schedules WHERE username = %s AND checkin_date = %s ORDER BY start_time",
+        lambda user, day: (user, day),
+    ),
+    'get_weekly_history': (
+        "SELECT * FROM weekly_history WHERE username = %s ORDER BY created_at DESC LIMIT %s",
+        lambda user, day: (user, 8),
+    ),
+    'get_improvement_notes': (
+        "SELECT * FROM improvement_notes WHERE username = %s ORDER BY created_at DESC",
+        lambda user, day: (user,),
+    ),
+    'get_all_playbook_rules': (
+        "SELECT * FROM playbook WHERE username = %s ORDER BY created_at DESC",
+        lambda user, day: (user,),
+    ),
+}
+
+# Dòng thứ g thuộc user g % n_users, ngày tăng dần theo g // n_users
+FILL = {
+    'task_metadata': """
+        INSERT INTO task_metadata (username, checkin_date, task_name, estimated_time, priority, task_type)
+        SELECT 'user_' || (g %% %(users)s),
+               to_char(DATE '2024-01-01' + (g / %(users)s)::int, 'YYYY-MM-DD'),
+               'Task ' || g, 30 + g %% 4 * 15, 'Cao', 'Học sâu'
+        FROM generate_series(%(start)s, %(stop)s) AS g
+    """,
+    'fixed_schedules': """
+        INSERT INTO fixed_schedules (username, checkin_date, schedule_name, start_time, end_time)
+        SELECT 'user_' || (g %% %(users)s),
+               to_char(DATE '2024-01-01' + (g / %(users)s)::int, 'YYYY-MM-DD'),
+               'Học trên lớp', '07:00', '11:30'
+        FROM generate_series(%(start)s, %(stop)s) AS g
+    """,
+    'weekly_history': """
+        INSERT INTO weekly_history (username, week_start, week_end, total_checkins, avg_energy, data_json, created_at)
+        SELECT 'user_' || (g %% %(users)s),
+               to_char(DATE '2024-01-01' + (g / %(users)s)::int * 7, 'YYYY-MM-DD'),
+               to_char(DATE '2024-01-07' + (g / %(users)s)::int * 7, 'YYYY-MM-DD'),
+               7, 6.5, '[]', TIMESTAMP '2024-01-01' + g * INTERVAL '1 second'
+        FROM generate_series(%(start)s, %(stop)s) AS g
+    """,
+    'improvement_notes': """
+        INSERT INTO improvement_notes (username, week_start, note_content, note_type, created_at)
+        SELECT 'user_' || (g %% %(users)s),
+               to_char(DATE '2024-01-01' + (g / %(users)s)::int * 7, 'YYYY-MM-DD'),
+               'Ngủ đủ 7 tiếng', 'Tuần sau', TIMESTAMP '2024-01-01' + g * INTERVAL '1 second'
+        FROM generate_series(%(start)s, %(stop)s) AS g
+    """,
+    'playbook': """
+        INSERT INTO playbook (username, rule_title, trigger, action, tested_week, result, status, created_at)
+        SELECT 'user_' || (g %% %(users)s), 'Rule ' || g, 'Khi mệt', 'Làm việc nhẹ',
+               '2024-01-01', 'OK', 'Đang thử', TIMESTAMP '2024-01-01' + g * INTERVAL '1 second'
+        FROM generate_series(%(start)s, %(stop)s) AS g
+    """,
+}
+
+
+def _connect(dsn):
+    conn = psycopg2.connect(dsn, cursor_factory=psycopg2.extras.RealDictCursor)
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+    conn.commit()
+    cur.close()
+    return conn
+
+
+def _drop_indexes(conn):
+    """Bỏ các index của migration 2 để đo trường hợp không có index"""
+    cur = conn.cursor()
+    for version, _, statements in MIGRATIONS:
+        if version != 2:
+            continue
+        for statement in statements:
+            name = statement.split("IF NOT EXISTS")[1].split()[0]
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+    cur.close()
+
+
+def _grow(conn, current, target, n_users):
+    cur = conn.cursor()
+    for sql in FILL.values():
+        cur.execute(sql, {'users': n_users, 'start': current, 'stop': target - 1})
+    cur.execute("ANALYZE")
+    conn.commit()
+    cur.close()
+
+
+def _time_query(conn, sql, params_fn, n_users, n_days, repeat):
+    cur = conn.cursor()
+    timings = []
+    for _ in range(repeat):
+        user = f"user_{random.randrange(n_users)}"
+        day = f"2024-01-{random.randrange(min(n_days, 28)) + 1:02d}"
+        start = time.perf_counter()
+        cur.execute(sql, params_fn(user, day))
+        cur.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    conn.rollback()
+    cur.close()
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Số dòng mỗi bảng ở từng mốc")
+    parser.add_argument("--repeat", type=int, default=200, help="Số lần chạy mỗi query ở mỗi mốc")
+    parser.add_argument("--no-index", action="store_true", help="Bỏ index để so sánh")
+    parser.add_argument("--keep", action="store_true", help="Giữ lại schema benchmark sau khi chạy")
+    args = parser.parse_args(argv)
+
+    dsn = os.environ["DATABASE_URL"]
+    random.seed(42)
+    conn = _connect(dsn)
+    try:
+        run_migrations(conn)
+        if args.no_index:
+            _drop_indexes(conn)
+
+        print(f"{'rows':>10} {'query':<24} {'p50 ms':>9} {'p95 ms':>9}")
+        current = 0
+        for size in sorted(args.sizes):
+            n_users = max(1, size // ROWS_PER_USER)
+            _grow(conn, current, size, n_users)
+            current = size
+            n_days = max(1, size // n_users)
+            for name, (sql, params_fn) in QUERIES.items():
+                p50, p95 = _time_query(conn, sql, params_fn, n_users, n_days, args.repeat)
+                print(f"{size:>10} {name:<24} {p50:>9.3f} {p95:>9.3f}")
+    finally:
+        if not args.keep:
+            cur = conn.cursor()
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+            cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
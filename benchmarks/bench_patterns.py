@@ -0,0 +1,69 @@
+"""
+Benchmark: phát hiện pattern cho nhiều user (chạy hàng đêm).
+
+Sinh dữ liệu giả dạng dài (mặc định 100k user × 7 ngày), đo thời gian
+detect_patterns_batch trên toàn bộ, và so với cách cũ — gọi detect_patterns
+từng user — trên 1 mẫu user rồi suy ra cho toàn bộ. Kết quả của mẫu được
+đối chiếu giữa 2 cách để chắc chắn batch tính đúng.
+
+    python -m benchmarks.bench_patterns
+    python -m benchmarks.bench_patterns --users 10000 --days 7 --sample 500
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.pattern_detector import detect_patterns, detect_patterns_batch, to_patterns
+
+
+def _make_checkins(n_users, n_days, seed):
+    rng = np.random.default_rng(seed)
+    n = n_users * n_days
+    dates = pd.date_range("2026-01-05", periods=n_days).strftime("%Y-%m-%d")
+    return pd.DataFrame({
+        'username': np.repeat([f"user_{i}" for i in range(n_users)], n_days),
+        'date': np.tile(dates, n_users),
+        'energy_level': rng.integers(1, 11, n),
+        'sleep_quality': rng.integers(1, 6, n),
+        'task_count': rng.integers(0, 10, n),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000, help="Số user")
+    parser.add_argument("--days", type=int, default=7, help="Số check-in mỗi user")
+    parser.add_argument("--sample", type=int, default=1_000, help="Số user chạy theo cách cũ để so sánh")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    df = _make_checkins(args.users, args.days, args.seed)
+    print(f"{len(df):,} check-in của {args.users:,} user")
+
+    start = time.perf_counter()
+    findings = detect_patterns_batch(df)
+    batch_s = time.perf_counter() - start
+    print(f"batch:     {batch_s:8.2f} s  ({len(findings):,} phát hiện)")
+
+    sample = df[df['username'].isin([f"user_{i}" for i in range(min(args.sample, args.users))])]
+    groups = [group for _, group in sample.groupby('username', sort=False)]
+    start = time.perf_counter()
+    per_user = [detect_patterns(group) for group in groups]
+    loop_s = (time.perf_counter() - start) * args.users / len(groups)
+    print(f"từng user: {loop_s:8.2f} s  (ước tính từ {len(groups):,} user)")
+    print(f"nhanh hơn: {loop_s / batch_s:8.1f}x")
+
+    # Đối chiếu: kết quả batch của từng user trong mẫu phải giống hệt cách cũ
+    by_user = dict(tuple(findings.groupby('username', sort=False)))
+    empty = findings.iloc[0:0]
+    for group, patterns in zip(groups, per_user):
+        user = group['username'].iloc[0]
+        assert to_patterns(by_user.get(user, empty)) == patterns, user
+    print("✅ Kết quả mẫu khớp với detect_patterns")
+
+
+if __name__ == "__main__":
+    main()
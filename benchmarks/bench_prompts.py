@@ -0,0 +1,196 @@
+"""
+Benchmark: chi phí dựng 1 prompt (utils.prompt_builder).
+
+Sinh dữ liệu check-in giả có seed rồi đo p50/p99 thời gian dựng:
+- prompt tuần (build_weekly_prompt) với 7 → 365 ngày dữ liệu
+- prompt nhiều tuần có ngân sách (build_history_prompt) trên cùng lịch sử: chỉ
+  các ngày gần nhất vừa ngân sách + tổng theo tuần (như weekly_rollups), nên
+  độ dài (cột chars) đi theo --budget chứ không theo số ngày
+- prompt hàng ngày (build_daily_framework_prompt_with_schedule) cho đủ 7 thứ,
+  kèm lịch cố định và danh sách việc cỡ vừa
+
+Kết quả ghi ra JSON để so giữa các commit:
+
+    python -m benchmarks.bench_prompts --output bench_prompts.json
+    python -m benchmarks.bench_prompts --days 7 30 365 --repeat 500 --compare bench_prompts.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.pattern_detector import detect_patterns
+from utils.prompt_builder import (
+    HISTORY_MAX_CHARS, build_daily_framework_prompt_with_schedule, build_history_prompt,
+    build_weekly_prompt, history_detail_days,
+)
+
+MENTAL_LOADS = ("Nhẹ nhàng", "Bình thường", "Nặng", "Cực nặng")      # điểm áp lực 1 → 4
+PRESSURES = ("Bài tập", "Thi cử", "Gia đình", "Làm thêm", "Không có")
+FEELINGS = ("Ổn", "Hơi nhiều", "Ngợp")
+FIXED_SCHEDULE = [
+    {'start': '07:00', 'end': '11:30', 'name': 'Học trên lớp'},
+    {'start': '13:30', 'end': '16:30', 'name': 'Học chiều'},
+    {'start': '18:00', 'end': '21:00', 'name': 'Làm thêm'},
+]
+
+
+def make_checkins(n_days, seed):
+    """n_days check-in liên tiếp của 1 user (cột như get_checkins_history)"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'date': pd.date_range("2026-01-05", periods=n_days).strftime("%Y-%m-%d"),
+        'mental_load': rng.choice(MENTAL_LOADS, n_days),
+        'energy_level': rng.integers(1, 11, n_days),
+        'pressure_source': rng.choice(PRESSURES, n_days),
+        'sleep_quality': rng.integers(1, 6, n_days),
+        'task_count': rng.integers(0, 10, n_days),
+        'task_feeling': rng.choice(FEELINGS, n_days),
+    })
+
+
+def make_rollups(df):
+    """Các dòng weekly_rollups tương ứng (cột tổng theo tuần bắt đầu thứ 2)"""
+    dates = pd.to_datetime(df['date'])
+    frame = df.assign(week_start=(dates - pd.to_timedelta(dates.dt.weekday, unit='D')).dt.strftime("%Y-%m-%d"),
+                      mental_score=df['mental_load'].map({label: i + 1 for i, label in enumerate(MENTAL_LOADS)}))
+    groups = frame.groupby('week_start')
+    return pd.DataFrame({
+        'checkin_count': groups.size(),
+        'energy_sum': groups['energy_level'].sum(), 'energy_count': groups['energy_level'].count(),
+        'sleep_sum': groups['sleep_quality'].sum(), 'sleep_count': groups['sleep_quality'].count(),
+        'task_sum': groups['task_count'].sum(),
+        'mental_load_sum': groups['mental_score'].sum(), 'mental_load_count': groups['mental_score'].count(),
+    }).reset_index().to_dict('records')
+
+
+def recent_weeks(df, max_chars):
+    """Các ngày gần nhất cần cho build_history_prompt: trọn tuần, vừa ngân sách (như get_history_prompt)"""
+    dates = pd.to_datetime(df['date'])
+    oldest = dates.iloc[-1] - pd.Timedelta(days=history_detail_days(max_chars))
+    return df[dates >= oldest - pd.Timedelta(days=oldest.weekday())]
+
+
+def make_daily_inputs(n_tasks, seed):
+    """1 ngày cho mỗi thứ trong tuần: (date, data) như trang Nhập liệu gửi vào"""
+    rng = np.random.default_rng(seed)
+    inputs = []
+    for date in pd.date_range("2026-01-05", periods=7).strftime("%Y-%m-%d"):
+        tasks_meta = [{
+            'task_name': f"Việc {i}",
+            'estimated_time': int(rng.choice([15, 30, 45, 60, 90, 120])),
+            'priority': str(rng.choice(("Cao", "Trung bình", "Thấp"))),
+            'task_type': str(rng.choice(("Học sâu", "Công việc nhẹ", "Họp/Gặp mặt"))),
+        } for i in range(n_tasks)]
+        inputs.append((date, {
+            'tasks': [task['task_name'] for task in tasks_meta],
+            'tasks_meta': tasks_meta,
+            'fixed_schedule': FIXED_SCHEDULE[:int(rng.integers(0, len(FIXED_SCHEDULE) + 1))],
+            'energy_level': int(rng.integers(1, 11)),
+            'mental_load': str(rng.choice(MENTAL_LOADS)),
+        }))
+    return inputs
+
+
+def _timings_ms(fn, calls, repeat):
+    """p50/p99 (ms) của 1 lần gọi; mỗi lượt chạy hết `calls` rồi chia đều"""
+    for call in calls:
+        fn(*call)   # làm nóng
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for call in calls:
+            fn(*call)
+        timings.append((time.perf_counter() - start) * 1000 / len(calls))
+    timings.sort()
+    return (round(timings[len(timings) // 2], 4),
+            round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 4))
+
+
+def run(days, repeat, n_tasks, seed, budget=HISTORY_MAX_CHARS):
+    rows = []
+    for n_days in days:
+        df = make_checkins(n_days, seed)
+        patterns = detect_patterns(df)
+        p50, p99 = _timings_ms(build_weekly_prompt, [(df, patterns)], repeat)
+        rows.append({'prompt': 'weekly', 'size': n_days, 'p50_ms': p50, 'p99_ms': p99,
+                     'chars': len(build_weekly_prompt(df, patterns))})
+
+    for n_days in days:
+        df = make_checkins(n_days, seed)
+        rollups = make_rollups(df)
+        recent = recent_weeks(df, budget)
+        call = (recent, rollups, detect_patterns(recent), budget)
+        p50, p99 = _timings_ms(build_history_prompt, [call], repeat)
+        rows.append({'prompt': 'history', 'size': n_days, 'p50_ms': p50, 'p99_ms': p99,
+                     'chars': len(build_history_prompt(*call))})
+
+    inputs = make_daily_inputs(n_tasks, seed)
+    calls = [(date, data, "") for date, data in inputs]
+    p50, p99 = _timings_ms(build_daily_framework_prompt_with_schedule, calls, repeat)
+    rows.append({'prompt': 'daily', 'size': n_tasks, 'p50_ms': p50, 'p99_ms': p99,
+                 'chars': round(sum(len(build_daily_framework_prompt_with_schedule(*call)) for call in calls)
+                                / len(calls))})
+    return rows
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_rows(rows, previous=None):
+    before = {(row['prompt'], row['size']): row for row in (previous or {}).get('timing', [])}
+    print(f"{'prompt':<8} {'size':>5} {'p50 ms':>9} {'p99 ms':>9} {'chars':>8}"
+          + ("   so với trước" if before else ""))
+    for row in rows:
+        line = f"{row['prompt']:<8} {row['size']:>5} {row['p50_ms']:>9.4f} {row['p99_ms']:>9.4f} {row['chars']:>8}"
+        old = before.get((row['prompt'], row['size']))
+        if old:
+            line += f"   p50 ×{row['p50_ms'] / old['p50_ms']:.2f}  p99 ×{row['p99_ms'] / old['p99_ms']:.2f}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 30, 90, 180, 365],
+                        help="Số ngày dữ liệu của prompt tuần ở từng mốc")
+    parser.add_argument("--tasks", type=int, default=8, help="Số việc trong prompt hàng ngày")
+    parser.add_argument("--budget", type=int, default=HISTORY_MAX_CHARS, help="Ngân sách ký tự của prompt nhiều tuần")
+    parser.add_argument("--repeat", type=int, default=200, help="Số lượt đo ở mỗi mốc")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--compare", help="File JSON của lần chạy trước để so sánh")
+    args = parser.parse_args(argv)
+
+    rows = run(args.days, args.repeat, args.tasks, args.seed, args.budget)
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    _print_rows(rows, previous)
+
+    if args.output:
+        report = {
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'budget': args.budget,
+            'timing': rows,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Đã ghi {args.output}")
+
+
+if __name__ == "__main__":
+    main()
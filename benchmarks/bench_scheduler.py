@@ -0,0 +1,397 @@
+"""
+Benchmark + kiểm tra tính chất của scheduler (create_daily_schedule).
+
+Sinh ngày giả có seed (việc đủ loại/ưu tiên/thời lượng, lịch cố định kiểu
+đi học, đi làm thêm, ngủ qua nửa đêm...) rồi:
+
+1. Kiểm tra tính chất trên nhiều ngày ngẫu nhiên, cả 2 mode: không chồng
+   lấn (giữa các dòng và với khối cố định), nằm trong work_start/work_end,
+   không vượt ngân sách chống burn out, học sâu ≥ 60 phút không nối thẳng
+   vào việc khác, không xếp quá thời lượng ước tính của việc — cho cả
+   create_daily_schedule lẫn ScheduleSession sau mỗi bước của 1 chuỗi sửa
+   ngẫu nhiên (thêm/bớt/đổi thời lượng/xong việc, thêm/bỏ khối cố định);
+   simulate_day với năng lượng dự đoán từ hồ sơ khớp create_daily_schedule
+2. Đo p50/p99 thời gian và bộ nhớ cấp phát đỉnh với 5 → 500 việc/ngày, kèm
+   chất lượng lịch (tỉ lệ phút × trọng số ưu tiên được xếp, mức dùng ngân sách)
+
+Kết quả ghi ra JSON để so giữa các commit:
+
+    python -m benchmarks.bench_scheduler --output bench_scheduler.json
+    python -m benchmarks.bench_scheduler --sizes 5 50 500 --repeat 100 --compare bench_scheduler.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from datetime import date, timedelta
+
+from utils.energy_profile import EnergyProfile
+from utils.intervals import MINUTES_PER_DAY, clock_range, daily_occurrences, format_hhmm
+from utils.schedule_session import ScheduleSession
+from utils.scheduler import (
+    DEEP_BREAK_AFTER, PRIORITY_WEIGHTS, _normalize_block, _normalize_task,
+    _prepare_day, create_daily_schedule,
+)
+from utils.what_if import simulate_day
+
+MODES = ("greedy", "optimal")
+TASK_TYPES = (('Học sâu', 4), ('Công việc nhẹ', 4), ('Họp/Gặp mặt', 2))
+PRIORITIES = (('Cao', 25), ('Trung bình', 45), ('Thấp', 30))
+ESTIMATES = ((15, 2), (20, 2), (30, 5), (45, 4), (60, 5), (90, 3), (120, 2), (180, 1))
+FRAMEWORKS = ("", "Eisenhower", "Giao việc", "Năng lượng", "Chủ nhật")
+
+# (tên, giờ bắt đầu, giờ kết thúc, xác suất có trong ngày)
+FIXED_BLOCKS = (
+    ('Học trên lớp', '07:00', '11:30', 0.5),
+    ('Học chiều', '13:30', '16:30', 0.3),
+    ('Làm thêm', '18:00', '21:00', 0.25),
+    ('Ngủ', '23:00', '06:00', 0.3),
+    ('Tập gym', '17:00', '18:00', 0.2),
+)
+
+
+def _pick(rng, weighted):
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+
+def make_task(rng, name):
+    return {
+        'task_name': name,
+        'estimated_time': _pick(rng, ESTIMATES),
+        'priority': _pick(rng, PRIORITIES),
+        'task_type': _pick(rng, TASK_TYPES),
+    }
+
+
+def make_appointment(rng, name, earliest=6 * 60):
+    start = rng.randrange(earliest, 21 * 60, 15)
+    return {'schedule_name': name, 'start_time': format_hhmm(start),
+            'end_time': format_hhmm(start + rng.choice((30, 60, 90, 120)))}
+
+
+def make_day(rng, n_tasks):
+    """1 ngày giả: kwargs cho create_daily_schedule (chưa có mode)"""
+    tasks = [make_task(rng, f"Việc {i}") for i in range(n_tasks)]
+    fixed = [
+        {'schedule_name': name, 'start_time': start, 'end_time': end}
+        for name, start, end, chance in FIXED_BLOCKS if rng.random() < chance
+    ]
+    for i in range(rng.randrange(3)):
+        fixed.append(make_appointment(rng, f"Hẹn {i}"))
+    return {
+        'tasks_with_meta': tasks,
+        'fixed_schedule': fixed,
+        'work_start': format_hhmm(rng.randrange(5 * 60, 8 * 60 + 1, 30)),
+        'work_end': format_hhmm(rng.randrange(20 * 60, 23 * 60 + 31, 30)),
+        'energy_level': rng.randint(1, 10),
+        'today_framework': rng.choice(FRAMEWORKS),
+    }
+
+
+def make_profile(rng, days=60):
+    """EnergyProfile học từ `days` check-in giả (năng lượng, giấc ngủ, giờ check-in ngẫu nhiên)"""
+    first = date(2026, 1, 5)
+    return EnergyProfile.fit([
+        {'date': (first + timedelta(days=i)).isoformat(), 'energy_level': rng.randint(1, 10),
+         'sleep_quality': rng.randint(1, 5), 'hour': rng.randrange(6, 23)}
+        for i in range(days)
+    ])
+
+
+def _entry_minutes(entry, day_start):
+    """Dòng 'HH:MM' → (phút bắt đầu, phút kết thúc) trên khung của ngày (giờ qua nửa đêm +1440)"""
+    start, end = clock_range(entry['start'], entry['end'])
+    if start < day_start:
+        start, end = start + MINUTES_PER_DAY, end + MINUTES_PER_DAY
+    return start, end
+
+
+def check_schedule(day, result, now=None):
+    """Các vi phạm tính chất của 1 lịch (rỗng = đạt); now: phút hiện tại của ScheduleSession —
+    phần đã làm trước đó không tính là vượt ngân sách dù ngân sách sau đó bị thu hẹp"""
+    day_start, day_end = clock_range(day['work_start'], day['work_end'])
+    prepared = _prepare_day(day['tasks_with_meta'], day['fixed_schedule'],
+                            day['work_start'], day['work_end'], day['energy_level'])
+    fixed = sorted(
+        occurrence for block in map(_normalize_block, day['fixed_schedule'])
+        for occurrence in daily_occurrences(*clock_range(block['start'], block['end']))
+    )
+    estimates = {}
+    for task in map(_normalize_task, day['tasks_with_meta']):
+        estimates[task['name']] = estimates.get(task['name'], 0) + task['estimated_time']
+
+    problems = []
+    placed = sorted(
+        ((*_entry_minutes(entry, day_start), entry)
+         for entry in result['schedule'] if entry['type'] != 'Cố định'),
+        key=lambda item: item[:2]
+    )
+    worked = {}
+    done = 0
+    for k, (start, end, entry) in enumerate(placed):
+        label = f"{entry['task']} {entry['start']}-{entry['end']}"
+        if not day_start <= start < end <= day_end:
+            problems.append(f"ngoài khung làm việc: {label}")
+        if k and start < placed[k - 1][1]:
+            problems.append(f"chồng lấn: {placed[k - 1][2]['task']} / {label}")
+        if any(s < end and start < e for s, e in fixed):
+            problems.append(f"đè lên lịch cố định: {label}")
+        if entry['type'] == 'Nghỉ':
+            continue
+        worked[entry['task']] = worked.get(entry['task'], 0) + end - start
+        if now is not None and end <= now:
+            done += end - start
+        after = placed[k + 1] if k + 1 < len(placed) else None
+        if (entry['type'] == 'Học sâu' and end - start >= DEEP_BREAK_AFTER
+                and after and after[0] == end and after[2]['type'] != 'Nghỉ'):
+            problems.append(f"học sâu {end - start}' không nghỉ: {label}")
+
+    total = sum(worked.values())
+    if total != result['stats']['actual_work_time']:
+        problems.append(f"stats lệch: {total}' trên lịch vs actual_work_time {result['stats']['actual_work_time']}'")
+    if total > max(prepared['max_work_time'], done):
+        problems.append(f"vượt ngân sách chống burn out: {total}' > {prepared['max_work_time']}'")
+    for name, minutes in worked.items():
+        if minutes > estimates.get(name, 0):
+            problems.append(f"xếp quá thời lượng: {name} {minutes}' > {estimates.get(name, 0)}'")
+    return problems
+
+
+def check_what_if(day, mode, profile):
+    """simulate_day với energy_level=None (năng lượng dự đoán từ hồ sơ) phải khớp từng dòng với
+    create_daily_schedule trên đầu vào đã đổi của kịch bản đó"""
+    names = [task['name'] for task in map(_normalize_task, day['tasks_with_meta'])]
+    scenarios = [
+        {'name': 'Dự đoán', 'energy_level': None},
+        {'name': 'Năng lượng 2', 'energy_level': 2},
+        {'name': 'Bỏ việc đầu', 'drop_tasks': names[:1]},
+    ]
+    base = dict(day, energy_level=None, energy_profile=profile)
+    del base['today_framework']
+    try:
+        table = simulate_day(**base, scenarios=scenarios, mode=mode)
+    except Exception as e:
+        return [f"simulate_day lỗi: {type(e).__name__}: {e}"]
+
+    problems = []
+    for scenario, row in zip([{}] + scenarios, table.to_dict('records')):
+        dropped = set(scenario.get('drop_tasks') or ())
+        tasks = [task for task in day['tasks_with_meta'] if _normalize_task(task)['name'] not in dropped]
+        expected = create_daily_schedule(**dict(base, tasks_with_meta=tasks, energy_level=scenario.get('energy_level')),
+                                         mode=mode, use_cache=False)['stats']
+        for column in ('actual_work_time', 'scheduled_tasks', 'unscheduled_tasks', 'breaks_count'):
+            if row[column] != expected[column]:
+                problems.append(f"what-if '{row['scenario']}' lệch {column}: {row[column]} vs {expected[column]}")
+    return problems
+
+
+def plan_quality(day, result):
+    """(tỉ lệ phút × trọng số ưu tiên được xếp, tỉ lệ ngân sách đã dùng)"""
+    tasks = list(map(_normalize_task, day['tasks_with_meta']))
+    weight = {task['name']: PRIORITY_WEIGHTS.get(task['priority'], 1) for task in tasks}
+    requested = sum(weight[task['name']] * task['estimated_time'] for task in tasks)
+    day_start = clock_range(day['work_start'], day['work_end'])[0]
+    placed = 0
+    for entry in result['schedule']:
+        if entry['type'] not in ('Cố định', 'Nghỉ'):
+            start, end = _entry_minutes(entry, day_start)
+            placed += weight.get(entry['task'], 1) * (end - start)
+    budget = _prepare_day([], day['fixed_schedule'], day['work_start'], day['work_end'],
+                          day['energy_level'])['max_work_time']
+    return (placed / requested if requested else 1.0,
+            result['stats']['actual_work_time'] / budget if budget else 1.0)
+
+
+def edit_session(rng, day, mode, steps):
+    """Chuỗi `steps` thao tác ngẫu nhiên trên ScheduleSession của `day`; sau mỗi bước yield
+    (tên thao tác, ngày tương ứng để check_schedule, lịch hiện tại, phút hiện tại).
+    Chỉ sửa như người dùng thật: thêm hẹn sau `now`, đổi thời lượng việc chưa bắt đầu"""
+    session = ScheduleSession(day['tasks_with_meta'], day['fixed_schedule'], day['work_start'],
+                              day['work_end'], day['energy_level'], day['today_framework'], mode)
+    # Việc bị bỏ vẫn giữ trong tasks: phần đã làm trước `now` còn trên lịch
+    tasks = {task['task_name']: dict(task) for task in day['tasks_with_meta']}
+    fixed = {block['schedule_name']: block for block in day['fixed_schedule']}
+    active = list(tasks)
+    day_start, day_end = clock_range(day['work_start'], day['work_end'])
+    now = day_start
+    result = session.result()
+    for step in range(steps):
+        started = {entry['task'] for entry in result['schedule']
+                   if entry['type'] != 'Cố định' and _entry_minutes(entry, day_start)[0] < now}
+        pending = [name for name in active if name not in started]
+        action = rng.choice(('add', 'remove', 'resize', 'complete', 'add_fixed', 'remove_fixed'))
+        if action == 'resize' and not pending or action == 'add_fixed' and now > 20 * 60:
+            continue
+        if action == 'add' or not active and action in ('remove', 'resize', 'complete'):
+            action = 'add'
+            task = make_task(rng, f"Thêm {step}")
+            tasks[task['task_name']] = task
+            active.append(task['task_name'])
+            session.add_task(task)
+        elif action == 'remove':
+            name = active.pop(rng.randrange(len(active)))
+            session.remove_task(name)
+        elif action == 'resize':
+            name = rng.choice(pending)
+            tasks[name]['estimated_time'] = _pick(rng, ESTIMATES)
+            session.resize_task(name, tasks[name]['estimated_time'])
+        elif action == 'complete':
+            name = active.pop(rng.randrange(len(active)))
+            now = rng.randrange(now, max(now, day_end - 60) + 1)
+            session.complete_task(name, now=format_hhmm(now))
+        elif action == 'add_fixed':
+            block = make_appointment(rng, f"Hẹn thêm {step}", earliest=-(-now // 15) * 15)
+            fixed[block['schedule_name']] = block
+            session.add_fixed_block(block)
+        elif fixed:
+            name = rng.choice(list(fixed))
+            del fixed[name]
+            session.remove_fixed_block(name)
+        else:
+            continue
+        result = session.result()
+        yield action, dict(day, tasks_with_meta=list(tasks.values()), fixed_schedule=list(fixed.values())), \
+            result, now
+
+
+def run_properties(cases, seed, edits=8):
+    """Kiểm tra tính chất trên `cases` ngày ngẫu nhiên × mỗi mode, rồi trên `edits` bước sửa
+    ngẫu nhiên của ScheduleSession bắt đầu từ cùng ngày đó; kèm simulate_day theo 1 hồ sơ năng lượng giả"""
+    rng = random.Random(seed)
+    edit_rng = random.Random(f"{seed}-edits")     # riêng để các ngày kiểm tra không đổi theo `edits`
+    profile_rng = random.Random(f"{seed}-profiles")
+    failures = []
+    for case in range(cases):
+        day = make_day(rng, rng.randint(0, 40))
+        profile = make_profile(profile_rng)
+        for mode in MODES:
+            for problem in check_what_if(day, mode, profile):
+                failures.append({'case': case, 'mode': f"what-if {mode}", 'problem': problem})
+            result = create_daily_schedule(**day, mode=mode, use_cache=False)
+            for problem in check_schedule(day, result):
+                failures.append({'case': case, 'mode': mode, 'problem': problem})
+            for step, (action, edited, result, now) in enumerate(edit_session(edit_rng, day, mode, edits)):
+                for problem in check_schedule(edited, result, now):
+                    failures.append({'case': case, 'mode': f"session {mode}",
+                                     'problem': f"bước {step} ({action}): {problem}"})
+    return failures
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def run_timing(sizes, repeat, seed):
+    """p50/p99 (ms), bộ nhớ đỉnh (KiB) và chất lượng lịch theo số việc × mode"""
+    rows = []
+    for n_tasks in sizes:
+        rng = random.Random(f"{seed}-{n_tasks}")
+        days = [make_day(rng, n_tasks) for _ in range(repeat)]
+        for mode in MODES:
+            create_daily_schedule(**days[0], mode=mode, use_cache=False)   # làm nóng
+            timings = []
+            for day in days:
+                start = time.perf_counter()
+                create_daily_schedule(**day, mode=mode, use_cache=False)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+
+            # Đo bộ nhớ ở lượt riêng: tracemalloc làm chậm đáng kể nên không trộn với đo thời gian
+            peaks, quality, utilization = [], [], []
+            tracemalloc.start()
+            for day in days[:min(repeat, 50)]:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                result = create_daily_schedule(**day, mode=mode, use_cache=False)
+                peaks.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+                q, u = plan_quality(day, result)
+                quality.append(q)
+                utilization.append(u)
+            tracemalloc.stop()
+
+            rows.append({
+                'mode': mode,
+                'tasks': n_tasks,
+                'p50_ms': round(_percentile(timings, 0.50), 4),
+                'p99_ms': round(_percentile(timings, 0.99), 4),
+                'peak_kib': round(statistics.median(peaks), 1),
+                'quality': round(statistics.mean(quality), 4),
+                'budget_used': round(statistics.mean(utilization), 4),
+            })
+    return rows
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_rows(rows, previous=None):
+    before = {(row['mode'], row['tasks']): row for row in (previous or {}).get('timing', [])}
+    print(f"{'mode':<8} {'tasks':>5} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>9} {'quality':>8} {'budget':>7}"
+          + ("   so với trước" if before else ""))
+    for row in rows:
+        line = (f"{row['mode']:<8} {row['tasks']:>5} {row['p50_ms']:>9.3f} {row['p99_ms']:>9.3f} "
+                f"{row['peak_kib']:>9.1f} {row['quality']:>8.3f} {row['budget_used']:>7.3f}")
+        old = before.get((row['mode'], row['tasks']))
+        if old:
+            line += (f"   p50 ×{row['p50_ms'] / old['p50_ms']:.2f}  p99 ×{row['p99_ms'] / old['p99_ms']:.2f}"
+                     f"  quality {row['quality'] - old['quality']:+.3f}")
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 50, 100, 200, 500],
+                        help="Số việc mỗi ngày ở từng mốc")
+    parser.add_argument("--repeat", type=int, default=200, help="Số ngày đo ở mỗi mốc")
+    parser.add_argument("--cases", type=int, default=2000, help="Số ngày ngẫu nhiên kiểm tra tính chất")
+    parser.add_argument("--edits", type=int, default=8, help="Số bước sửa ScheduleSession trên mỗi ngày kiểm tra")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--compare", help="File JSON của lần chạy trước để so sánh")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    failures = run_properties(args.cases, args.seed, args.edits)
+    print(f"tính chất: {args.cases} ngày × {len(MODES)} mode (+ {args.edits} bước sửa phiên), {len(failures)} vi phạm "
+          f"({time.perf_counter() - start:.1f} s)")
+    for failure in failures[:20]:
+        print(f"  ❌ ngày {failure['case']} [{failure['mode']}]: {failure['problem']}")
+
+    rows = run_timing(args.sizes, args.repeat, args.seed)
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    _print_rows(rows, previous)
+
+    report = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'properties': {'cases': args.cases, 'edits': args.edits, 'violations': len(failures), 'examples': failures[:20]},
+        'timing': rows,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Đã ghi {args.output}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
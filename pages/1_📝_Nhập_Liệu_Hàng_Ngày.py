@@ -1,12 +1,10 @@
 import streamlit as st
 from datetime import datetime
-from utils.database import (init_database, save_checkin, get_checkin_today,
-                           save_task_metadata, get_task_metadata,
-                           save_fixed_schedule, get_fixed_schedule,
+from utils.database import (init_database, save_full_checkin, get_checkin_today,
                            get_current_week_range, save_improvement_note)
+from utils.prompts import get_daily_prompt
 from utils.auth import check_authentication
 from utils.ui_components import apply_gradient_theme, show_fox_header
-import json
 import base64
 import streamlit.components.v1 as components
 
@@ -149,10 +147,8 @@ def show_checkin_form():
                     'tasks': [t['name'] for t in tasks_with_meta],
                     'task_feeling': task_feeling
                 }
-                if save_checkin(username, data):
-                    save_task_metadata(username, data['date'], tasks_with_meta)
-                    if fixed_schedule:
-                        save_fixed_schedule(username, data['date'], fixed_schedule)
+                # 1 transaction: check-in + tasks + lịch cố định (không nhập lịch → giữ lịch cũ)
+                if save_full_checkin(username, data, tasks_with_meta, fixed_schedule or None):
                     st.session_state.editing_checkin = False
                     st.session_state.show_prompt = False
                     st.success("✅ Đã lưu!")
@@ -205,7 +201,7 @@ else:
     st.subheader("📸 Tổng quan hôm nay")
 
     # ← TRUY CẬP BẰNG TÊN CỘT (dict), không dùng index số
-    tasks   = json.loads(existing_checkin['tasks'])
+    tasks   = existing_checkin['tasks'] or []   # JSONB → list sẵn
     date    = existing_checkin['date']
     energy  = existing_checkin['energy_level']
 
@@ -220,21 +216,6 @@ else:
         st.metric("Công việc", len(tasks))
         st.metric("Cảm giác", existing_checkin['task_feeling'])
 
-    fixed_df      = get_fixed_schedule(username, date)
-    tasks_meta_df = get_task_metadata(username, date)
-
-    with st.expander("📋 Chi tiết"):
-        if len(fixed_df) > 0:
-            st.markdown("**Lịch cố định:**")
-            for _, row in fixed_df.iterrows():
-                st.write(f"• {row['schedule_name']}: {row['start_time']} - {row['end_time']}")
-        st.markdown("**Công việc:**")
-        for i, task in enumerate(tasks, 1):
-            st.write(f"{i}. {task}")
-
-    st.markdown("---")
-    st.subheader("🤖 Prompt AI")
-
     weekday = datetime.strptime(date, "%Y-%m-%d").strftime("%A")
     framework_names = {
         "Monday":    "Thứ 2 - Xem lại tổng thể",
@@ -247,6 +228,22 @@ else:
     }
     framework_name = framework_names.get(weekday, "Thứ 2 - Xem lại tổng thể")
 
+    # Prompt + lịch cố định đã dựng sẵn: rerun (bấm nút, mở expander) không query lại
+    daily = get_daily_prompt(username, date, framework_name)
+    fixed_schedule = daily['fixed_schedule'] if daily else []
+
+    with st.expander("📋 Chi tiết"):
+        if fixed_schedule:
+            st.markdown("**Lịch cố định:**")
+            for row in fixed_schedule:
+                st.write(f"• {row['schedule_name']}: {row['start_time']} - {row['end_time']}")
+        st.markdown("**Công việc:**")
+        for i, task in enumerate(tasks, 1):
+            st.write(f"{i}. {task}")
+
+    st.markdown("---")
+    st.subheader("🤖 Prompt AI")
+
     col_fw1, col_fw2 = st.columns([3, 1])
     with col_fw1:
         st.info(f"**Phương pháp hôm nay:** {framework_name}")
@@ -256,16 +253,7 @@ else:
             st.session_state.show_science = True
             st.switch_page("app.py")
 
-    from utils.prompt_builder import build_daily_framework_prompt_with_schedule
-
-    data_for_prompt = {
-        'mental_load': existing_checkin['mental_load'],
-        'energy_level': energy,
-        'tasks': tasks,
-        'tasks_meta': tasks_meta_df.to_dict('records') if len(tasks_meta_df) > 0 else [],
-        'fixed_schedule': fixed_df.to_dict('records') if len(fixed_df) > 0 else []
-    }
-    prompt = build_daily_framework_prompt_with_schedule(date, data_for_prompt, framework_name)
+    prompt = daily['prompt'] if daily else "❌ Không tạo được prompt, hãy tải lại trang."
 
     col_p1, col_p2 = st.columns(2)
     with col_p1:
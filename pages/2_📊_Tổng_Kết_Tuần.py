@@ -1,11 +1,18 @@
 import streamlit as st
 from datetime import datetime, timedelta
 from utils.database import (get_week_data, init_database, get_current_week_range,
-                           save_weekly_history, is_new_week, get_weekly_history, save_improvement_note)
+                           save_weekly_history, is_new_week, get_weekly_history, save_improvement_note,
+                           get_week_rollup, get_task_metadata_range, get_fixed_schedule_range,
+                           get_energy_profile)
+from utils.prompts import get_weekly_prompt, get_history_prompt, stream_checkins_prompt
+from utils.charts import get_week_figure
 from utils.auth import check_authentication
 from utils.ui_components import apply_gradient_theme, show_fox_header
-from utils.charts import create_energy_trend, create_task_energy_comparison, create_mood_matrix
+from utils.pattern_detector import detect_week_highlights, render_pattern
+from utils.week_planner import plan_week
 import json
+import os
+import tempfile
 import pandas as pd
 import streamlit.components.v1 as components
 
@@ -44,8 +51,7 @@ if is_new_week(username):
             save_weekly_history(
                 username,
                 last_monday.strftime('%Y-%m-%d'),
-                last_sunday.strftime('%Y-%m-%d'),
-                pd.DataFrame()
+                last_sunday.strftime('%Y-%m-%d')
             )
             st.success("✅ Đã lưu!")
             st.balloons()
@@ -90,24 +96,15 @@ st.success(f"✅ Đủ dữ liệu! ({days_tracked} ngày)")
 df = df.reset_index(drop=True)
 df['energy_level'] = pd.to_numeric(df['energy_level'], errors='coerce')
 df['sleep_quality'] = pd.to_numeric(df['sleep_quality'], errors='coerce')
-avg_energy = df['energy_level'].mean()  # mean() tự bỏ NaN
-
-def _parse_tasks(x):
-    if isinstance(x, list):
-        return len(x)
-    try:
-        return len(json.loads(x))
-    except Exception:
-        return 0
-
-df['task_count'] = df['tasks'].apply(_parse_tasks)
-avg_tasks = df['task_count'].mean()
+df['task_count'] = pd.to_numeric(df['task_count'], errors='coerce').fillna(0)
+# Trung bình lấy từ bảng tổng hợp tuần, không tính lại trên từng dòng
+week_summary = get_week_rollup(username, week_start)
 
 col1, col2, col3 = st.columns(3)
 with col1:
-    st.metric("Năng lượng TB", f"{avg_energy:.1f}/10")
+    st.metric("Năng lượng TB", f"{week_summary['avg_energy'] or 0:.1f}/10")
 with col2:
-    st.metric("Công việc TB", f"{avg_tasks:.1f} việc/ngày")
+    st.metric("Công việc TB", f"{week_summary['avg_tasks'] or 0:.1f} việc/ngày")
 with col3:
     df_valid = df.dropna(subset=['energy_level'])
     if len(df_valid) > 0:
@@ -120,49 +117,82 @@ st.markdown("---")
 
 # BIỂU ĐỒ
 st.subheader("📈 Biểu đồ phân tích tuần")
-chart_tab1, chart_tab2, chart_tab3 = st.tabs([
+chart_tabs = st.tabs([
     "⚡ Xu hướng năng lượng",
     "📋 Công việc vs Năng lượng",
     "🎯 Ma trận áp lực"
 ])
-with chart_tab1:
-    st.plotly_chart(create_energy_trend(df), use_container_width=True)
-with chart_tab2:
-    st.plotly_chart(create_task_energy_comparison(df), use_container_width=True)
-with chart_tab3:
-    st.plotly_chart(create_mood_matrix(df), use_container_width=True)
+# Figure dựng sẵn theo tuần: rerun chỉ gửi lại, không dựng lại từ DataFrame
+for chart_tab, chart in zip(chart_tabs, ("energy_trend", "task_energy", "mood_matrix")):
+    with chart_tab:
+        figure = get_week_figure(username, chart)
+        if figure is None:
+            st.error("❌ Không vẽ được biểu đồ, hãy tải lại trang.")
+        else:
+            st.plotly_chart(figure, use_container_width=True)
 
 st.markdown("---")
 
 # PATTERNS
 st.subheader("⚠️ Quy luật phát hiện")
-patterns = []
-df_valid2 = df.dropna(subset=['energy_level'])
-if len(df_valid2) > 0:
-    worst_day = df_valid2.loc[df_valid2['energy_level'].idxmin()]
-    if worst_day['energy_level'] < 5:
-        patterns.append(f"⚠️ {worst_day['date']} là ngày thấp nhất ({worst_day['energy_level']}/10)")
-low_sleep = df[df['sleep_quality'] <= 2]
-if len(low_sleep) > 0:
-    patterns.append(f"😴 {len(low_sleep)} ngày ngủ kém → Ảnh hưởng năng lượng")
-high_tasks = df[df['task_count'] >= 8]
-if len(high_tasks) > 0:
-    patterns.append(f"📋 {len(high_tasks)} ngày quá nhiều việc (≥8 việc)")
-
+patterns = detect_week_highlights(df)
 if patterns:
     for p in patterns:
-        st.markdown(f"- {p}")
+        st.markdown(f"- {render_pattern(p)}")
 else:
     st.info("✅ Không có quy luật tiêu cực!")
 
 st.markdown("---")
 
+# KẾ HOẠCH CÁC NGÀY CÒN LẠI — rải việc theo hồ sơ năng lượng đã học của user
+st.subheader("🗓️ Kế hoạch các ngày còn lại")
+today = datetime.now().strftime("%Y-%m-%d")
+week_tasks_df = get_task_metadata_range(username, today, week_end)
+if len(week_tasks_df) > 0:
+    week_fixed_df = get_fixed_schedule_range(username, today, week_end)
+    fixed_by_day = {}
+    for block in week_fixed_df.to_dict('records'):
+        fixed_by_day.setdefault(str(block['checkin_date']), []).append(block)
+    days_left = (datetime.strptime(week_end, "%Y-%m-%d") - datetime.strptime(today, "%Y-%m-%d")).days + 1
+    week_plan = plan_week(week_tasks_df.to_dict('records'), fixed_by_day, today,
+                          days=days_left, energy_profile=get_energy_profile(username))
+
+    col_w1, col_w2, col_w3 = st.columns(3)
+    with col_w1:
+        st.metric("Đã xếp", f"{week_plan['stats']['planned_tasks']}/{week_plan['stats']['total_tasks']} việc")
+    with col_w2:
+        work = week_plan['stats']['work_minutes']
+        st.metric("Thời gian làm", f"{work//60}h{work%60}'")
+    with col_w3:
+        budget = week_plan['stats']['budget_minutes']
+        st.metric("Ngưỡng an toàn", f"{budget//60}h{budget%60}'")
+
+    for day in week_plan['days']:
+        result = day['result']
+        with st.expander(f"{day['date']} — năng lượng thường thấy {day['energy']}/10 · {result['stats']['scheduled_tasks']} việc"):
+            for entry in result['schedule']:
+                st.write(f"• {entry['start']} - {entry['end']}: {entry['task']}")
+            for message in result['warnings'] + result['suggestions']:
+                st.caption(message)
+    if week_plan['unplanned']:
+        st.warning(f"⚠️ Tuần này không đủ sức cho: {', '.join(week_plan['unplanned'])}")
+else:
+    st.info("Chưa có công việc nào cho các ngày còn lại của tuần.")
+
+st.markdown("---")
+
 # PROMPT TUẦN
 st.subheader("🤖 Prompt AI tuần")
 st.info(f"💡 Prompt tuần MẠNH HƠN prompt ngày vì có {days_tracked} ngày dữ liệu!")
 
-from utils.prompt_builder import build_weekly_prompt
-weekly_prompt = build_weekly_prompt(df, patterns)
+# Nhiều tuần: ngày gần nhất chi tiết, tuần/tháng cũ hơn tóm tắt — độ dài theo ngân sách, không theo lịch sử
+prompt_scopes = {"Tuần này": None, "4 tuần": 4, "3 tháng": 13, "6 tháng": 26}
+scope = st.radio("Phạm vi dữ liệu:", list(prompt_scopes), horizontal=True, key="weekly_prompt_scope")
+if prompt_scopes[scope] is None:
+    weekly_prompt = get_weekly_prompt(username)
+else:
+    weekly_prompt = get_history_prompt(username, weeks=prompt_scopes[scope])
+weekly_prompt = weekly_prompt or "❌ Không tạo được prompt, hãy tải lại trang."
 
 if 'show_weekly_prompt' not in st.session_state:
     st.session_state.show_weekly_prompt = False
@@ -198,6 +228,38 @@ with col_p2:
 if st.session_state.show_weekly_prompt:
     st.code(weekly_prompt, language="markdown")
 
+# Xuất chi tiết từng ngày của khoảng dài: đọc dần từ database, chỉ tạo khi bấm nút
+with st.expander("📥 Xuất prompt chi tiết nhiều ngày"):
+    col_e1, col_e2 = st.columns(2)
+    with col_e1:
+        export_start = st.date_input("Từ ngày", value=datetime.now().date() - timedelta(days=365), key="export_start")
+    with col_e2:
+        export_end = st.date_input("Đến ngày", value=datetime.now().date(), key="export_end")
+    if st.button("⚙️ Tạo file prompt", use_container_width=True, key="btn_export_prompt"):
+        export_range = (export_start.strftime("%Y-%m-%d"), export_end.strftime("%Y-%m-%d"))
+        # Ghi từng mảnh ra file tạm khi vừa tạo xong; session_state chỉ giữ đường dẫn, không giữ nội dung
+        export_file = tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".md", delete=False)
+        try:
+            with export_file:
+                export_file.writelines(stream_checkins_prompt(username, *export_range))
+        except Exception as e:
+            os.remove(export_file.name)
+            st.error(f"❌ Lỗi tạo file prompt: {e}")
+        else:
+            if 'prompt_export' in st.session_state and os.path.exists(st.session_state.prompt_export[1]):
+                os.remove(st.session_state.prompt_export[1])
+            st.session_state.prompt_export = (export_range, export_file.name)
+    if 'prompt_export' in st.session_state and os.path.exists(st.session_state.prompt_export[1]):
+        (range_start, range_end), export_path = st.session_state.prompt_export
+        with open(export_path, "rb") as export_data:
+            st.download_button(
+                f"💾 Tải prompt {range_start} → {range_end}",
+                data=export_data,
+                file_name=f"prompt_{range_start}_{range_end}.md",
+                mime="text/markdown",
+                use_container_width=True,
+            )
+
 st.markdown("---")
 
 # GHI CHÚ
@@ -0,0 +1,122 @@
+"""
+Cache trong bộ nhớ dùng chung cho cả process: LRU giới hạn số mục + TTL.
+
+Mỗi mục có thể gắn "tag" (vd. (username, 'daily_checkins', '2026-02-16')).
+Khi dữ liệu thay đổi, chỉ cần xóa theo tag là mọi mục phụ thuộc bị loại
+chính xác, không phải xóa cả cache. fingerprint() là khóa nội dung dùng chung
+cho prompt và biểu đồ đã dựng (cached_entry / store_entry).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+def _plain(value):
+    """Số NumPy → số Python, ngày/Timestamp → chuỗi để json.dumps được"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def fingerprint(payload):
+    """SHA-256 của payload (list/dict dạng JSON): cùng dữ liệu → cùng khóa nội dung"""
+    text = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=_plain)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def cached_entry(cache, pointer):
+    """Nội dung đã dựng theo con trỏ (user, ngày/tuần, ...); MISSING nếu chưa có hoặc đã bị hàm lưu xóa"""
+    key = cache.get(pointer)
+    if key is MISSING:
+        return MISSING
+    return cache.get(('content', key))
+
+
+def store_entry(cache, pointer, tags, key, build):
+    """Gắn con trỏ → khóa nội dung `key` (fingerprint); chỉ gọi build() khi nội dung này chưa từng dựng
+    (lưu lại mà không đổi gì thì dùng lại bản cũ)"""
+    entry = cache.get(('content', key))
+    if entry is MISSING:
+        entry = build()
+        cache.set(('content', key), entry)
+    cache.set(pointer, key, tags=tags)
+    return entry
+
+
+class LRUCache:
+    """Cache LRU an toàn đa luồng, có TTL và xóa theo tag"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._data = OrderedDict()     # key -> (value, hết hạn lúc, tags)
+        self._by_tag = {}              # tag -> set(key)
+        self.hits = 0
+        self.misses = 0
+
+    def _remove(self, key):
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def get(self, key, default=MISSING):
+        """Lấy giá trị còn hạn; mục vừa dùng được đẩy lên đầu LRU"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[1] is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, tags=(), ttl=MISSING):
+        """Lưu giá trị; vượt maxsize thì loại mục lâu không dùng nhất"""
+        ttl = self.ttl if ttl is MISSING else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires, tags)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def invalidate_tags(self, *tags):
+        """Xóa mọi mục gắn 1 trong các tag, trả về số mục đã xóa"""
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_tag.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses}
@@ -1,18 +1,11 @@
 import plotly.graph_objects as go
 import pandas as pd
-import json
 
+from utils.cache import MISSING, cached_entry, fingerprint, store_entry
+from utils.database import figure_cache, get_current_week_range, get_week_checkins
 
-def _parse_tasks(x):
-    """Parse tasks an toàn — xử lý cả list và string JSON từ Supabase"""
-    if isinstance(x, list):
-        return len(x)
-    if not x or str(x).strip() in ('', 'None', 'null'):
-        return 0
-    try:
-        return len(json.loads(str(x)))
-    except Exception:
-        return 0
+# Các cột biểu đồ đọc (fingerprint chỉ tính trên các cột này)
+_CHART_COLUMNS = ('date', 'energy_level', 'task_count', 'mental_load')
 
 
 def _safe_numeric(series):
@@ -91,7 +84,7 @@ def create_task_energy_comparison(df):
     if len(df) == 0:
         return go.Figure()
     df['energy_level'] = _safe_numeric(df['energy_level'])
-    df['task_count'] = df['tasks'].apply(_parse_tasks)
+    df['task_count'] = _safe_numeric(df['task_count']).astype(int)
 
     df['date'] = df['date'].astype(str)
     fig = go.Figure()
@@ -246,3 +239,35 @@ def create_mood_matrix(df):
     )
 
     return fig
+
+
+# Tên biểu đồ → hàm dựng (cũng là khóa cache figure của get_week_figure)
+CHARTS = {
+    'energy_trend': create_energy_trend,
+    'task_energy': create_task_energy_comparison,
+    'mood_matrix': create_mood_matrix,
+}
+
+
+def chart_fingerprint(chart, df):
+    """SHA-256 của tên biểu đồ + đúng các cột biểu đồ đọc: cùng dữ liệu → cùng figure"""
+    return fingerprint(['chart', chart, [df[column].tolist() for column in _CHART_COLUMNS if column in df]])
+
+
+def get_week_figure(username, chart):
+    """Biểu đồ `chart` (khóa của CHARTS) của tuần hiện tại; chỉ dựng lại khi lưu check-in của 1 ngày
+    trong tuần (và dữ liệu thật sự đổi). Figure dùng chung giữa các lần render: chỉ đọc, không sửa"""
+    try:
+        week_start, week_end = get_current_week_range()
+        pointer = ('figure', chart, username, week_start)
+        figure = cached_entry(figure_cache, pointer)
+        if figure is MISSING:
+            df = get_week_checkins(username, week_start, week_end)
+            figure = store_entry(
+                figure_cache, pointer, [(username, 'daily_checkins', week_start)], chart_fingerprint(chart, df),
+                lambda: CHARTS[chart](df)
+            )
+        return figure
+    except Exception as e:
+        print(f"Lỗi get_week_figure: {e}")
+        return None
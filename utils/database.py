@@ -1,18 +1,141 @@
 import streamlit as st
-import psycopg2
-import psycopg2.extras
 import pandas as pd
 from datetime import datetime, timedelta
+from contextlib import closing, contextmanager
+import copy
+import functools
+import inspect
 import json
+import os
+import threading
+
+from utils.cache import MISSING, LRUCache
+from utils.db_backends import PostgresBackend, SQLiteBackend
+from utils.energy_profile import OVERALL, EnergyProfile
+from utils.migrations import LATEST_VERSION, get_schema_version, run_migrations
+from utils.scheduler import register_schedule_store
 
 # ===== KẾT NỐI DATABASE =====
 
-def get_connection():
-    """Kết nối tới Supabase PostgreSQL"""
-    return psycopg2.connect(
-        st.secrets["DATABASE_URL"],
-        cursor_factory=psycopg2.extras.RealDictCursor
-    )
+_backend = None
+_backend_lock = threading.Lock()
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _setting(name, default=None):
+    """Đọc cấu hình: ưu tiên biến môi trường, sau đó tới st.secrets"""
+    value = os.environ.get(name)
+    if value is not None:
+        return value
+    try:
+        return st.secrets.get(name, default)
+    except Exception:
+        # Chạy ngoài Streamlit (script, benchmark) có thể không có secrets.toml
+        return default
+
+
+def _create_backend():
+    """DB_BACKEND=postgres (Supabase, mặc định) hoặc sqlite (file nhúng SQLITE_PATH)"""
+    kind = str(_setting("DB_BACKEND", "postgres")).lower()
+    if kind == "sqlite":
+        return SQLiteBackend(
+            _setting("SQLITE_PATH", "data/mind_balance.db"),
+            busy_timeout=float(_setting("SQLITE_BUSY_TIMEOUT", 5))
+        )
+    if kind in ("postgres", "postgresql"):
+        return PostgresBackend(
+            _setting("DATABASE_URL"),
+            minconn=int(_setting("DB_POOL_MIN", 1)),
+            maxconn=int(_setting("DB_POOL_MAX", 10)),
+            idle_timeout=float(_setting("DB_POOL_IDLE_TIMEOUT", 300)),
+            checkout_timeout=float(_setting("DB_POOL_TIMEOUT", 10))
+        )
+    raise ValueError(f"DB_BACKEND không hợp lệ: {kind!r} (chọn 'postgres' hoặc 'sqlite')")
+
+
+def get_backend():
+    """Backend lưu trữ dùng chung cho cả process, tạo 1 lần duy nhất"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+    return _backend
+
+
+@contextmanager
+def db_connection():
+    """Mượn connection của backend: tự commit khi xong, rollback nếu lỗi"""
+    with get_backend().connection() as conn:
+        yield conn
+
+# ===== CACHE ĐỌC THEO USER =====
+
+# Dữ liệu chỉ đổi khi user lưu gì đó → rerun của Streamlit đọc từ bộ nhớ.
+# TTL giới hạn độ cũ khi chạy nhiều process (ghi ở process khác không xóa được cache ở đây).
+_read_cache = LRUCache(
+    maxsize=int(_setting("DB_CACHE_SIZE", 2048)),
+    ttl=float(_setting("DB_CACHE_TTL", 300))
+)
+
+
+# Prompt AI đã dựng (utils/prompts.py qua cached_entry / store_entry của utils/cache.py):
+# (user, ngày, framework) → fingerprint nội dung → prompt. Con trỏ gắn tag
+# như cache đọc nên chỉ hàm lưu mới xóa được; mặc định không hết hạn (PROMPT_CACHE_TTL=0)
+# để rerun (bấm nút, mở expander) không chạm database lẫn template.
+prompt_cache = LRUCache(
+    maxsize=int(_setting("PROMPT_CACHE_SIZE", 1024)),
+    ttl=float(_setting("PROMPT_CACHE_TTL", 0))
+)
+
+# Biểu đồ Plotly đã dựng của tuần: (biểu đồ, user, tuần) → fingerprint dữ liệu → Figure.
+# Cùng cách gắn tag với prompt; trang tổng quan và trang Tổng kết tuần dùng chung 1 figure.
+figure_cache = LRUCache(
+    maxsize=int(_setting("FIGURE_CACHE_SIZE", 256)),
+    ttl=float(_setting("FIGURE_CACHE_TTL", 0))
+)
+
+
+def _copy_result(value):
+    """Trả bản sao để trang gọi có sửa DataFrame/dict cũng không làm hỏng cache"""
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, dict):
+        return copy.deepcopy(dict(value))
+    return value
+
+
+def _cached_read(tags):
+    """Decorator cho hàm đọc: key = (tên hàm, tham số đã chuẩn hóa);
+    tags(username, *args) trả về các tag mà hàm ghi sẽ xóa khi dữ liệu đổi"""
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (fn.__name__,) + bound.args
+            value = _read_cache.get(key)
+            if value is MISSING:
+                value = fn(*bound.args)
+                _read_cache.set(key, value, tags=tags(*bound.args))
+            return _copy_result(value)
+        return wrapper
+    return decorator
+
+
+def _invalidate(username, table, date=None):
+    """Xóa cache đọc của user sau khi ghi vào `table`; có `date` thì chỉ ngày đó và tuần chứa nó"""
+    tags = [(username, table)]
+    if date is not None:
+        tags.append((username, table, date))
+        tags.append((username, table, week_range(date)[0]))
+    _read_cache.invalidate_tags(*tags)
+    prompt_cache.invalidate_tags(*tags)
+    figure_cache.invalidate_tags(*tags)
 
 def _query_to_df(conn, query, params=()):
     """Helper: chạy query và trả về DataFrame đúng cách với psycopg2"""
@@ -26,499 +149,799 @@ def _query_to_df(conn, query, params=()):
     return pd.DataFrame(columns=cols)
 
 
-def init_database(username):
-    """Khởi tạo database với tất cả bảng cần thiết"""
-    conn = get_connection()
-    cur = conn.cursor()
 
-    # Bảng check-in hàng ngày
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS daily_checkins (
-            id SERIAL PRIMARY KEY,
-            username TEXT NOT NULL,
-            date TEXT NOT NULL,
-            mental_load TEXT,
-            energy_level INTEGER,
-            pressure_source TEXT,
-            sleep_quality INTEGER,
-            tasks TEXT,
-            task_feeling TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(username, date)
-        )
-    """)
-
-    # Bảng metadata tasks
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS task_metadata (
-            id SERIAL PRIMARY KEY,
-            username TEXT NOT NULL,
-            checkin_date TEXT,
-            task_name TEXT,
-            estimated_time INTEGER,
-            priority TEXT,
-            task_type TEXT
-        )
-    """)
-
-    # Bảng lịch cố định
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS fixed_schedules (
-            id SERIAL PRIMARY KEY,
-            username TEXT NOT NULL,
-            checkin_date TEXT,
-            schedule_name TEXT,
-            start_time TEXT,
-            end_time TEXT
-        )
-    """)
-
-    # Bảng lịch sử tuần
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS weekly_history (
-            id SERIAL PRIMARY KEY,
-            username TEXT NOT NULL,
-            week_start TEXT,
-            week_end TEXT,
-            total_checkins INTEGER,
-            avg_energy REAL,
-            data_json TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    # Bảng ghi chú cải thiện
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS improvement_notes (
-            id SERIAL PRIMARY KEY,
-            username TEXT NOT NULL,
-            week_start TEXT,
-            note_content TEXT,
-            note_type TEXT,
-            applied INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    # Bảng playbook
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS playbook (
-            id SERIAL PRIMARY KEY,
-            username TEXT NOT NULL,
-            rule_title TEXT,
-            trigger TEXT,
-            action TEXT,
-            tested_week TEXT,
-            result TEXT,
-            status TEXT DEFAULT 'testing',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+def _values_list(rows):
+    """Ghép nhiều dòng thành 1 câu VALUES (%s, %s), (%s, %s), ... + list tham số phẳng"""
+    placeholder = "(" + ", ".join(["%s"] * len(rows[0])) + ")"
+    return ", ".join([placeholder] * len(rows)), [value for row in rows for value in row]
+
+
+def _checkin_upsert_sql(username, data):
+    return """
+        INSERT INTO daily_checkins 
+        (username, date, mental_load, energy_level, pressure_source, 
+         sleep_quality, tasks, task_feeling)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (username, date) DO UPDATE SET
+            mental_load = EXCLUDED.mental_load,
+            energy_level = EXCLUDED.energy_level,
+            pressure_source = EXCLUDED.pressure_source,
+            sleep_quality = EXCLUDED.sleep_quality,
+            tasks = EXCLUDED.tasks,
+            task_feeling = EXCLUDED.task_feeling
+    """, (
+        username,
+        data['date'],
+        data['mental_load'],
+        data['energy_level'],
+        data['pressure_source'],
+        data['sleep_quality'],
+        json.dumps(data['tasks'], ensure_ascii=False),
+        data['task_feeling']
+    )
 
-    conn.commit()
-    cur.close()
-    conn.close()
+
+# Điểm áp lực tinh thần giống biểu đồ (utils/charts.py): Nhẹ nhàng 1 → Cực nặng 4
+MENTAL_LOAD_SCORES = {'Nhẹ nhàng': 1, 'Bình thường': 2, 'Nặng': 3, 'Cực nặng': 4}
+
+_MENTAL_SCORE_SQL = "CASE mental_load " + " ".join(
+    f"WHEN '{label}' THEN {score}" for label, score in MENTAL_LOAD_SCORES.items()
+) + " END"
+
+
+def _weekly_rollup_sql(username, date):
+    """Cập nhật dòng tổng hợp của tuần chứa `date` ngay trong batch ghi check-in.
+    Tính lại từ tối đa 7 check-in của tuần đó (qua unique index username, date) nên
+    sửa lại check-in cũ cũng không làm lệch tổng; đọc thì chỉ cần 1 lần tra khóa chính"""
+    week_start, week_end = week_range(date)
+    return [
+        (
+            "INSERT INTO weekly_rollups (username, week_start) VALUES (%s, %s) "
+            "ON CONFLICT (username, week_start) DO NOTHING",
+            (username, week_start)
+        ),
+        (
+            f"""
+            UPDATE weekly_rollups SET
+                (checkin_count, energy_sum, energy_count, sleep_sum, sleep_count,
+                 task_sum, mental_load_sum, mental_load_count) = (
+                    SELECT COUNT(*),
+                           COALESCE(SUM(energy_level), 0), COUNT(energy_level),
+                           COALESCE(SUM(sleep_quality), 0), COUNT(sleep_quality),
+                           COALESCE(SUM(task_count), 0),
+                           COALESCE(SUM({_MENTAL_SCORE_SQL}), 0), COUNT({_MENTAL_SCORE_SQL})
+                    FROM daily_checkins
+                    WHERE username = %s AND date >= %s AND date <= %s
+                ),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE username = %s AND week_start = %s
+            """,
+            (username, week_start, week_end, username, week_start)
+        ),
+    ]
+
+
+def _energy_profile_sql(username, data):
+    """Cập nhật hồ sơ năng lượng ngay trong batch ghi check-in, chỉ bằng SQL (không đọc trước, không khóa).
+    Phải chạy TRƯỚC câu upsert check-in vì cần biết ngày đó đã có check-in chưa:
+    - ngày mới → cộng 1 mẫu (giờ check-in = giờ hiện tại) vào các dòng (yếu tố, mức) của nó bằng
+      INSERT ... ON CONFLICT DO UPDATE SET n = n + 1; 2 lần lưu đồng thời đều được cộng đủ.
+      User chưa có hồ sơ thì bỏ qua: lần đọc đầu tiên học từ lịch sử, gồm cả check-in này
+    - sửa check-in đã có → xóa hồ sơ để lần đọc sau học lại từ lịch sử"""
+    exists = "SELECT 1 FROM daily_checkins WHERE username = %s AND date = %s"
+    statements = []
+    energy = data.get('energy_level')
+    if energy is not None and energy == energy:
+        levels = EnergyProfile.levels(data['date'], data.get('sleep_quality'), data.get('mental_load'),
+                                      datetime.now().hour)
+        statements.append((
+            f"""
+            INSERT INTO energy_profile_stats (username, factor, level, n, energy_sum)
+            SELECT %s, factor, level, 1, %s
+            FROM ({" UNION ALL ".join(["SELECT %s AS factor, %s AS level"] * len(levels))}) AS levels
+            WHERE EXISTS (SELECT 1 FROM energy_profile_stats WHERE username = %s AND factor = %s AND level = %s)
+              AND NOT EXISTS ({exists})
+            ON CONFLICT (username, factor, level) DO UPDATE SET
+                n = energy_profile_stats.n + 1,
+                energy_sum = energy_profile_stats.energy_sum + EXCLUDED.energy_sum
+            """,
+            (username, float(energy), *(value for level in levels for value in level),
+             username, *OVERALL, username, data['date'])
+        ))
+    # Điều kiện ngược với câu trên ("ngày đã có check-in") nên mỗi lần lưu chỉ 1 trong 2 câu có tác dụng
+    statements.append((
+        f"DELETE FROM energy_profile_stats WHERE username = %s AND EXISTS ({exists})",
+        (username, username, data['date'])
+    ))
+    return statements
+
+
+def _task_metadata_sql(username, date, tasks_meta):
+    """DELETE + INSERT nhiều dòng thay cho vòng lặp INSERT từng task"""
+    statements = [(
+        "DELETE FROM task_metadata WHERE username = %s AND checkin_date = %s",
+        (username, date)
+    )]
+    if tasks_meta:
+        values, params = _values_list([
+            (username, date, task['name'], task['estimated_time'],
+             task['priority'], task['task_type'])
+            for task in tasks_meta
+        ])
+        statements.append((
+            "INSERT INTO task_metadata "
+            "(username, checkin_date, task_name, estimated_time, priority, task_type) VALUES "
+            + values,
+            params
+        ))
+    return statements
+
+
+def _fixed_schedule_sql(username, date, schedules):
+    """DELETE + INSERT nhiều dòng cho lịch cố định"""
+    statements = [(
+        "DELETE FROM fixed_schedules WHERE username = %s AND checkin_date = %s",
+        (username, date)
+    )]
+    if schedules:
+        values, params = _values_list([
+            (username, date, schedule['name'], schedule['start'], schedule['end'])
+            for schedule in schedules
+        ])
+        statements.append((
+            "INSERT INTO fixed_schedules "
+            "(username, checkin_date, schedule_name, start_time, end_time) VALUES "
+            + values,
+            params
+        ))
+    return statements
+
+def init_database(username):
+    """Đảm bảo schema ở phiên bản mới nhất — chỉ chạm database lần đầu trong process"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        backend = get_backend()
+        with backend.connection() as conn:
+            if get_schema_version(conn, backend.dialect) < LATEST_VERSION:
+                if str(_setting("DB_AUTO_MIGRATE", "true")).lower() not in ("1", "true", "yes"):
+                    raise RuntimeError(
+                        "Schema database chưa cập nhật — chạy: python -m utils.migrations"
+                    )
+                run_migrations(conn, dialect=backend.dialect)
+        _schema_ready = True
 
 # ===== CHECK-IN FUNCTIONS =====
 
 def save_checkin(username, data):
     """Lưu check-in hàng ngày"""
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        cur.execute("""
-            INSERT INTO daily_checkins 
-            (username, date, mental_load, energy_level, pressure_source, 
-             sleep_quality, tasks, task_feeling)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (username, date) DO UPDATE SET
-                mental_load = EXCLUDED.mental_load,
-                energy_level = EXCLUDED.energy_level,
-                pressure_source = EXCLUDED.pressure_source,
-                sleep_quality = EXCLUDED.sleep_quality,
-                tasks = EXCLUDED.tasks,
-                task_feeling = EXCLUDED.task_feeling
-        """, (
-            username,
-            data['date'],
-            data['mental_load'],
-            data['energy_level'],
-            data['pressure_source'],
-            data['sleep_quality'],
-            json.dumps(data['tasks'], ensure_ascii=False),
-            data['task_feeling']
-        ))
-        conn.commit()
+        with db_connection() as conn:
+            statements = _energy_profile_sql(username, data)
+            statements.append(_checkin_upsert_sql(username, data))
+            statements += _weekly_rollup_sql(username, data['date'])
+            get_backend().run_atomic_batch(conn, statements)
+        _invalidate(username, 'daily_checkins', data['date'])
+        _invalidate(username, 'weekly_rollups', data['date'])
+        _invalidate(username, 'energy_profile_stats')
         return True
     except Exception as e:
         print(f"Lỗi save_checkin: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
+
+def save_full_checkin(username, data, tasks_meta, fixed_schedule=None):
+    """Lưu check-in + metadata tasks + lịch cố định trong 1 transaction, 1 round-trip.
+    fixed_schedule=None: giữ nguyên lịch cố định đã lưu của ngày đó"""
+    try:
+        with db_connection() as conn:
+            statements = _energy_profile_sql(username, data)
+            statements.append(_checkin_upsert_sql(username, data))
+            statements += _weekly_rollup_sql(username, data['date'])
+            statements += _task_metadata_sql(username, data['date'], tasks_meta)
+            if fixed_schedule is not None:
+                statements += _fixed_schedule_sql(username, data['date'], fixed_schedule)
+            get_backend().run_atomic_batch(conn, statements)
+        _invalidate(username, 'daily_checkins', data['date'])
+        _invalidate(username, 'weekly_rollups', data['date'])
+        _invalidate(username, 'energy_profile_stats')
+        _invalidate(username, 'task_metadata', data['date'])
+        if fixed_schedule is not None:
+            _invalidate(username, 'fixed_schedules', data['date'])
+        return True
+    except Exception as e:
+        print(f"Lỗi save_full_checkin: {e}")
+        return False
 
 def get_checkin_today(username):
     """Lấy check-in hôm nay"""
-    conn = get_connection()
-    cur = conn.cursor()
-    today = datetime.now().strftime("%Y-%m-%d")
-    cur.execute(
-        "SELECT * FROM daily_checkins WHERE username = %s AND date = %s",
-        (username, today)
-    )
-    result = cur.fetchone()
-    cur.close()
-    conn.close()
-    return result
+    return get_checkin_by_date(username, datetime.now().strftime("%Y-%m-%d"))
 
+@_cached_read(lambda username, date: [(username, 'daily_checkins', date)])
 def get_checkin_by_date(username, date):
     """Lấy check-in theo ngày cụ thể"""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT * FROM daily_checkins WHERE username = %s AND date = %s",
-        (username, date)
-    )
-    result = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT * FROM daily_checkins WHERE username = %s AND date = %s",
+            (username, date)
+        )
+        result = cur.fetchone()
+        cur.close()
     return result
 
 def get_week_data(username):
     """Lấy data tuần hiện tại theo đúng khoảng ngày thứ 2 - chủ nhật"""
     week_start, week_end = get_current_week_range()
-    conn = get_connection()
-    query = """
-        SELECT * FROM daily_checkins 
-        WHERE username = %s
-        AND date >= %s
-        AND date <= %s
-        ORDER BY date ASC
-    """
-    df = _query_to_df(conn, query, (username, week_start, week_end))
-    conn.close()
+    return get_week_checkins(username, week_start, week_end)
+
+@_cached_read(lambda username, week_start, week_end: [(username, 'daily_checkins', week_start)])
+def get_week_checkins(username, week_start, week_end):
+    """Check-in của 1 tuần (key cache theo user + tuần)"""
+    with db_connection() as conn:
+        query = """
+            SELECT * FROM daily_checkins 
+            WHERE username = %s
+            AND date >= %s
+            AND date <= %s
+            ORDER BY date ASC
+        """
+        df = _query_to_df(conn, query, (username, week_start, week_end))
+    return df
+
+@_cached_read(lambda username, start_date, end_date: [(username, 'daily_checkins')])
+def get_checkins_range(username, start_date, end_date):
+    """Check-in từ start_date tới end_date (cả 2 đầu), cũ → mới"""
+    with db_connection() as conn:
+        query = """
+            SELECT * FROM daily_checkins
+            WHERE username = %s
+            AND date >= %s
+            AND date <= %s
+            ORDER BY date ASC
+        """
+        df = _query_to_df(conn, query, (username, start_date, end_date))
     return df
 
 # ===== TASK METADATA FUNCTIONS =====
 
 def save_task_metadata(username, date, tasks_meta):
     """Lưu metadata của tasks"""
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "DELETE FROM task_metadata WHERE username = %s AND checkin_date = %s",
-            (username, date)
-        )
-        for task in tasks_meta:
-            cur.execute("""
-                INSERT INTO task_metadata 
-                (username, checkin_date, task_name, estimated_time, priority, task_type)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (
-                username, date,
-                task['name'], task['estimated_time'],
-                task['priority'], task['task_type']
-            ))
-        conn.commit()
+        with db_connection() as conn:
+            get_backend().run_atomic_batch(conn, _task_metadata_sql(username, date, tasks_meta))
+        _invalidate(username, 'task_metadata', date)
         return True
     except Exception as e:
         print(f"Lỗi save_task_metadata: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
 
+@_cached_read(lambda username, date: [(username, 'task_metadata', date)])
 def get_task_metadata(username, date):
     """Lấy metadata tasks của 1 ngày"""
-    conn = get_connection()
-    query = """
-        SELECT * FROM task_metadata 
-        WHERE username = %s AND checkin_date = %s
-        ORDER BY id
-    """
-    df = _query_to_df(conn, query, (username, date))
-    conn.close()
+    with db_connection() as conn:
+        query = """
+            SELECT * FROM task_metadata 
+            WHERE username = %s AND checkin_date = %s
+            ORDER BY id
+        """
+        df = _query_to_df(conn, query, (username, date))
     return df
 
 # ===== FIXED SCHEDULE FUNCTIONS =====
 
 def save_fixed_schedule(username, date, schedules):
     """Lưu lịch cố định"""
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "DELETE FROM fixed_schedules WHERE username = %s AND checkin_date = %s",
-            (username, date)
-        )
-        for schedule in schedules:
-            cur.execute("""
-                INSERT INTO fixed_schedules 
-                (username, checkin_date, schedule_name, start_time, end_time)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (
-                username, date,
-                schedule['name'], schedule['start'], schedule['end']
-            ))
-        conn.commit()
+        with db_connection() as conn:
+            get_backend().run_atomic_batch(conn, _fixed_schedule_sql(username, date, schedules))
+        _invalidate(username, 'fixed_schedules', date)
         return True
     except Exception as e:
         print(f"Lỗi save_fixed_schedule: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
 
+@_cached_read(lambda username, date: [(username, 'fixed_schedules', date)])
 def get_fixed_schedule(username, date):
     """Lấy lịch cố định của 1 ngày"""
-    conn = get_connection()
-    query = """
-        SELECT * FROM fixed_schedules 
-        WHERE username = %s AND checkin_date = %s
-        ORDER BY start_time
-    """
-    df = _query_to_df(conn, query, (username, date))
-    conn.close()
+    with db_connection() as conn:
+        query = """
+            SELECT * FROM fixed_schedules 
+            WHERE username = %s AND checkin_date = %s
+            ORDER BY start_time
+        """
+        df = _query_to_df(conn, query, (username, date))
     return df
 
-# ===== WEEKLY HISTORY FUNCTIONS =====
+@_cached_read(lambda username, start_date, end_date: [(username, 'task_metadata')])
+def get_task_metadata_range(username, start_date, end_date):
+    """Metadata tasks của 1 user trong khoảng ngày (cho kế hoạch tuần)"""
+    with db_connection() as conn:
+        query = """
+            SELECT * FROM task_metadata
+            WHERE username = %s AND checkin_date >= %s AND checkin_date <= %s
+            ORDER BY checkin_date, id
+        """
+        df = _query_to_df(conn, query, (username, start_date, end_date))
+    return df
 
-def save_weekly_history(username, week_start, week_end, df):
-    """Lưu lịch sử tuần (chỉ giữ 8 tuần gần nhất)"""
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        total_checkins = len(df)
-        avg_energy = df['energy_level'].mean() if total_checkins > 0 else 0
+@_cached_read(lambda username, start_date, end_date: [(username, 'fixed_schedules')])
+def get_fixed_schedule_range(username, start_date, end_date):
+    """Lịch cố định của 1 user trong khoảng ngày (cho kế hoạch tuần)"""
+    with db_connection() as conn:
+        query = """
+            SELECT * FROM fixed_schedules
+            WHERE username = %s AND checkin_date >= %s AND checkin_date <= %s
+            ORDER BY checkin_date, start_time
+        """
+        df = _query_to_df(conn, query, (username, start_date, end_date))
+    return df
 
+# ===== ENERGY PROFILE (hồ sơ năng lượng cho scheduler) =====
+
+def _local_hour(created_at):
+    """created_at do database ghi (CURRENT_TIMESTAMP, giờ UTC) → giờ theo đồng hồ của app như datetime.now()"""
+    if created_at is None or created_at != created_at:
+        return None
+    if not hasattr(created_at, 'hour'):
+        created_at = datetime.fromisoformat(str(created_at))
+    return (created_at + datetime.now().astimezone().utcoffset()).hour
+
+@_cached_read(lambda username: [(username, 'energy_profile_stats')])
+def _get_energy_profile_rows(username):
+    """Các dòng hồ sơ đã lưu; chưa có thì học 1 lần từ toàn bộ lịch sử check-in rồi lưu lại"""
+    with db_connection() as conn:
+        cur = conn.cursor()
         cur.execute("""
-            INSERT INTO weekly_history 
-            (username, week_start, week_end, total_checkins, avg_energy, data_json)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (
-            username, week_start, week_end,
-            total_checkins, avg_energy,
-            df.to_json(orient='records', force_ascii=False)
-        ))
+            SELECT factor, level, n, energy_sum FROM energy_profile_stats WHERE username = %s
+        """, (username,))
+        rows = [dict(row) for row in cur.fetchall()]
+        if rows:
+            cur.close()
+            return rows
+        cur.execute("""
+            SELECT date, energy_level, sleep_quality, mental_load, created_at
+            FROM daily_checkins WHERE username = %s
+        """, (username,))
+        rows = EnergyProfile.fit(
+            dict(row, hour=_local_hour(row['created_at'])) for row in cur.fetchall()
+        ).rows()
+        if rows:
+            values, params = _values_list([
+                (username, row['factor'], row['level'], row['n'], row['energy_sum']) for row in rows
+            ])
+            cur.execute(
+                "INSERT INTO energy_profile_stats (username, factor, level, n, energy_sum) VALUES "
+                + values + " ON CONFLICT (username, factor, level) DO NOTHING",
+                params
+            )
+        cur.close()
+    return rows
 
-        # Xóa tuần cũ nếu > 8 tuần
-        cur.execute(
-            "SELECT COUNT(*) FROM weekly_history WHERE username = %s",
-            (username,)
-        )
-        count = cur.fetchone()['count']
-        if count > 8:
+def get_energy_profile(username):
+    """EnergyProfile của user (1 lần tra theo khóa chính, không quét lịch sử); None nếu lỗi"""
+    try:
+        return EnergyProfile.from_rows(_get_energy_profile_rows(username))
+    except Exception as e:
+        print(f"Lỗi get_energy_profile: {e}")
+        return None
+
+def get_scheduling_inputs(date):
+    """task_metadata + fixed_schedules của MỌI user trong 1 ngày (cho scheduler.schedule_batch)"""
+    with db_connection() as conn:
+        tasks_df = _query_to_df(conn, """
+            SELECT * FROM task_metadata
+            WHERE checkin_date = %s
+            ORDER BY username, id
+        """, (date,))
+        fixed_df = _query_to_df(conn, """
+            SELECT * FROM fixed_schedules
+            WHERE checkin_date = %s
+            ORDER BY username, start_time
+        """, (date,))
+    return tasks_df, fixed_df
+
+# ===== WEEKLY HISTORY FUNCTIONS =====
+
+def save_weekly_history(username, week_start, week_end, df=None):
+    """Lưu lịch sử tuần (chỉ giữ 8 tuần gần nhất): số check-in/năng lượng TB lấy từ bảng tổng hợp,
+    data_json vẫn là các check-in của tuần dạng to_json(orient='records') như trước.
+    df=None: tự đọc check-in của tuần (trang cũ truyền DataFrame rỗng nên không dùng df để tính số liệu)"""
+    try:
+        summary = get_week_rollup(username, week_start)
+        if df is None:
+            df = get_checkins_range(username, week_start, week_end)
+        with db_connection() as conn:
+            cur = conn.cursor()
             cur.execute("""
-                DELETE FROM weekly_history 
-                WHERE username = %s AND id IN (
-                    SELECT id FROM weekly_history 
-                    WHERE username = %s
-                    ORDER BY created_at ASC 
-                    LIMIT %s
-                )
-            """, (username, username, count - 8))
-
-        conn.commit()
+                INSERT INTO weekly_history 
+                (username, week_start, week_end, total_checkins, avg_energy, data_json)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (
+                username, week_start, week_end,
+                summary['checkin_count'], summary['avg_energy'] or 0,
+                df.to_json(orient='records', force_ascii=False)
+            ))
+
+            # Xóa tuần cũ nếu > 8 tuần
+            cur.execute(
+                "SELECT COUNT(*) AS count FROM weekly_history WHERE username = %s",
+                (username,)
+            )
+            count = cur.fetchone()['count']
+            if count > 8:
+                cur.execute("""
+                    DELETE FROM weekly_history 
+                    WHERE username = %s AND id IN (
+                        SELECT id FROM weekly_history 
+                        WHERE username = %s
+                        ORDER BY created_at ASC 
+                        LIMIT %s
+                    )
+                """, (username, username, count - 8))
+
+            cur.close()
+        _invalidate(username, 'weekly_history')
         return True
     except Exception as e:
         print(f"Lỗi save_weekly_history: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
 
+@_cached_read(lambda username, limit: [(username, 'weekly_history')])
 def get_weekly_history(username, limit=8):
     """Lấy lịch sử các tuần"""
-    conn = get_connection()
-    query = """
-        SELECT * FROM weekly_history 
-        WHERE username = %s
-        ORDER BY created_at DESC 
-        LIMIT %s
-    """
-    df = _query_to_df(conn, query, (username, limit))
-    conn.close()
+    with db_connection() as conn:
+        query = """
+            SELECT * FROM weekly_history 
+            WHERE username = %s
+            ORDER BY created_at DESC 
+            LIMIT %s
+        """
+        df = _query_to_df(conn, query, (username, limit))
     return df
 
-def get_current_week_range():
-    """Lấy ngày đầu và cuối tuần hiện tại"""
-    today = datetime.now()
-    weekday = today.weekday()
-    week_start = today - timedelta(days=weekday)
+def _rollup_summary(week_start, row):
+    """Dòng weekly_rollups → số liệu tuần; trung bình là None nếu chưa có dữ liệu"""
+    row = row or {}
+
+    def average(total, count):
+        return round(row[total] / row[count], 2) if row.get(count) else None
+
+    return {
+        'week_start': week_start,
+        'checkin_count': row.get('checkin_count', 0),
+        'task_total': row.get('task_sum', 0),
+        'avg_energy': average('energy_sum', 'energy_count'),
+        'avg_sleep': average('sleep_sum', 'sleep_count'),
+        'avg_tasks': average('task_sum', 'checkin_count'),
+        'avg_mental_load': average('mental_load_sum', 'mental_load_count'),
+    }
+
+@_cached_read(lambda username, week_start: [(username, 'weekly_rollups', week_start)])
+def get_week_rollup(username, week_start):
+    """Số liệu tổng hợp 1 tuần: số check-in, tổng công việc, năng lượng/giấc ngủ/công việc/áp lực TB"""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT * FROM weekly_rollups WHERE username = %s AND week_start = %s",
+            (username, week_start)
+        )
+        row = cur.fetchone()
+        cur.close()
+    return _rollup_summary(week_start, row)
+
+@_cached_read(lambda username, start_week, end_week: [(username, 'weekly_rollups')])
+def get_week_rollups(username, start_week, end_week):
+    """Các dòng weekly_rollups (cột tổng, chưa chia) của các tuần bắt đầu từ start_week tới end_week"""
+    with db_connection() as conn:
+        query = """
+            SELECT * FROM weekly_rollups
+            WHERE username = %s AND week_start >= %s AND week_start <= %s
+            ORDER BY week_start
+        """
+        df = _query_to_df(conn, query, (username, start_week, end_week))
+    return df
+
+def get_current_week_rollup(username):
+    """Số liệu tổng hợp tuần hiện tại"""
+    return get_week_rollup(username, get_current_week_range()[0])
+
+def week_range(day):
+    """Thứ 2 và Chủ nhật của tuần chứa `day` (datetime hoặc 'YYYY-MM-DD')"""
+    if isinstance(day, str):
+        day = datetime.strptime(day, "%Y-%m-%d")
+    week_start = day - timedelta(days=day.weekday())
     week_end = week_start + timedelta(days=6)
     return week_start.strftime("%Y-%m-%d"), week_end.strftime("%Y-%m-%d")
 
+def get_current_week_range():
+    """Lấy ngày đầu và cuối tuần hiện tại"""
+    return week_range(datetime.now())
+
 def is_new_week(username):
     """Kiểm tra xem đã sang tuần mới chưa"""
     week_start, _ = get_current_week_range()
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT COUNT(*) FROM weekly_history 
-        WHERE username = %s AND week_start = %s
-    """, (username, week_start))
-    count = cur.fetchone()['count']
-    cur.close()
-    conn.close()
-    return count == 0 and datetime.now().weekday() == 0
+    return not _has_weekly_history(username, week_start) and datetime.now().weekday() == 0
+
+@_cached_read(lambda username, week_start: [(username, 'weekly_history')])
+def _has_weekly_history(username, week_start):
+    """Tuần này đã có bản lưu lịch sử chưa"""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COUNT(*) AS count FROM weekly_history 
+            WHERE username = %s AND week_start = %s
+        """, (username, week_start))
+        count = cur.fetchone()['count']
+        cur.close()
+    return count > 0
 
 # ===== IMPROVEMENT NOTES FUNCTIONS =====
 
 def save_improvement_note(username, week_start, note_content, note_type="tuần_sau"):
     """Lưu ghi chú cải thiện"""
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        cur.execute("""
-            INSERT INTO improvement_notes 
-            (username, week_start, note_content, note_type, applied)
-            VALUES (%s, %s, %s, %s, 0)
-        """, (username, week_start, note_content, note_type))
-        conn.commit()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO improvement_notes 
+                (username, week_start, note_content, note_type, applied)
+                VALUES (%s, %s, %s, %s, 0)
+            """, (username, week_start, note_content, note_type))
+            cur.close()
+        _invalidate(username, 'improvement_notes')
         return True
     except Exception as e:
         print(f"Lỗi save_improvement_note: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
 
+@_cached_read(lambda username, week_start: [(username, 'improvement_notes')])
 def get_improvement_notes(username, week_start=None):
     """Lấy ghi chú cải thiện"""
-    conn = get_connection()
-    if week_start:
-        query = """
-            SELECT * FROM improvement_notes 
-            WHERE username = %s AND week_start = %s
-            ORDER BY created_at DESC
-        """
-        df = _query_to_df(conn, query, (username, week_start))
-    else:
-        query = """
-            SELECT * FROM improvement_notes 
-            WHERE username = %s
-            ORDER BY created_at DESC
-        """
-        df = _query_to_df(conn, query, (username,))
-    conn.close()
+    with db_connection() as conn:
+        if week_start:
+            query = """
+                SELECT * FROM improvement_notes 
+                WHERE username = %s AND week_start = %s
+                ORDER BY created_at DESC
+            """
+            df = _query_to_df(conn, query, (username, week_start))
+        else:
+            query = """
+                SELECT * FROM improvement_notes 
+                WHERE username = %s
+                ORDER BY created_at DESC
+            """
+            df = _query_to_df(conn, query, (username,))
     return df
 
 def mark_note_applied(username, note_id):
     """Đánh dấu ghi chú đã áp dụng"""
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "UPDATE improvement_notes SET applied = 1 WHERE id = %s AND username = %s",
-            (note_id, username)
-        )
-        conn.commit()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE improvement_notes SET applied = 1 WHERE id = %s AND username = %s",
+                (note_id, username)
+            )
+            cur.close()
+        _invalidate(username, 'improvement_notes')
         return True
     except Exception as e:
         print(f"Lỗi mark_note_applied: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
 
 def delete_improvement_note(username, note_id):
     """Xóa ghi chú"""
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "DELETE FROM improvement_notes WHERE id = %s AND username = %s",
-            (note_id, username)
-        )
-        conn.commit()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "DELETE FROM improvement_notes WHERE id = %s AND username = %s",
+                (note_id, username)
+            )
+            cur.close()
+        _invalidate(username, 'improvement_notes')
         return True
     except Exception as e:
         print(f"Lỗi delete_improvement_note: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
 
 # ===== PLAYBOOK FUNCTIONS =====
 
 def save_playbook_rule(username, rule_data):
     """Lưu quy luật vào playbook"""
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        cur.execute("""
-            INSERT INTO playbook 
-            (username, rule_title, trigger, action, tested_week, result, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (
-            username,
-            rule_data['rule_title'],
-            rule_data['trigger'],
-            rule_data['action'],
-            rule_data['tested_week'],
-            rule_data['result'],
-            rule_data['status']
-        ))
-        conn.commit()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO playbook 
+                (username, rule_title, trigger, action, tested_week, result, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, (
+                username,
+                rule_data['rule_title'],
+                rule_data['trigger'],
+                rule_data['action'],
+                rule_data['tested_week'],
+                rule_data['result'],
+                rule_data['status']
+            ))
+            cur.close()
+        _invalidate(username, 'playbook')
         return True
     except Exception as e:
         print(f"Lỗi save_playbook_rule: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
 
+@_cached_read(lambda username: [(username, 'playbook')])
 def get_all_playbook_rules(username):
     """Lấy tất cả quy luật"""
-    conn = get_connection()
-    query = """
-        SELECT * FROM playbook 
-        WHERE username = %s
-        ORDER BY created_at DESC
-    """
-    df = _query_to_df(conn, query, (username,))
-    conn.close()
+    with db_connection() as conn:
+        query = """
+            SELECT * FROM playbook 
+            WHERE username = %s
+            ORDER BY created_at DESC
+        """
+        df = _query_to_df(conn, query, (username,))
     return df
 
 def update_rule_status(username, rule_id, new_status, new_result=None):
     """Cập nhật trạng thái quy luật"""
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        if new_result:
-            cur.execute("""
-                UPDATE playbook SET status = %s, result = %s
-                WHERE id = %s AND username = %s
-            """, (new_status, new_result, rule_id, username))
-        else:
-            cur.execute("""
-                UPDATE playbook SET status = %s
-                WHERE id = %s AND username = %s
-            """, (new_status, rule_id, username))
-        conn.commit()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            if new_result:
+                cur.execute("""
+                    UPDATE playbook SET status = %s, result = %s
+                    WHERE id = %s AND username = %s
+                """, (new_status, new_result, rule_id, username))
+            else:
+                cur.execute("""
+                    UPDATE playbook SET status = %s
+                    WHERE id = %s AND username = %s
+                """, (new_status, rule_id, username))
+            cur.close()
+        _invalidate(username, 'playbook')
         return True
     except Exception as e:
         print(f"Lỗi update_rule_status: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
 
 def delete_playbook_rule(username, rule_id):
     """Xóa quy luật"""
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "DELETE FROM playbook WHERE id = %s AND username = %s",
-            (rule_id, username)
-        )
-        conn.commit()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "DELETE FROM playbook WHERE id = %s AND username = %s",
+                (rule_id, username)
+            )
+            cur.close()
+        _invalidate(username, 'playbook')
         return True
     except Exception as e:
         print(f"Lỗi delete_playbook_rule: {e}")
         return False
+
+# ===== CHECK-IN ĐỌC DẦN (xuất file, khoảng ngày dài) =====
+
+# Số dòng mỗi lần kéo từ cursor khi đọc dần check-in
+STREAM_BATCH_SIZE = int(_setting("STREAM_BATCH_SIZE", 500))
+
+_CHECKINS_WHERE = "FROM daily_checkins WHERE username = %s AND date >= %s AND date <= %s"
+
+
+def _first_checkin(cur, params, order, where=""):
+    """Ngày đầu tiên theo `order` trong khoảng (date, energy) hoặc None"""
+    cur.execute(f"SELECT date, energy_level {_CHECKINS_WHERE} {where} ORDER BY {order}, date ASC LIMIT 1",
+                params)
+    return cur.fetchone()
+
+
+def _checkins_totals(conn, username, start_date, end_date, heavy_task_day):
+    """Số liệu tổng của khoảng tính bằng SQL, không đọc từng dòng về Python: days, missing_energy,
+    avg_energy, avg_tasks, low_sleep (ngủ ≤ 2), heavy (≥ heavy_task_day việc) và các dòng (date, energy_level)
+    best/worst (năng lượng trống tính là 0, trùng thì lấy ngày sớm nhất), lowest (thấp nhất đã ghi)"""
+    params = (username, start_date, end_date)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT COUNT(*) AS days,
+                   COUNT(*) - COUNT(energy_level) AS missing_energy,
+                   AVG(NULLIF(energy_level, 0)) AS avg_energy,
+                   AVG(COALESCE(task_count, 0)) AS avg_tasks,
+                   MAX(COALESCE(energy_level, 0)) AS max_energy,
+                   SUM(CASE WHEN sleep_quality <= 2 THEN 1 ELSE 0 END) AS low_sleep,
+                   SUM(CASE WHEN task_count >= %s THEN 1 ELSE 0 END) AS heavy
+            {_CHECKINS_WHERE}
+        """, (heavy_task_day,) + params)
+        totals = dict(cur.fetchone())
+        if not totals['days']:
+            return totals
+        if (totals['max_energy'] or 0) > 0:
+            totals['worst'] = _first_checkin(cur, params, "COALESCE(energy_level, 0) ASC")
+            totals['best'] = _first_checkin(cur, params, "COALESCE(energy_level, 0) DESC")
+        else:
+            totals['worst'] = totals['best'] = _first_checkin(cur, params, "date ASC")
+        totals['lowest'] = _first_checkin(cur, params, "energy_level ASC", "AND energy_level IS NOT NULL")
+        return totals
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+
+
+@contextmanager
+def read_checkins_range(username, start_date, end_date, heavy_task_day, batch_size=STREAM_BATCH_SIZE):
+    """
+    Check-in từ start_date tới end_date mà không dựng DataFrame: `with ... as (totals, rows)`.
+
+    totals là số liệu tổng của _checkins_totals; rows duyệt các dòng (date, mental_load, energy_level,
+    pressure_source, sleep_quality, task_count, task_feeling) cũ → mới qua cursor phía server
+    (batch_size dòng / lần) nên bộ nhớ không tăng theo số ngày. Giữ 1 connection tới hết khối with;
+    với SQLite hãy duyệt hết trước khi gọi hàm database khác trong cùng thread.
+    """
+    with db_connection() as conn:
+        totals = _checkins_totals(conn, username, start_date, end_date, heavy_task_day)
+        # closing: cursor đóng trước khi trả connection, kể cả khi bên đọc dừng giữa chừng
+        with closing(get_backend().iter_rows(conn, f"""
+            SELECT date, mental_load, energy_level, pressure_source, sleep_quality, task_count, task_feeling
+            {_CHECKINS_WHERE}
+            ORDER BY date ASC
+        """, (username, start_date, end_date), batch_size)) as rows:
+            yield totals, rows
+
+# ===== SCHEDULE CACHE (tầng lưu trữ cho cache của scheduler) =====
+
+def schedule_cache_enabled():
+    """SCHEDULE_CACHE_DB=true: lưu kết quả xếp lịch vào database để process khác / lần chạy sau dùng lại"""
+    return str(_setting("SCHEDULE_CACHE_DB", "false")).lower() in ("1", "true", "yes")
+
+def get_cached_schedule(fingerprint):
+    """Kết quả create_daily_schedule đã lưu theo fingerprint đầu vào (None nếu chưa có)"""
+    try:
+        init_database(None)
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT result FROM schedule_cache WHERE fingerprint = %s", (fingerprint,))
+            row = cur.fetchone()
+            cur.close()
+        return row['result'] if row else None
+    except Exception as e:
+        print(f"Lỗi get_cached_schedule: {e}")
+        return None
+
+def save_cached_schedule(fingerprint, result):
+    """Lưu kết quả xếp lịch; fingerprint đã có thì giữ bản cũ (cùng đầu vào → cùng kết quả)"""
+    try:
+        init_database(None)
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO schedule_cache (fingerprint, result)
+                VALUES (%s, %s)
+                ON CONFLICT (fingerprint) DO NOTHING
+            """, (fingerprint, json.dumps(result, ensure_ascii=False)))
+            cur.close()
+        return True
+    except Exception as e:
+        print(f"Lỗi save_cached_schedule: {e}")
+        return False
+
+# Gắn cache bền vào scheduler (scheduler không import module này)
+register_schedule_store(*((get_cached_schedule, save_cached_schedule) if schedule_cache_enabled() else ()),
+                        maxsize=int(_setting("SCHEDULE_CACHE_SIZE", 4096)))
+
+def prune_schedule_cache(days=30):
+    """Xóa kết quả xếp lịch lưu quá `days` ngày"""
+    try:
+        cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM schedule_cache WHERE created_at < %s", (cutoff,))
+            cur.close()
+        return True
+    except Exception as e:
+        print(f"Lỗi prune_schedule_cache: {e}")
+        return False
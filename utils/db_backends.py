@@ -0,0 +1,240 @@
+"""
+Storage backend cho utils/database.py.
+
+Các hàm trong database.py viết SQL kiểu psycopg2 (placeholder %s, %% là dấu
+% thật) và chỉ dùng vài thao tác chung: mượn connection, cursor().execute,
+fetchone/fetchall trả về dict, run_atomic_batch cho nhiều câu ghi và iter_rows
+để đọc dần kết quả lớn.
+Mỗi backend hiện thực các thao tác đó theo cách nhanh nhất của nó:
+
+- PostgresBackend: Supabase qua ConnectionPool (utils/db_pool.py)
+- SQLiteBackend: file SQLite nhúng — WAL, connection riêng cho mỗi thread,
+  statement cache của sqlite3 (prepared statements), pragma synchronous/mmap.
+  Dùng cho chạy 1 máy, thử nghiệm và benchmark không tốn độ trễ mạng.
+"""
+
+import functools
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+from utils.db_pool import ConnectionPool
+
+
+class StorageBackend:
+    """Giao diện chung mà utils/database.py dùng"""
+
+    dialect = None
+
+    @contextmanager
+    def connection(self):
+        """Mượn connection trong khối with: commit khi xong, rollback khi lỗi"""
+        raise NotImplementedError
+
+    def run_atomic_batch(self, conn, statements):
+        """Chạy list (sql, params) như 1 đơn vị: hoặc tất cả, hoặc không câu nào"""
+        raise NotImplementedError
+
+    def iter_rows(self, conn, query, params=(), batch_size=500):
+        """Duyệt kết quả SELECT theo từng lô batch_size dòng (dict), không fetchall cả bảng.
+        conn phải còn mượn tới khi duyệt xong"""
+        raise NotImplementedError
+
+    def close(self):
+        """Đóng mọi connection đang giữ"""
+
+
+# ===== POSTGRES =====
+
+# Cột DATE trả về chuỗi 'YYYY-MM-DD' như toàn bộ app đang dùng, không tạo datetime.date
+_DATE_AS_ISO = psycopg2.extensions.new_type((1082,), "DATE_AS_ISO", lambda value, cur: value)
+
+
+def configure_postgres_connection(conn):
+    """Cấu hình 1 lần cho mỗi connection mới (JSONB đã được psycopg2 tự giải mã thành list)"""
+    psycopg2.extensions.register_type(_DATE_AS_ISO, conn)
+
+
+class PostgresBackend(StorageBackend):
+    """PostgreSQL/Supabase qua pool connection dùng chung cả process"""
+
+    dialect = "postgres"
+
+    _cursor_ids = itertools.count()
+
+    def __init__(self, dsn, **pool_kwargs):
+        self.pool = ConnectionPool(
+            dsn,
+            configure=configure_postgres_connection,
+            cursor_factory=psycopg2.extras.RealDictCursor,
+            **pool_kwargs
+        )
+
+    @contextmanager
+    def connection(self):
+        with self.pool.connection() as conn:
+            yield conn
+
+    def run_atomic_batch(self, conn, statements):
+        """Gửi nhiều câu lệnh trong MỘT query: Postgres chạy chúng như 1 transaction ngầm định
+        (lỗi ở bất kỳ câu nào → rollback toàn bộ), chỉ tốn 1 round-trip, không cần BEGIN/COMMIT riêng"""
+        cur = conn.cursor()
+        sql = b";\n".join(cur.mogrify(query, params) for query, params in statements)
+        conn.autocommit = True
+        try:
+            cur.execute(sql)
+        finally:
+            conn.autocommit = False
+            cur.close()
+
+    def iter_rows(self, conn, query, params=(), batch_size=500):
+        """Server-side (named) cursor: Postgres giữ kết quả, mỗi round-trip chỉ kéo itersize dòng"""
+        cur = conn.cursor(name=f"iter_rows_{next(self._cursor_ids)}")
+        cur.itersize = batch_size
+        try:
+            cur.execute(query, params)
+            yield from cur
+        finally:
+            cur.close()
+
+    def close(self):
+        self.pool.closeall()
+
+
+# ===== SQLITE =====
+
+_PLACEHOLDER = re.compile(r"%([s%])")
+
+
+@functools.lru_cache(maxsize=512)
+def _to_sqlite_sql(query):
+    """'%s' → '?', '%%' → '%' (kết quả được cache: mỗi câu SQL chỉ dịch 1 lần)"""
+    return _PLACEHOLDER.sub(lambda m: "?" if m.group(1) == "s" else "%", query)
+
+
+def _decode_json(value):
+    """Converter cho cột khai báo kiểu JSON: trả về list/dict như JSONB của Postgres"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return []
+
+
+sqlite3.register_converter("JSON", _decode_json)
+
+
+def _dict_row(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class _SQLiteCursor(sqlite3.Cursor):
+    """Cursor nhận SQL kiểu psycopg2"""
+
+    def execute(self, query, params=()):
+        return super().execute(_to_sqlite_sql(query), params)
+
+    def executemany(self, query, seq_of_params):
+        return super().executemany(_to_sqlite_sql(query), seq_of_params)
+
+
+class _SQLiteConnection(sqlite3.Connection):
+    def cursor(self, factory=_SQLiteCursor):
+        return super().cursor(factory)
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLite nhúng: mỗi thread 1 connection riêng, WAL để đọc không chặn ghi"""
+
+    dialect = "sqlite"
+
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",       # an toàn với WAL, fsync ít hơn nhiều so với FULL
+        "PRAGMA mmap_size = 268435456",      # đọc qua mmap tới 256MB
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -20000",        # ~20MB page cache mỗi connection
+        "PRAGMA foreign_keys = ON",
+    )
+
+    def __init__(self, path, busy_timeout=5.0, cached_statements=256):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+        if not path.startswith("file:") and path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,            # tự quản lý BEGIN/COMMIT
+            cached_statements=self.cached_statements,
+            factory=_SQLiteConnection,
+            uri=self.path.startswith("file:"),
+        )
+        conn.row_factory = _dict_row
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def _thread_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._thread_connection()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        except BaseException:       # cả GeneratorExit: generator đọc dần bị đóng giữa chừng
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    def run_atomic_batch(self, conn, statements):
+        """Không có độ trễ mạng nên chạy từng câu; transaction của connection() đảm bảo nguyên tử"""
+        cur = conn.cursor()
+        for query, params in statements:
+            cur.execute(query, params)
+        cur.close()
+
+    def iter_rows(self, conn, query, params=(), batch_size=500):
+        """sqlite3 vốn đọc dần từng bước; fetchmany để không giữ quá batch_size dòng mỗi lần"""
+        cur = conn.cursor()
+        try:
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cur.close()
+
+    def close(self):
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
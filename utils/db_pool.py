@@ -0,0 +1,234 @@
+"""
+Connection pool dùng chung cho cả process.
+
+Mỗi lần psycopg2.connect tới Supabase phải bắt tay TLS — chậm hơn nhiều so với
+chính câu query. Pool giữ sẵn các connection đã mở, cho các thread của
+Streamlit mượn rồi trả lại, kiểm tra sức khỏe khi mượn và đóng bớt
+connection nằm không quá lâu.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    """Hết thời gian chờ mà pool vẫn không còn connection rảnh"""
+
+
+class ConnectionPool:
+    """Pool connection an toàn đa luồng với min/max, health check và dọn connection rảnh"""
+
+    def __init__(self, dsn, minconn=1, maxconn=10, idle_timeout=300,
+                 checkout_timeout=10, ping_interval=30, configure=None, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Cần 0 <= minconn <= maxconn và maxconn >= 1")
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self.configure = configure      # hàm chạy 1 lần trên mỗi connection mới mở
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()        # (conn, thời điểm trả lại pool)
+        self._size = 0              # tổng số connection đang mở (rảnh + đang mượn)
+        self._closed = False
+        self._pid = os.getpid()
+
+        self._reaper_stop = threading.Event()
+        self._reaper = None
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+        self._start_reaper()
+
+    # ===== NỘI BỘ =====
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        if self.configure is not None:
+            self.configure(conn)
+        return conn
+
+    def _discard(self, conn):
+        """Đóng connection hỏng/thừa, không ném lỗi"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_since):
+        """Health check khi mượn: kiểm tra rẻ trước, chỉ ping nếu nằm rảnh lâu"""
+        if conn.closed:
+            return False
+        status = conn.info.transaction_status
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - idle_since < self.ping_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _check_fork(self):
+        """Process con (fork) không được dùng chung socket với process cha"""
+        if os.getpid() != self._pid:
+            with self._cond:
+                self._idle.clear()
+                self._size = 0
+                self._pid = os.getpid()
+                self._reaper = None
+                self._reaper_stop = threading.Event()
+            self._start_reaper()
+
+    def _start_reaper(self):
+        if self.idle_timeout is None or self.idle_timeout <= 0:
+            return
+        self._reaper = threading.Thread(
+            target=self._reap_loop, name="db-pool-reaper", daemon=True
+        )
+        self._reaper.start()
+
+    def _reap_loop(self):
+        interval = max(1.0, self.idle_timeout / 2)
+        while not self._reaper_stop.wait(interval):
+            self.reap_idle()
+
+    # ===== API =====
+
+    def getconn(self):
+        """Mượn 1 connection; chờ tối đa checkout_timeout giây nếu pool đã đầy"""
+        self._check_fork()
+        deadline = time.monotonic() + self.checkout_timeout
+
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("Connection pool đã đóng")
+
+                if self._idle:
+                    # LIFO: ưu tiên connection vừa dùng (còn "ấm")
+                    conn, idle_since = self._idle.pop()
+                elif self._size < self.maxconn:
+                    self._size += 1
+                    break
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"Không mượn được connection sau {self.checkout_timeout}s "
+                            f"(maxconn={self.maxconn})"
+                        )
+                    self._cond.wait(remaining)
+                    continue
+
+            # Health check ngoài lock — ping có thể tốn 1 round-trip
+            if self._is_healthy(conn, idle_since):
+                return conn
+            with self._cond:
+                self._size -= 1
+            self._discard(conn)
+
+        # Mở connection mới ngoài lock để không chặn các thread khác
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, discard=False):
+        """Trả connection về pool; transaction còn dở sẽ bị rollback"""
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard or conn.closed or self._closed or os.getpid() != self._pid:
+                self._size = max(0, self._size - 1)
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Mượn connection trong khối with: tự commit khi xong, rollback khi lỗi"""
+        conn = self.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:       # cả GeneratorExit: generator đọc dần bị đóng giữa chừng
+            broken = conn.closed
+            if not broken:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+            self.putconn(conn, discard=broken)
+            raise
+        else:
+            self.putconn(conn)
+
+    def reap_idle(self):
+        """Đóng các connection rảnh quá idle_timeout, giữ lại tối thiểu minconn"""
+        now = time.monotonic()
+        stale = []
+        with self._cond:
+            keep = deque()
+            # Duyệt từ cũ nhất (đầu deque) — connection ấm nằm cuối
+            while self._idle:
+                conn, idle_since = self._idle.popleft()
+                if (now - idle_since > self.idle_timeout
+                        and self._size - len(stale) > self.minconn):
+                    stale.append(conn)
+                else:
+                    keep.append((conn, idle_since))
+            self._idle = keep
+            self._size -= len(stale)
+        for conn in stale:
+            self._discard(conn)
+        return len(stale)
+
+    def stats(self):
+        """Số liệu pool để debug/giám sát"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'minconn': self.minconn,
+                'maxconn': self.maxconn,
+            }
+
+    def closeall(self):
+        """Đóng toàn bộ pool (dùng khi tắt process hoặc trong script)"""
+        self._reaper_stop.set()
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
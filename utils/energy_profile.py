@@ -0,0 +1,150 @@
+"""
+Hồ sơ năng lượng của từng user, học từ lịch sử daily_checkins.
+
+Mỗi check-in là 1 mẫu năng lượng (1-10). Mô hình cộng dồn:
+
+    năng lượng ≈ TB chung + lệch theo thứ + lệch theo giấc ngủ
+                 + lệch theo áp lực tinh thần + lệch theo buổi
+
+- Buổi lấy từ giờ user check-in (created_at): check-in lúc 8h báo năng lượng
+  buổi sáng, lúc 21h báo buổi tối — tín hiệu trong ngày duy nhất mà dữ liệu có
+- Mỗi mức của 1 yếu tố (1 thứ, 1 mức ngủ...) chỉ giữ (số mẫu, tổng năng lượng);
+  lệch = TB của mức đó − TB chung, mức ít mẫu bị co về 0 (PRIOR)
+- Mọi số đều là tổng cộng dồn: thứ tự check-in không quan trọng, thêm 1 check-in
+  là cộng vào vài dòng (yếu tố, mức) — database làm ngay trong batch ghi check-in
+  bằng 1 câu INSERT ... ON CONFLICT DO UPDATE, không cần đọc hồ sơ ra trước
+- Đổi lại, mỗi yếu tố được so riêng với TB chung: 2 yếu tố hay đi cùng nhau
+  (ngủ kém + áp lực nặng) có thể bị cộng trùng 1 phần
+
+Scheduler dùng deep_sessions() để đặt học sâu vào buổi user tỉnh táo nhất,
+week planner dùng predict() cho năng lượng thường thấy của từng thứ.
+"""
+
+from datetime import datetime
+
+from utils.scheduler import _slot_type
+
+PRIOR = 3               # mức có n mẫu chỉ được tin n / (n + PRIOR)
+MIN_EVIDENCE = 5        # buổi cần ít nhất 5 check-in mới được dùng để dời học sâu
+SESSION_MARGIN = 0.5    # buổi khác phải hơn buổi sáng ít nhất 0.5 điểm mới dời học sâu
+
+DEEP_CANDIDATES = ('Sáng', 'Chiều', 'Tối')     # buổi trưa dành cho ăn trưa
+OVERALL = ('all', '')   # dòng (yếu tố, mức) của TB chung: mọi check-in có năng lượng đều cộng vào
+
+
+def _weekday(date):
+    """'YYYY-MM-DD' / date → thứ (0 = thứ 2)"""
+    if hasattr(date, 'weekday'):
+        return date.weekday()
+    return datetime.strptime(str(date)[:10], "%Y-%m-%d").weekday()
+
+
+def _key(value):
+    """Khóa mức: số (kể cả 4.0 từ DataFrame) → '4', nhãn giữ nguyên"""
+    try:
+        return str(int(value))
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _missing(value):
+    return value is None or value != value
+
+
+class EnergyProfile:
+    """Mô hình năng lượng cộng dồn: (yếu tố, mức) → [số mẫu, tổng năng lượng]"""
+
+    __slots__ = ('stats',)
+
+    def __init__(self):
+        self.stats = {}
+
+    @classmethod
+    def fit(cls, checkins):
+        """Học từ các dòng daily_checkins (date, energy_level, sleep_quality, mental_load, hour)"""
+        profile = cls()
+        for row in checkins:
+            profile.update(row['date'], row.get('energy_level'), row.get('sleep_quality'),
+                           row.get('mental_load'), row.get('hour'))
+        return profile
+
+    @staticmethod
+    def levels(date, sleep_quality=None, mental_load=None, hour=None):
+        """Các (yếu tố, mức) mà 1 check-in cộng vào (giờ check-in `hour` 0-23 nếu biết), gồm cả OVERALL"""
+        levels = [OVERALL]
+        if date is not None:
+            levels.append(('weekday', _key(_weekday(date))))
+        for factor, value in (('sleep', sleep_quality), ('mental', mental_load)):
+            if not _missing(value):
+                levels.append((factor, _key(value)))
+        if not _missing(hour):
+            levels.append(('session', _slot_type(int(hour) * 60)))
+        return levels
+
+    def update(self, date, energy_level, sleep_quality=None, mental_load=None, hour=None):
+        """Thêm 1 check-in; thiếu năng lượng thì bỏ qua"""
+        if _missing(energy_level):
+            return
+        for level in self.levels(date, sleep_quality, mental_load, hour):
+            stats = self.stats.setdefault(level, [0, 0.0])
+            stats[0] += 1
+            stats[1] += float(energy_level)
+
+    @property
+    def count(self):
+        return self.stats.get(OVERALL, (0, 0.0))[0]
+
+    @property
+    def mean(self):
+        count, total = self.stats.get(OVERALL, (0, 0.0))
+        return total / count if count else 0.0
+
+    def _offset(self, factor, value):
+        count, total = self.stats.get((factor, _key(value)), (0, 0.0))
+        if not count:
+            return 0.0
+        return (total / count - self.mean) * count / (count + PRIOR)
+
+    def predict(self, weekday=None, sleep_quality=None, mental_load=None, session=None):
+        """Năng lượng dự đoán (1-10, 1 chữ số thập phân); None nếu chưa có check-in nào"""
+        if not self.count:
+            return None
+        keys = {'weekday': weekday, 'sleep': sleep_quality, 'mental': mental_load, 'session': session}
+        energy = self.mean + sum(self._offset(factor, value) for factor, value in keys.items() if value is not None)
+        return round(min(max(energy, 1.0), 10.0), 1)
+
+    def weekday_energy(self):
+        """Năng lượng thường thấy theo thứ (cho plan_week); thứ chưa có mẫu thì không có key"""
+        return {int(level): self.predict(int(level)) for factor, level in self.stats if factor == 'weekday'}
+
+    def deep_sessions(self):
+        """Buổi nên xếp học sâu: buổi sáng, trừ khi buổi khác đủ mẫu và cao hơn rõ rệt"""
+        def score(session):
+            return self._offset('session', session)
+
+        evidenced = [s for s in DEEP_CANDIDATES
+                     if self.stats.get(('session', s), (0,))[0] >= MIN_EVIDENCE]
+        if not evidenced:
+            return ('Sáng',)
+        best = max(evidenced, key=score)
+        if best != 'Sáng' and score(best) - score('Sáng') >= SESSION_MARGIN:
+            return (best,)
+        return ('Sáng',)
+
+    def rows(self):
+        """Các dòng để lưu vào bảng energy_profile_stats"""
+        return [{'factor': factor, 'level': level, 'n': count, 'energy_sum': total}
+                for (factor, level), (count, total) in self.stats.items()]
+
+    @classmethod
+    def from_rows(cls, rows):
+        profile = cls()
+        for row in rows:
+            profile.stats[(row['factor'], row['level'])] = [int(row['n']), float(row['energy_sum'])]
+        return profile
+
+    def __eq__(self, other):
+        return isinstance(other, EnergyProfile) and self.stats == other.stats
+
+    def __repr__(self):
+        return f"EnergyProfile(count={self.count}, mean={self.mean:.2f}, deep={self.deep_sessions()})"
@@ -0,0 +1,287 @@
+"""
+Tập khoảng thời gian theo phút cho scheduler.
+
+Thời gian là số phút tính từ 00:00 của ngày đang xếp lịch; giờ đã qua nửa
+đêm được cộng thêm 1440 (vd. 01:30 đêm nay = 1530), nên khung 22:00 → 02:00
+là 1 khoảng liền [1320, 1560). Mọi khoảng đều nửa mở [start, end).
+
+- IntervalSet: các khoảng rời nhau đã gộp — thêm (gộp), bớt (cắt), tìm khoảng
+  trống có lọc độ dài tối thiểu, kiểm tra chồng lấn; mỗi thao tác O(log n + k)
+- BlockSet: các khối cố định có id, được phép chồng nhau và lặp lại mỗi ngày
+  (khối 23:00 → 07:00 chiếm cả đầu buổi sáng lẫn cuối buổi tối); thêm/xóa/sửa
+  1 khối chỉ cập nhật phần hợp ở đúng vùng bị ảnh hưởng
+- DayMap: bản đồ chiếm chỗ từng phút (mảng NumPy 1 byte/phút) — đánh dấu /
+  trả lại, kiểm tra va chạm, đếm phút trống, tìm khoảng trống đều là phép toán
+  trên mảng
+"""
+
+import bisect
+import functools
+
+import numpy as np
+
+MINUTES_PER_DAY = 1440
+
+# Khung thời gian 2 ngày liên tiếp: hôm nay [0, 1440) và phần qua nửa đêm [1440, 2880)
+TIMELINE_END = 2 * MINUTES_PER_DAY
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_hhmm(value):
+    """'HH:MM' → số phút từ 00:00 (chấp nhận '24:00')"""
+    hours, minutes = value.strip().split(":")
+    minute = int(hours) * 60 + int(minutes)
+    if not 0 <= int(minutes) < 60 or not 0 <= minute <= MINUTES_PER_DAY:
+        raise ValueError(f"Giờ không hợp lệ: {value!r}")
+    return minute
+
+
+def format_hhmm(minute):
+    """Số phút → 'HH:MM' (giờ qua nửa đêm hiển thị lại từ 00:00)"""
+    return f"{minute // 60 % 24:02d}:{minute % 60:02d}"
+
+
+def clock_range(start, end):
+    """('22:00', '02:00') → (1320, 1560): giờ kết thúc nhỏ hơn giờ bắt đầu nghĩa là qua nửa đêm"""
+    start, end = parse_hhmm(start), parse_hhmm(end)
+    if end < start:
+        end += MINUTES_PER_DAY
+    return start, end
+
+
+def daily_occurrences(start, end):
+    """Các lần xuất hiện của 1 khối lặp mỗi ngày trên khung [0, TIMELINE_END)"""
+    occurrences = []
+    for shift in (-MINUTES_PER_DAY, 0, MINUTES_PER_DAY):
+        s, e = max(start + shift, 0), min(end + shift, TIMELINE_END)
+        if s < e:
+            occurrences.append((s, e))
+    return occurrences
+
+
+class IntervalSet:
+    """Các khoảng [start, end) rời nhau, đã sắp xếp; thêm thì gộp, bớt thì cắt"""
+
+    __slots__ = ('_starts', '_ends')
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        for start, end in intervals:
+            self.add(start, end)
+
+    def add(self, start, end):
+        """Thêm [start, end), gộp với các khoảng chồng lấn hoặc sát nhau"""
+        if end <= start:
+            return
+        i = bisect.bisect_left(self._ends, start)
+        j = bisect.bisect_right(self._starts, end)
+        if i < j:
+            start = min(start, self._starts[i])
+            end = max(end, self._ends[j - 1])
+        self._starts[i:j] = [start]
+        self._ends[i:j] = [end]
+
+    def remove(self, start, end):
+        """Bớt [start, end) khỏi tập, cắt đôi khoảng nếu cần"""
+        if end <= start:
+            return
+        i = bisect.bisect_right(self._ends, start)
+        j = bisect.bisect_left(self._starts, end)
+        if i >= j:
+            return
+        starts, ends = [], []
+        if self._starts[i] < start:
+            starts.append(self._starts[i])
+            ends.append(start)
+        if self._ends[j - 1] > end:
+            starts.append(end)
+            ends.append(self._ends[j - 1])
+        self._starts[i:j] = starts
+        self._ends[i:j] = ends
+
+    def overlaps(self, start, end):
+        """[start, end) có chạm vào khoảng nào trong tập không"""
+        i = bisect.bisect_right(self._ends, start)
+        return start < end and i < len(self._starts) and self._starts[i] < end
+
+    def gaps(self, start, end, min_length=1):
+        """Các khoảng trống trong [start, end) dài ít nhất min_length phút"""
+        min_length = max(min_length, 1)
+        result = []
+        current = start
+        i = bisect.bisect_right(self._ends, start)
+        while i < len(self._starts) and self._starts[i] < end:
+            if self._starts[i] - current >= min_length:
+                result.append((current, self._starts[i]))
+            current = max(current, self._ends[i])
+            i += 1
+        if end - current >= min_length:
+            result.append((current, end))
+        return result
+
+    def clip(self, start, end):
+        """Phần của tập nằm trong [start, end)"""
+        clipped = IntervalSet()
+        i = bisect.bisect_right(self._ends, start)
+        while i < len(self._starts) and self._starts[i] < end:
+            clipped._starts.append(max(self._starts[i], start))
+            clipped._ends.append(min(self._ends[i], end))
+            i += 1
+        return clipped
+
+    def total(self):
+        """Tổng số phút được phủ"""
+        return sum(self._ends) - sum(self._starts)
+
+    def copy(self):
+        clone = IntervalSet()
+        clone._starts = self._starts[:]
+        clone._ends = self._ends[:]
+        return clone
+
+    def __iter__(self):
+        return zip(self._starts, self._ends)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __eq__(self, other):
+        return isinstance(other, IntervalSet) and list(self) == list(other)
+
+    def __repr__(self):
+        return f"IntervalSet({list(self)!r})"
+
+
+class BlockSet:
+    """Các khối cố định theo id (được chồng nhau), luôn giữ sẵn phần hợp đã gộp"""
+
+    def __init__(self, blocks=(), repeat_daily=True):
+        self.repeat_daily = repeat_daily
+        self._blocks = {}          # id -> list các khoảng của khối đó
+        self._union = IntervalSet()
+        for block_id, start, end in blocks:
+            self.add(block_id, start, end)
+
+    def add(self, block_id, start, end):
+        """Thêm (hoặc thay) 1 khối; chỉ gộp thêm các khoảng của khối vào phần hợp"""
+        if block_id in self._blocks:
+            self.remove(block_id)
+        pieces = daily_occurrences(start, end) if self.repeat_daily else [(start, end)]
+        self._blocks[block_id] = pieces
+        for s, e in pieces:
+            self._union.add(s, e)
+
+    def remove(self, block_id):
+        """Xóa 1 khối: cắt vùng của nó khỏi phần hợp rồi phủ lại phần các khối khác còn che"""
+        pieces = self._blocks.pop(block_id, None)
+        if not pieces:
+            return
+        for s, e in pieces:
+            self._union.remove(s, e)
+            for others in self._blocks.values():
+                for os_, oe in others:
+                    if os_ < e and s < oe:
+                        self._union.add(max(s, os_), min(e, oe))
+
+    def move(self, block_id, start, end):
+        """Sửa giờ của 1 khối"""
+        self.add(block_id, start, end)
+
+    @property
+    def union(self):
+        return self._union
+
+    def busy_minutes(self, start, end):
+        """Số phút bận trong [start, end)"""
+        return self._union.clip(start, end).total()
+
+    def free(self, start, end, min_length=1):
+        """Khoảng trống trong khung [start, end)"""
+        return self._union.gaps(start, end, min_length)
+
+    def __contains__(self, block_id):
+        return block_id in self._blocks
+
+    def __iter__(self):
+        return iter(self._blocks)
+
+    def __len__(self):
+        return len(self._blocks)
+
+
+class DayMap:
+    """Bản đồ chiếm chỗ từng phút trên khung [0, TIMELINE_END) (gồm cả phần qua nửa đêm)"""
+
+    __slots__ = ('_busy',)
+
+    def __init__(self, intervals=()):
+        self._busy = np.zeros(TIMELINE_END, dtype=bool)
+        for start, end in intervals:
+            self.occupy(start, end)
+
+    @staticmethod
+    def _clip(start, end):
+        """Cắt về trong khung; khoảng rỗng/âm thành [start, start) để không bị slice âm của Python"""
+        start = min(max(start, 0), TIMELINE_END)
+        return start, min(max(end, start), TIMELINE_END)
+
+    def occupy(self, start, end):
+        """Đánh dấu [start, end) là bận"""
+        start, end = self._clip(start, end)
+        self._busy[start:end] = True
+
+    def release(self, start, end):
+        """Trả [start, end) về trống"""
+        start, end = self._clip(start, end)
+        self._busy[start:end] = False
+
+    def is_free(self, start, end):
+        """[start, end) trống hoàn toàn không (không va chạm khối nào)"""
+        start, end = self._clip(start, end)
+        return not self._busy[start:end].any()
+
+    def busy_minutes(self, start, end):
+        """Số phút bận trong [start, end)"""
+        start, end = self._clip(start, end)
+        return int(np.count_nonzero(self._busy[start:end]))
+
+    def _free_bounds(self, start, end):
+        """(mảng phút đầu, mảng phút cuối) của các khoảng trống liền trong [start, end)"""
+        start, end = self._clip(start, end)
+        window = self._busy[start:end]
+        if not len(window):
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        # Các điểm đổi trạng thái bận/trống; khoảng trống là các đoạn xen kẽ bắt đầu từ đoạn trống đầu tiên
+        bounds = np.concatenate(([0], np.flatnonzero(window[1:] != window[:-1]) + 1, [len(window)])) + start
+        first = 1 if window[0] else 0
+        return bounds[first:-1:2], bounds[first + 1::2]
+
+    def free_minutes(self, start, end, min_length=1):
+        """Số phút trống trong [start, end), chỉ tính các khoảng trống liền dài ít nhất min_length phút"""
+        if min_length <= 1:
+            start, end = self._clip(start, end)
+            return end - start - self.busy_minutes(start, end)
+        starts, ends = self._free_bounds(start, end)
+        lengths = ends - starts
+        return int(lengths[lengths >= min_length].sum())
+
+    def free_runs(self, start, end, min_length=1):
+        """Các khoảng trống liền trong [start, end) dài ít nhất min_length phút"""
+        starts, ends = self._free_bounds(start, end)
+        keep = ends - starts >= max(min_length, 1)
+        return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+    def first_fit(self, start, end, length):
+        """Phút bắt đầu của khoảng trống đầu tiên trong [start, end) đủ chứa `length` phút (None nếu không có)"""
+        starts, ends = self._free_bounds(start, end)
+        hits = np.flatnonzero(ends - starts >= max(length, 1))
+        return int(starts[hits[0]]) if len(hits) else None
+
+    def copy(self):
+        clone = DayMap()
+        clone._busy[:] = self._busy
+        return clone
+
+    def __eq__(self, other):
+        return isinstance(other, DayMap) and np.array_equal(self._busy, other._busy)
@@ -0,0 +1,421 @@
+"""
+Migration schema theo phiên bản.
+
+Mỗi migration có số phiên bản tăng dần và chỉ chạy đúng 1 lần; bảng
+schema_version ghi lại các phiên bản đã áp dụng. App gọi init_database()
+nhưng việc thật sự chỉ diễn ra lần đầu trong process — các lần rerun sau
+không gửi câu DDL nào tới database.
+
+Chạy tay (admin):
+    python -m utils.migrations            # áp dụng migration còn thiếu
+    python -m utils.migrations --status   # xem phiên bản hiện tại
+
+Câu lệnh của 1 migration là list (chung cho mọi backend) hoặc dict
+{'postgres': [...], 'sqlite': [...]} khi cú pháp hai bên khác nhau.
+"""
+
+# Khóa advisory để nhiều process khởi động cùng lúc không chạy migration chồng nhau
+MIGRATION_LOCK_ID = 742_019_001
+
+_INITIAL_TABLES = [
+    # Bảng check-in hàng ngày
+    """
+    CREATE TABLE IF NOT EXISTS daily_checkins (
+        id SERIAL PRIMARY KEY,
+        username TEXT NOT NULL,
+        date TEXT NOT NULL,
+        mental_load TEXT,
+        energy_level INTEGER,
+        pressure_source TEXT,
+        sleep_quality INTEGER,
+        tasks TEXT,
+        task_feeling TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(username, date)
+    )
+    """,
+    # Bảng metadata tasks
+    """
+    CREATE TABLE IF NOT EXISTS task_metadata (
+        id SERIAL PRIMARY KEY,
+        username TEXT NOT NULL,
+        checkin_date TEXT,
+        task_name TEXT,
+        estimated_time INTEGER,
+        priority TEXT,
+        task_type TEXT
+    )
+    """,
+    # Bảng lịch cố định
+    """
+    CREATE TABLE IF NOT EXISTS fixed_schedules (
+        id SERIAL PRIMARY KEY,
+        username TEXT NOT NULL,
+        checkin_date TEXT,
+        schedule_name TEXT,
+        start_time TEXT,
+        end_time TEXT
+    )
+    """,
+    # Bảng lịch sử tuần
+    """
+    CREATE TABLE IF NOT EXISTS weekly_history (
+        id SERIAL PRIMARY KEY,
+        username TEXT NOT NULL,
+        week_start TEXT,
+        week_end TEXT,
+        total_checkins INTEGER,
+        avg_energy REAL,
+        data_json TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Bảng ghi chú cải thiện
+    """
+    CREATE TABLE IF NOT EXISTS improvement_notes (
+        id SERIAL PRIMARY KEY,
+        username TEXT NOT NULL,
+        week_start TEXT,
+        note_content TEXT,
+        note_type TEXT,
+        applied INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Bảng playbook
+    """
+    CREATE TABLE IF NOT EXISTS playbook (
+        id SERIAL PRIMARY KEY,
+        username TEXT NOT NULL,
+        rule_title TEXT,
+        trigger TEXT,
+        action TEXT,
+        tested_week TEXT,
+        result TEXT,
+        status TEXT DEFAULT 'testing',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+# Mỗi (user, tuần) 1 dòng tổng + số lượng, cập nhật cùng lúc với check-in;
+# trung bình = tổng / số lượng nên không phải quét lại daily_checkins
+_WEEKLY_ROLLUPS_TABLE = """
+    CREATE TABLE IF NOT EXISTS weekly_rollups (
+        username TEXT NOT NULL,
+        week_start DATE NOT NULL,
+        checkin_count INTEGER NOT NULL DEFAULT 0,
+        energy_sum INTEGER NOT NULL DEFAULT 0,
+        energy_count INTEGER NOT NULL DEFAULT 0,
+        sleep_sum INTEGER NOT NULL DEFAULT 0,
+        sleep_count INTEGER NOT NULL DEFAULT 0,
+        task_sum INTEGER NOT NULL DEFAULT 0,
+        mental_load_sum INTEGER NOT NULL DEFAULT 0,
+        mental_load_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (username, week_start)
+    )
+"""
+
+_WEEKLY_ROLLUPS_BACKFILL = """
+    INSERT INTO weekly_rollups
+        (username, week_start, checkin_count, energy_sum, energy_count, sleep_sum, sleep_count,
+         task_sum, mental_load_sum, mental_load_count)
+    SELECT username, week_start, COUNT(*),
+           COALESCE(SUM(energy_level), 0), COUNT(energy_level),
+           COALESCE(SUM(sleep_quality), 0), COUNT(sleep_quality),
+           COALESCE(SUM(task_count), 0),
+           COALESCE(SUM(mental_score), 0), COUNT(mental_score)
+    FROM (
+        SELECT username, {week_start} AS week_start, energy_level, sleep_quality, task_count,
+               CASE mental_load
+                   WHEN 'Nhẹ nhàng' THEN 1 WHEN 'Bình thường' THEN 2
+                   WHEN 'Nặng' THEN 3 WHEN 'Cực nặng' THEN 4
+               END AS mental_score
+        FROM daily_checkins
+    ) AS days
+    GROUP BY username, week_start
+"""
+
+# Kết quả create_daily_schedule theo fingerprint đầu vào (tầng lưu trữ của cache scheduler)
+_SCHEDULE_CACHE_TABLE = """
+    CREATE TABLE IF NOT EXISTS schedule_cache (
+        fingerprint TEXT PRIMARY KEY,
+        result JSONB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+_SCHEDULE_CACHE_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_schedule_cache_created
+        ON schedule_cache (created_at)
+"""
+
+# Hồ sơ năng lượng dạng JSON (migration 6) — thay bằng energy_profile_stats ở migration 7
+_ENERGY_PROFILES_TABLE = """
+    CREATE TABLE IF NOT EXISTS energy_profiles (
+        username TEXT PRIMARY KEY,
+        profile JSONB NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Hồ sơ năng lượng của mỗi user (utils/energy_profile.py): 1 dòng (số mẫu, tổng năng lượng)
+# cho mỗi (yếu tố, mức); batch ghi check-in cộng dồn bằng INSERT ... ON CONFLICT DO UPDATE
+_ENERGY_PROFILE_STATS_TABLE = """
+    CREATE TABLE IF NOT EXISTS energy_profile_stats (
+        username TEXT NOT NULL,
+        factor TEXT NOT NULL,
+        level TEXT NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+        energy_sum REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (username, factor, level)
+    )
+"""
+
+MIGRATIONS = [
+    (1, "Tạo các bảng ban đầu", {
+        'postgres': _INITIAL_TABLES,
+        # Giống hệt schema của các file data/*.db cũ
+        'sqlite': [
+            statement.replace("SERIAL PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT")
+            for statement in _INITIAL_TABLES
+        ],
+    }),
+    (2, "Index theo user cho các đường tra cứu", [
+        # get_task_metadata / save_task_metadata: WHERE username, checkin_date ORDER BY id
+        """
+        CREATE INDEX IF NOT EXISTS idx_task_metadata_user_date
+            ON task_metadata (username, checkin_date, id)
+        """,
+        # get_fixed_schedule / save_fixed_schedule: WHERE username, checkin_date ORDER BY start_time
+        """
+        CREATE INDEX IF NOT EXISTS idx_fixed_schedules_user_date
+            ON fixed_schedules (username, checkin_date, start_time)
+        """,
+        # get_weekly_history: WHERE username ORDER BY created_at DESC LIMIT n
+        """
+        CREATE INDEX IF NOT EXISTS idx_weekly_history_user_created
+            ON weekly_history (username, created_at DESC)
+        """,
+        # is_new_week: WHERE username AND week_start
+        """
+        CREATE INDEX IF NOT EXISTS idx_weekly_history_user_week
+            ON weekly_history (username, week_start)
+        """,
+        # get_improvement_notes: WHERE username [AND week_start] ORDER BY created_at DESC
+        """
+        CREATE INDEX IF NOT EXISTS idx_improvement_notes_user_created
+            ON improvement_notes (username, created_at DESC)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_improvement_notes_user_week
+            ON improvement_notes (username, week_start, created_at DESC)
+        """,
+        # get_all_playbook_rules: WHERE username ORDER BY created_at DESC
+        """
+        CREATE INDEX IF NOT EXISTS idx_playbook_user_created
+            ON playbook (username, created_at DESC)
+        """,
+    ]),
+    (3, "tasks kiểu JSONB, cột ngày kiểu DATE, thêm task_count", {
+        'postgres': [
+            # JSON text → JSONB: psycopg2 trả về list Python sẵn, không cần json.loads
+            """
+            ALTER TABLE daily_checkins
+                ALTER COLUMN tasks TYPE JSONB USING (
+                    CASE WHEN tasks IS NULL OR btrim(tasks) IN ('', 'None', 'null')
+                         THEN '[]'::jsonb
+                         ELSE tasks::jsonb
+                    END
+                )
+            """,
+            # Số công việc tính sẵn khi ghi, luôn khớp với tasks
+            """
+            ALTER TABLE daily_checkins
+                ADD COLUMN IF NOT EXISTS task_count INTEGER GENERATED ALWAYS AS (
+                    CASE WHEN jsonb_typeof(tasks) = 'array' THEN jsonb_array_length(tasks) ELSE 0 END
+                ) STORED
+            """,
+            # TEXT → DATE: so sánh khoảng ngày dùng được index (username, date)
+            """
+            ALTER TABLE daily_checkins
+                ALTER COLUMN date TYPE DATE USING date::date
+            """,
+            """
+            ALTER TABLE task_metadata
+                ALTER COLUMN checkin_date TYPE DATE USING NULLIF(btrim(checkin_date), '')::date
+            """,
+            """
+            ALTER TABLE fixed_schedules
+                ALTER COLUMN checkin_date TYPE DATE USING NULLIF(btrim(checkin_date), '')::date
+            """,
+            """
+            ALTER TABLE weekly_history
+                ALTER COLUMN week_start TYPE DATE USING NULLIF(btrim(week_start), '')::date,
+                ALTER COLUMN week_end TYPE DATE USING NULLIF(btrim(week_end), '')::date
+            """,
+            """
+            ALTER TABLE improvement_notes
+                ALTER COLUMN week_start TYPE DATE USING NULLIF(btrim(week_start), '')::date
+            """,
+        ],
+        # SQLite không đổi được kiểu cột tại chỗ: dựng lại bảng theo cách chuẩn
+        # (tạo bảng mới → chép dữ liệu → xóa bảng cũ → đổi tên). Kiểu khai báo
+        # "JSON" để sqlite3 tự giải mã tasks thành list; ngày vẫn là chuỗi ISO,
+        # so sánh chuỗi 'YYYY-MM-DD' đúng thứ tự nên index vẫn dùng được.
+        'sqlite': [
+            """
+            CREATE TABLE daily_checkins_v3 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                date TEXT NOT NULL,
+                mental_load TEXT,
+                energy_level INTEGER,
+                pressure_source TEXT,
+                sleep_quality INTEGER,
+                tasks JSON,
+                task_feeling TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                task_count INTEGER GENERATED ALWAYS AS (
+                    CASE WHEN json_type(tasks) = 'array' THEN json_array_length(tasks) ELSE 0 END
+                ) STORED,
+                UNIQUE(username, date)
+            )
+            """,
+            """
+            INSERT INTO daily_checkins_v3 (id, username, date, mental_load, energy_level,
+                                           pressure_source, sleep_quality, tasks, task_feeling, created_at)
+            SELECT id, username, date, mental_load, energy_level,
+                   pressure_source, sleep_quality,
+                   CASE WHEN json_valid(tasks) THEN tasks ELSE '[]' END,
+                   task_feeling, created_at
+            FROM daily_checkins
+            """,
+            "DROP TABLE daily_checkins",
+            "ALTER TABLE daily_checkins_v3 RENAME TO daily_checkins",
+        ],
+    }),
+    (4, "Bảng tổng hợp tuần weekly_rollups", {
+        'postgres': [
+            _WEEKLY_ROLLUPS_TABLE,
+            # Điền sẵn từ check-in đã có; date_trunc('week') là thứ 2 (ISO)
+            _WEEKLY_ROLLUPS_BACKFILL.format(week_start="date_trunc('week', date)::date"),
+        ],
+        'sqlite': [
+            _WEEKLY_ROLLUPS_TABLE.replace("DATE", "TEXT"),
+            # strftime('%w'): 0 = chủ nhật → lùi về thứ 2 cùng tuần
+            _WEEKLY_ROLLUPS_BACKFILL.format(
+                week_start="date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days')"
+            ),
+        ],
+    }),
+    (5, "Bảng cache kết quả xếp lịch schedule_cache", {
+        'postgres': [_SCHEDULE_CACHE_TABLE, _SCHEDULE_CACHE_INDEX],
+        # Cột khai báo JSON → converter của SQLiteBackend trả về dict như JSONB
+        'sqlite': [_SCHEDULE_CACHE_TABLE.replace("JSONB", "JSON"), _SCHEDULE_CACHE_INDEX],
+    }),
+    # Không điền sẵn: hồ sơ được học từ lịch sử ở lần đọc đầu tiên của mỗi user (get_energy_profile)
+    (6, "Bảng hồ sơ năng lượng energy_profiles", {
+        'postgres': [_ENERGY_PROFILES_TABLE],
+        'sqlite': [_ENERGY_PROFILES_TABLE.replace("JSONB", "JSON")],
+    }),
+    # Cũng không điền sẵn: lần đọc đầu tiên của mỗi user học lại từ lịch sử
+    (7, "Hồ sơ năng lượng dạng tổng cộng dồn energy_profile_stats", [
+        "DROP TABLE IF EXISTS energy_profiles",
+        _ENERGY_PROFILE_STATS_TABLE,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def statements_for(statements, dialect):
+    """Câu lệnh của 1 migration cho backend cụ thể"""
+    if isinstance(statements, dict):
+        return statements[dialect]
+    return statements
+
+
+def get_schema_version(conn, dialect="postgres"):
+    """Phiên bản schema hiện tại (0 nếu chưa có bảng schema_version)"""
+    cur = conn.cursor()
+    if dialect == "sqlite":
+        cur.execute("SELECT COUNT(*) > 0 AS found FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'")
+    else:
+        cur.execute("SELECT to_regclass('schema_version') IS NOT NULL AS found")
+    if not cur.fetchone()['found']:
+        cur.close()
+        return 0
+    cur.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+    version = cur.fetchone()['version']
+    cur.close()
+    return version
+
+
+def run_migrations(conn, target=None, dialect="postgres"):
+    """Áp dụng các migration còn thiếu trong 1 transaction, trả về list phiên bản vừa chạy"""
+    target = LATEST_VERSION if target is None else target
+    cur = conn.cursor()
+
+    # Giữ khóa tới hết transaction; process khác sẽ chờ rồi thấy schema đã mới
+    if dialect == "sqlite":
+        # SQLite: giữ khóa ghi của cả file ngay từ đầu (BEGIN IMMEDIATE)
+        conn.commit()
+        cur.execute("BEGIN IMMEDIATE")
+    else:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+    current = cur.fetchone()['version']
+
+    applied = []
+    for version, name, statements in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        for statement in statements_for(statements, dialect):
+            cur.execute(statement)
+        cur.execute(
+            "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+            (version, name)
+        )
+        applied.append(version)
+
+    conn.commit()
+    cur.close()
+    return applied
+
+
+def main(argv=None):
+    """Lệnh admin: python -m utils.migrations [--status]"""
+    import argparse
+    from utils.database import get_backend
+
+    parser = argparse.ArgumentParser(description="Migration schema Mind Balance")
+    parser.add_argument("--status", action="store_true", help="Chỉ in phiên bản hiện tại")
+    args = parser.parse_args(argv)
+
+    backend = get_backend()
+    try:
+        with backend.connection() as conn:
+            current = get_schema_version(conn, backend.dialect)
+            print(f"Phiên bản schema ({backend.dialect}): {current} (mới nhất: {LATEST_VERSION})")
+            if args.status:
+                return
+            applied = run_migrations(conn, dialect=backend.dialect)
+        if applied:
+            print(f"✅ Đã áp dụng migration: {', '.join(str(v) for v in applied)}")
+        else:
+            print("✅ Schema đã là phiên bản mới nhất")
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
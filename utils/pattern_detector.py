@@ -1,54 +1,182 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
 import pandas as pd
-import json
+
+MIN_DAYS = 3
+
+# Số việc từ mức này trở lên là ngày "quá nhiều việc" ở trang Tổng kết tuần
+HEAVY_TASK_DAY = 8
+
+# Thứ tự các pattern khi hiển thị (giữ như bản gốc)
+PATTERN_KINDS = ['energy_crash', 'task_overload', 'sleep_energy_gap', 'low_energy_days']
+
+FINDING_COLUMNS = ['username', 'kind', 'date', 'value', 'reference']
+
+
+class Pattern(NamedTuple):
+    """1 phát hiện dạng dữ liệu: so sánh, cache, lưu JSON (_asdict) được; chỉ thành câu chữ khi hiển thị"""
+    kind: str                   # energy_crash, task_overload, ..., worst_day, low_sleep_days, heavy_task_days
+    date: Optional[str]         # ngày liên quan, None nếu là pattern của cả tuần
+    magnitude: float            # số chính: điểm giảm, số việc, chênh lệch năng lượng, số ngày...
+    evidence: tuple = ()        # số liệu kèm theo, ý nghĩa theo từng kind (xem _DESCRIPTIONS)
+
+
+_EMOJI = {
+    'energy_crash': '⚠️',
+    'task_overload': '📋',
+    'sleep_energy_gap': '😴',
+    'low_energy_days': '🔋',
+    'worst_day': '⚠️',
+    'low_sleep_days': '😴',
+    'heavy_task_days': '📋',
+}
+
+_DESCRIPTIONS = {
+    'energy_crash': lambda p: f"Năng lượng giảm mạnh {int(p.magnitude)} điểm vào ngày {p.date}",
+    # evidence = (số việc trung bình,)
+    'task_overload': lambda p: (
+        f"Quá tải công việc vào {p.date}: {int(p.magnitude)} việc (trung bình: {p.evidence[0]:.1f})"
+    ),
+    # evidence = (năng lượng TB khi ngủ kém, năng lượng TB khi ngủ tốt)
+    'sleep_energy_gap': lambda p: (
+        f"Giấc ngủ kém ảnh hưởng đến năng lượng: TB {p.evidence[0]:.1f} vs {p.evidence[1]:.1f}"
+    ),
+    # evidence = các ngày năng lượng thấp
+    'low_energy_days': lambda p: f"Các ngày năng lượng thấp: {', '.join(p.evidence)}",
+    'worst_day': lambda p: f"{p.date} là ngày thấp nhất ({p.magnitude:g}/10)",
+    'low_sleep_days': lambda p: f"{int(p.magnitude)} ngày ngủ kém → Ảnh hưởng năng lượng",
+    # evidence = (ngưỡng số việc,)
+    'heavy_task_days': lambda p: f"{int(p.magnitude)} ngày quá nhiều việc (≥{p.evidence[0]} việc)",
+}
+
+
+def render_pattern(pattern, emoji=True):
+    """Câu hiển thị của 1 Pattern; emoji=False cho prompt AI"""
+    text = _DESCRIPTIONS[pattern.kind](pattern)
+    return f"{_EMOJI[pattern.kind]} {text}" if emoji else text
+
+
+def _group_mean(codes, n_groups, values, mask):
+    """Trung bình `values` theo nhóm, chỉ tính dòng thỏa `mask` và không NaN (NaN nếu nhóm rỗng)"""
+    keep = mask & ~np.isnan(values)
+    sums = np.bincount(codes, weights=np.where(keep, values, 0.0), minlength=n_groups)
+    counts = np.bincount(codes, weights=keep, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def detect_patterns_batch(df, user_col='username'):
+    """Phát hiện pattern cho NHIỀU user cùng lúc (data dạng dài: mỗi dòng 1 check-in).
+
+    Tính cả 4 pattern bằng phép toán theo nhóm trên mảng NumPy, 1 lần duyệt, không
+    lặp từng dòng và không sửa `df`. Trả về DataFrame mỗi dòng 1 phát hiện:
+    username, kind, date, value, reference — groupby(username) để lấy theo user.
+      - energy_crash:     date, value = số điểm giảm so với check-in trước
+      - task_overload:    date, value = số việc, reference = số việc TB của user
+      - sleep_energy_gap: value = năng lượng TB khi ngủ kém, reference = khi ngủ tốt
+      - low_energy_days:  date, value = năng lượng (chỉ khi user có ≥ 2 ngày như vậy)
+    User có ít hơn MIN_DAYS check-in được bỏ qua.
+    """
+    data = df[[user_col, 'date', 'energy_level', 'sleep_quality', 'task_count']]
+    data = data.sort_values([user_col, 'date'], kind='stable')
+    codes, users = pd.factorize(data[user_col])
+    n_users = len(users)
+    dates = data['date'].to_numpy()
+    energy = pd.to_numeric(data['energy_level'], errors='coerce').to_numpy(dtype=float)
+    sleep = pd.to_numeric(data['sleep_quality'], errors='coerce').to_numpy(dtype=float)
+    tasks = pd.to_numeric(data['task_count'], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+    enough = (np.bincount(codes, minlength=n_users) >= MIN_DAYS)[codes]
+    findings = []
+
+    def add(kind, mask, date, value, reference):
+        idx = np.flatnonzero(mask)
+        if len(idx):
+            findings.append(pd.DataFrame({
+                'code': codes[idx],
+                'kind': kind,
+                'date': date[idx] if date is not None else None,
+                'value': value[idx],
+                'reference': reference[idx] if reference is not None else np.nan,
+            }))
+
+    # Pattern 1: Energy crash — so với check-in liền trước của CÙNG user
+    same_user = np.zeros(len(codes), dtype=bool)
+    same_user[1:] = codes[1:] == codes[:-1]
+    change = np.full(len(energy), np.nan)
+    change[1:] = energy[1:] - energy[:-1]
+    with np.errstate(invalid='ignore'):
+        add('energy_crash', enough & same_user & (change < -3), dates, -change, None)
+
+    # Pattern 2: Task overload — nhiều hơn 1.5 lần trung bình của user
+    avg_tasks = _group_mean(codes, n_users, tasks, np.ones(len(tasks), dtype=bool))[codes]
+    add('task_overload', enough & (tasks > avg_tasks * 1.5), dates, tasks, avg_tasks)
+
+    # Pattern 3: Poor sleep correlation — 1 dòng cho mỗi user
+    with np.errstate(invalid='ignore'):
+        low_sleep = _group_mean(codes, n_users, energy, sleep <= 2)
+        good_sleep = _group_mean(codes, n_users, energy, sleep >= 4)
+        gap_users = (good_sleep - low_sleep > 2) & (np.bincount(codes, minlength=n_users) >= MIN_DAYS)
+    first_row = np.zeros(len(codes), dtype=bool)
+    first_row[np.unique(codes, return_index=True)[1]] = True
+    add('sleep_energy_gap', first_row & gap_users[codes], None, low_sleep[codes], good_sleep[codes])
+
+    # Pattern 4: Consistent low energy days — cần ít nhất 2 ngày
+    with np.errstate(invalid='ignore'):
+        low_energy = energy <= 4
+    low_counts = np.bincount(codes, weights=low_energy, minlength=n_users)
+    add('low_energy_days', enough & low_energy & (low_counts >= 2)[codes], dates, energy, None)
+
+    if not findings:
+        return pd.DataFrame(columns=FINDING_COLUMNS)
+    result = pd.concat(findings, ignore_index=True)
+    result['kind'] = pd.Categorical(result['kind'], categories=PATTERN_KINDS, ordered=True)
+    result = result.sort_values(['code', 'kind'], kind='stable', ignore_index=True)
+    result.insert(0, 'username', users[result.pop('code').to_numpy()])
+    result['kind'] = result['kind'].astype(str)
+    return result
+
+
+def to_patterns(findings):
+    """Kết quả batch của 1 user → list Pattern theo thứ tự PATTERN_KINDS"""
+    patterns = []
+    for kind, group in findings.groupby('kind', sort=False):
+        if kind == 'low_energy_days':
+            patterns.append(Pattern(kind, None, float(len(group)), tuple(group['date'])))
+        elif kind == 'sleep_energy_gap':
+            row = next(group.itertuples())
+            patterns.append(Pattern(kind, None, row.reference - row.value, (row.value, row.reference)))
+        elif kind == 'task_overload':
+            patterns.extend(Pattern(kind, row.date, row.value, (row.reference,)) for row in group.itertuples())
+        else:
+            patterns.extend(Pattern(kind, row.date, row.value) for row in group.itertuples())
+    return patterns
+
 
 def detect_patterns(df):
-    """Phát hiện các pattern trong data"""
+    """Phát hiện các pattern trong data (list rỗng nếu chưa đủ MIN_DAYS ngày hoặc không có gì đáng lo)"""
+    if len(df) < MIN_DAYS:
+        return []
+
+    return to_patterns(detect_patterns_batch(df.assign(_user=0), user_col='_user'))
+
+
+def detect_week_highlights(df):
+    """Điểm đáng chú ý của tuần cho trang Tổng kết tuần: ngày thấp nhất, ngày ngủ kém, ngày nhiều việc"""
+    energy = pd.to_numeric(df['energy_level'], errors='coerce')
+    sleep = pd.to_numeric(df['sleep_quality'], errors='coerce')
+    tasks = pd.to_numeric(df['task_count'], errors='coerce')
     patterns = []
-    
-    if len(df) < 3:
-        return ["Chưa đủ dữ liệu để phân tích pattern (cần ít nhất 3 ngày)"]
-    
-    # Pattern 1: Energy crash
-    energy_changes = df['energy_level'].diff()
-    big_drops = energy_changes[energy_changes < -3]
-    
-    if len(big_drops) > 0:
-        for idx in big_drops.index:
-            date = df.loc[idx, 'date']
-            drop = abs(big_drops[idx])
-            patterns.append(
-                f"⚠️ Năng lượng giảm mạnh {int(drop)} điểm vào ngày {date}"
-            )
-    
-    # Pattern 2: Task overload
-    df['task_count'] = df['tasks'].apply(lambda x: len(json.loads(x)))
-    avg_tasks = df['task_count'].mean()
-    
-    overload_days = df[df['task_count'] > avg_tasks * 1.5]
-    if len(overload_days) > 0:
-        for _, row in overload_days.iterrows():
-            patterns.append(
-                f"📋 Quá tải công việc vào {row['date']}: {int(row['task_count'])} việc (trung bình: {avg_tasks:.1f})"
-            )
-    
-    # Pattern 3: Poor sleep correlation
-    low_sleep_days = df[df['sleep_quality'] <= 2]
-    if len(low_sleep_days) > 0:
-        avg_energy_low_sleep = low_sleep_days['energy_level'].mean()
-        avg_energy_good_sleep = df[df['sleep_quality'] >= 4]['energy_level'].mean()
-        
-        if avg_energy_good_sleep - avg_energy_low_sleep > 2:
-            patterns.append(
-                f"😴 Giấc ngủ kém ảnh hưởng đến năng lượng: TB {avg_energy_low_sleep:.1f} vs {avg_energy_good_sleep:.1f}"
-            )
-    
-    # Pattern 4: Consistent low energy days
-    low_energy_days = df[df['energy_level'] <= 4]
-    if len(low_energy_days) >= 2:
-        days = ", ".join(low_energy_days['date'].tolist())
-        patterns.append(f"🔋 Các ngày năng lượng thấp: {days}")
-    
-    if len(patterns) == 0:
-        patterns.append("✅ Tuần này khá ổn định, không có pattern đáng lo ngại!")
-    
-    return patterns
\ No newline at end of file
+
+    if energy.notna().any():
+        worst = energy.idxmin()
+        if energy[worst] < 5:
+            patterns.append(Pattern('worst_day', df.at[worst, 'date'], float(energy[worst])))
+    low_sleep = int((sleep <= 2).sum())
+    if low_sleep:
+        patterns.append(Pattern('low_sleep_days', None, float(low_sleep)))
+    heavy = int((tasks >= HEAVY_TASK_DAY).sum())
+    if heavy:
+        patterns.append(Pattern('heavy_task_days', None, float(heavy), (HEAVY_TASK_DAY,)))
+    return patterns
@@ -1,6 +1,23 @@
+"""
+Prompt gửi AI: tổng kết tuần và lịch hàng ngày theo framework.
+
+Mọi đoạn văn cố định (kho framework, khung từng phần prompt) là PromptTemplate
+cấp module, điền bằng str.format_map (không sinh code lúc chạy). Hàm build_* chỉ đổ
+các mảnh đã điền vào 1 list rồi "".join 1 lần ở cuối — không dựng lại dict
+framework mỗi lần gọi, không cộng chuỗi dần hay iterrows theo từng ngày.
+
+    python -m benchmarks.bench_prompts     # chi phí 1 prompt với 7 → 365 ngày dữ liệu
+"""
+
+import functools
+import string
+from datetime import datetime, timedelta
+
 import pandas as pd
-import json
-from datetime import datetime
+
+from utils.cache import fingerprint
+from utils.pattern_detector import render_pattern
+
 
 def _safe_int(val):
     """Chuyển đổi an toàn sang int, xử lý None, string, float từ Supabase"""
@@ -10,77 +27,65 @@ def _safe_int(val):
         return 0
 
 
-def _parse_tasks(val):
-    """Parse tasks an toàn — xử lý cả list và string JSON"""
-    if isinstance(val, list):
-        return val
-    if isinstance(val, str):
-        try:
-            return json.loads(val)
-        except Exception:
-            return []
-    return []
+# ===== TEMPLATE =====
 
+class PromptTemplate:
+    """Chuỗi kiểu str.format cấp module; các ô là tên biến Python, đọc sẵn 1 lần khi import"""
+
+    __slots__ = ('fields', '_text')
+
+    def __init__(self, text):
+        fields = []
+        for _, field, _, conversion in string.Formatter().parse(text):
+            if field is None:
+                continue
+            if not field.isidentifier() or conversion:
+                raise ValueError(f"Ô template không hợp lệ: {{{field}}}")
+            fields.append(field)
+        self.fields = tuple(dict.fromkeys(fields))
+        self._text = text
+
+    def render(self, **values):
+        """Điền các ô (thừa key thì bỏ qua)"""
+        return self._text.format_map(values)
+
+    def render_into(self, out, values):
+        """Thêm mảnh đã điền `values` vào list `out` (ghép 1 lần ở cuối bằng "".join)"""
+        out.append(self._text.format_map(values))
+        return out
 
-def build_weekly_prompt(df, patterns):
-    """Tạo AI prompt từ data tuần"""
-    
-    if len(df) == 0:
-        return "Chưa có dữ liệu để tạo prompt"
-    
-    df['energy_level'] = pd.to_numeric(df['energy_level'], errors='coerce').fillna(0)
-    avg_energy = df['energy_level'].replace(0, float('nan')).mean()
-    def _safe_parse_tasks(x):
-        if isinstance(x, list): return len(x)
-        if not x or str(x).strip() in ('', 'None', 'null'): return 0
-        try: return len(json.loads(x))
-        except: return 0
-    df = df.copy()
-    df['task_count'] = df['tasks'].apply(_safe_parse_tasks)
-    avg_tasks = df['task_count'].mean()
-    
-    df = df.reset_index(drop=True)
-    worst_day = df.loc[df['energy_level'].idxmin()] if df['energy_level'].max() > 0 else df.iloc[0]
-    best_day = df.loc[df['energy_level'].idxmax()] if df['energy_level'].max() > 0 else df.iloc[0]
-    
-    prompt = f"""# BỐI CẢNH TUẦN VỪA QUA
 
-Tôi đã theo dõi trạng thái tinh thần và năng lượng trong {len(df)} ngày. Dưới đây là dữ liệu chi tiết:
+# ===== PROMPT TUẦN =====
+
+WEEKLY_EMPTY = "Chưa có dữ liệu để tạo prompt"
+
+WEEKLY_HEADER = PromptTemplate("""# BỐI CẢNH TUẦN VỪA QUA
+
+Tôi đã theo dõi trạng thái tinh thần và năng lượng trong {days} ngày. Dưới đây là dữ liệu chi tiết:
 
 ## DỮ LIỆU TỔNG QUAN
 - Năng lượng trung bình: {avg_energy:.1f}/10
 - Số công việc trung bình mỗi ngày: {avg_tasks:.1f} việc
-- Ngày tốt nhất: {best_day['date']} ({best_day['energy_level']}/10)
-- Ngày tệ nhất: {worst_day['date']} ({worst_day['energy_level']}/10)
+- Ngày tốt nhất: {best_date} ({best_energy}/10)
+- Ngày tệ nhất: {worst_date} ({worst_energy}/10)
 
 ## CHI TIẾT TỪNG NGÀY
-"""
-    
-    for _, row in df.iterrows():
-        raw = row['tasks']
-        if isinstance(raw, list):
-            tasks = raw
-        else:
-            try:
-                tasks = json.loads(str(raw)) if raw and str(raw).strip() not in ('', 'None', 'null') else []
-            except:
-                tasks = []
-        prompt += f"""
-### {row['date']}
-- Trạng thái tinh thần: {row['mental_load']}
-- Năng lượng: {row['energy_level']}/10
-- Nguồn áp lực: {row['pressure_source']}
-- Giấc ngủ: {'⭐' * int(float(row['sleep_quality'] or 0))}
-- Số công việc: {len(tasks)} việc
-- Cảm giác khi nhìn danh sách: {row['task_feeling']}
-"""
-    
-    prompt += "\n## CÁC XU HƯỚNG PHÁT HIỆN\n"
-    for i, pattern in enumerate(patterns, 1):
-        clean = pattern.replace('⚠️','').replace('📋','').replace('😴','').replace('🔋','').replace('✅','').strip()
-        prompt += f"{i}. {clean}\n"
-    
-    prompt += """
+""")
+
+WEEKLY_DAY = PromptTemplate("""
+### {date}
+- Trạng thái tinh thần: {mental_load}
+- Năng lượng: {energy_level}/10
+- Nguồn áp lực: {pressure_source}
+- Giấc ngủ: {stars}
+- Số công việc: {task_count} việc
+- Cảm giác khi nhìn danh sách: {task_feeling}
+""")
+
+WEEKLY_PATTERNS = "\n## CÁC XU HƯỚNG PHÁT HIỆN\n"
+WEEKLY_PATTERN = PromptTemplate("{index}. {text}\n")
+
+WEEKLY_FOOTER = """
 ---
 
 Dựa trên dữ liệu này, hãy:
@@ -96,41 +101,331 @@ Ví dụ giải pháp tốt:
 
 Hãy đưa ra giải pháp dựa trên XU HƯỚNG CỤ THỂ trong dữ liệu của tôi.
 """
-    return prompt
 
+_DAY_COLUMNS = ('date', 'mental_load', 'energy_level', 'pressure_source',
+                'sleep_quality', 'task_count', 'task_feeling')
 
-def build_daily_framework_prompt_with_schedule(date, data, framework_name):
+
+def build_weekly_prompt(df, patterns):
+    """Tạo AI prompt từ data tuần (patterns: list Pattern của utils.pattern_detector)"""
+    
+    if len(df) == 0:
+        return WEEKLY_EMPTY
+    
+    df = df.reset_index(drop=True)
+    energy = pd.to_numeric(df['energy_level'], errors='coerce').fillna(0)
+    task_count = pd.to_numeric(df['task_count'], errors='coerce').fillna(0).astype(int)
+    columns = {column: df[column].tolist() for column in _DAY_COLUMNS}
+    columns['energy_level'] = energy.tolist()
+    columns['task_count'] = task_count.tolist()
+
+    if energy.max() > 0:
+        worst, best = int(energy.idxmin()), int(energy.idxmax())
+    else:
+        worst = best = 0
+    dates, levels = columns['date'], columns['energy_level']
+
+    out = WEEKLY_HEADER.render_into([], {
+        'days': len(df),
+        'avg_energy': energy.replace(0, float('nan')).mean(),
+        'avg_tasks': task_count.mean(),
+        'best_date': dates[best], 'best_energy': levels[best],
+        'worst_date': dates[worst], 'worst_energy': levels[worst],
+    })
+    for date, mental_load, energy_level, pressure_source, sleep_quality, count, task_feeling in zip(
+            *(columns[column] for column in _DAY_COLUMNS)):
+        out.append(WEEKLY_DAY.render(
+            date=date, mental_load=mental_load, energy_level=energy_level,
+            pressure_source=pressure_source, stars='⭐' * _safe_int(sleep_quality),
+            task_count=count, task_feeling=task_feeling))
+    
+    out.extend(_weekly_tail(patterns))
+    return "".join(out)
+
+
+def _weekly_tail(patterns):
+    """Phần xu hướng + lời dặn cuối prompt tuần"""
+    yield WEEKLY_PATTERNS
+    for index, pattern in enumerate(patterns, 1):
+        yield WEEKLY_PATTERN.render(index=index, text=render_pattern(pattern, emoji=False))
+    yield WEEKLY_FOOTER
+
+
+def _energy_value(value, as_float):
+    """Năng lượng 1 ngày như cột đã to_numeric + fillna(0) của build_weekly_prompt
+    (cột có ô trống thì pandas để kiểu float → in '7.0')"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = 0.0
+    if number != number:
+        number = 0.0
+    return number if as_float else int(number)
+
+
+def iter_weekly_prompt(rows, summary, patterns=()):
     """
-    Tạo prompt hàng ngày kết hợp lịch cố định và framework khoa học.
+    Prompt tuần dạng generator: cùng nội dung build_weekly_prompt nhưng yield từng mảnh,
+    đọc `rows` lần lượt nên bộ nhớ không tăng theo số ngày (xuất file, lịch sử dài)
+
+    Args:
+        rows: iterable dict theo ngày, cũ → mới, có các key của _DAY_COLUMNS (vd. cursor database)
+        summary: dict số liệu phần tổng quan, tính trước khi duyệt rows (vd. bằng 1 câu SQL):
+            days, avg_energy, avg_tasks, best_date, best_energy, worst_date, worst_energy,
+            missing_energy (có ngày thiếu năng lượng)
+        patterns: list Pattern cho phần xu hướng
     """
+    if not summary['days']:
+        yield WEEKLY_EMPTY
+        return
+
+    as_float = bool(summary.get('missing_energy'))
+    yield WEEKLY_HEADER.render(
+        days=summary['days'],
+        avg_energy=float('nan') if summary['avg_energy'] is None else summary['avg_energy'],
+        avg_tasks=summary['avg_tasks'],
+        best_date=summary['best_date'], best_energy=_energy_value(summary['best_energy'], as_float),
+        worst_date=summary['worst_date'], worst_energy=_energy_value(summary['worst_energy'], as_float),
+    )
+    for row in rows:
+        yield WEEKLY_DAY.render(
+            date=row['date'], mental_load=row['mental_load'],
+            energy_level=_energy_value(row['energy_level'], as_float),
+            pressure_source=row['pressure_source'], stars='⭐' * _safe_int(row['sleep_quality']),
+            task_count=_safe_int(row['task_count']), task_feeling=row['task_feeling'])
+    yield from _weekly_tail(patterns)
+
+
+def weekly_prompt_fingerprint(df):
+    """SHA-256 của đúng các cột build_weekly_prompt đọc (pattern cũng suy ra từ các cột này)"""
+    if len(df) == 0:
+        return fingerprint(['weekly'])
+    return fingerprint(['weekly', [df[column].tolist() for column in _DAY_COLUMNS]])
 
-    tasks      = data.get('tasks', [])
-    tasks_meta = data.get('tasks_meta', [])
-    fixed_schedule = data.get('fixed_schedule', [])
-    energy     = data.get('energy_level', 5)
 
-    # Tính tổng thời gian — dùng _safe_int để xử lý mọi kiểu từ Supabase
-    total_minutes = sum(_safe_int(t.get('estimated_time')) for t in tasks_meta)
-    total_h = total_minutes // 60
-    total_m = total_minutes % 60
+# ===== PROMPT NHIỀU TUẦN / THÁNG (giới hạn độ dài) =====
+
+CHARS_PER_TOKEN = 3             # ước lượng thô cho tiếng Việt có dấu: ~3 ký tự / token
+HISTORY_MAX_CHARS = 8000        # ≈ 2.7k token
+
+HISTORY_HEADER = PromptTemplate("""# BỐI CẢNH {weeks} TUẦN VỪA QUA
+
+Tôi đã theo dõi trạng thái tinh thần và năng lượng trong {days} ngày. Các tuần cũ được tóm tắt theo tháng/tuần, các ngày gần nhất giữ nguyên chi tiết:
+
+## DỮ LIỆU TỔNG QUAN
+- Năng lượng trung bình: {energy}/10
+- Giấc ngủ trung bình: {sleep}/5
+- Số công việc trung bình mỗi ngày: {tasks} việc
+- Áp lực tinh thần trung bình: {mental}/4
+""")
+
+HISTORY_MONTHS = "\n## TÓM TẮT THEO THÁNG\n"
+HISTORY_WEEKS = "\n## TÓM TẮT THEO TUẦN\n"
+HISTORY_DAYS = "\n## CHI TIẾT CÁC NGÀY GẦN NHẤT\n"
+PERIOD_LINE = PromptTemplate(
+    "- {label} ({days} ngày): năng lượng {energy}/10, giấc ngủ {sleep}/5, {tasks} việc/ngày, áp lực {mental}/4\n"
+)
+OMITTED_LINE = PromptTemplate("- Trước đó: {months} tháng ({days} ngày) đã lược bớt\n")
+
+# Cột tổng của weekly_rollups: cộng được giữa các tuần nên gộp tuần → tháng không cần dữ liệu ngày
+_ROLLUP_SUMS = ('checkin_count', 'energy_sum', 'energy_count', 'sleep_sum', 'sleep_count',
+                'task_sum', 'mental_load_sum', 'mental_load_count')
+# Độ dài nhỏ nhất của 1 ngày chi tiết: lấy bao nhiêu ngày từ database là đủ cho 1 ngân sách
+MIN_DAY_CHARS = len(WEEKLY_DAY.render(date='', mental_load='', energy_level='', pressure_source='',
+                                      stars='', task_count='', task_feeling=''))
+
+
+def history_detail_days(max_chars=HISTORY_MAX_CHARS):
+    """Số ngày chi tiết tối đa vừa ngân sách — người gọi chỉ cần đọc chừng ấy ngày gần nhất"""
+    return max(0, max_chars // MIN_DAY_CHARS)
+
+
+def _sums(row):
+    """Dòng weekly_rollups → tuple tổng theo thứ tự _ROLLUP_SUMS"""
+    return tuple(int(row.get(column) or 0) for column in _ROLLUP_SUMS)
+
+
+def _merge(sums):
+    return tuple(map(sum, zip(*sums))) or (0,) * len(_ROLLUP_SUMS)
+
+
+def _period_values(totals):
+    """Tuple tổng (_ROLLUP_SUMS) → các số trung bình đã định dạng; chưa có dữ liệu thì '?'"""
+    days, energy, energy_n, sleep, sleep_n, tasks, mental, mental_n = totals
+
+    def average(total, count):
+        return f"{total / count:.1f}" if count else "?"
+
+    return {
+        'days': days,
+        'energy': average(energy, energy_n),
+        'sleep': average(sleep, sleep_n),
+        'tasks': average(tasks, days),
+        'mental': average(mental, mental_n),
+    }
+
+
+@functools.lru_cache(maxsize=4096)
+def _monday(date):
+    day = datetime.strptime(str(date)[:10], "%Y-%m-%d")
+    return (day - timedelta(days=day.weekday())).strftime("%Y-%m-%d")
+
+
+@functools.lru_cache(maxsize=1024)
+def _month_label(first_week, last_week):
+    """Các tuần gộp theo tháng của thứ 2 đầu tuần → khoảng ngày thật: '03/08–06/09/2026'"""
+    start = datetime.strptime(first_week, "%Y-%m-%d")
+    end = datetime.strptime(last_week, "%Y-%m-%d") + timedelta(days=6)
+    return f"{start:%d/%m}–{end:%d/%m/%Y}"
+
+
+def _month_lines(weeks, rollups):
+    """Dòng tóm tắt từng tháng (mới → cũ) của các tuần `weeks`, kèm số ngày mỗi tháng"""
+    months = {}
+    for week in weeks:
+        months.setdefault(week[:7], []).append(week)
+    lines = []
+    for month in sorted(months, reverse=True):
+        totals = _merge([rollups[week] for week in months[month]])
+        label = _month_label(min(months[month]), max(months[month]))
+        lines.append((PERIOD_LINE.render(label=label, **_period_values(totals)), totals[0]))
+    return lines
 
-    # Tính thời gian bận từ lịch cố định
-    busy_minutes = 0
-    for s in fixed_schedule:
-        try:
-            start_key = 'start_time' if 'start_time' in s else 'start'
-            end_key   = 'end_time'   if 'end_time'   in s else 'end'
-            start = datetime.strptime(s[start_key], "%H:%M")
-            end   = datetime.strptime(s[end_key],   "%H:%M")
-            busy_minutes += int((end - start).total_seconds() / 60)
-        except Exception:
-            pass
 
-    # ── Kho framework ──────────────────────────────────────────────
-    frameworks = {
-        "Thứ 2": {
-            "name": "Xem lại tổng thể (GTD)",
-            "guide": """
+def _omitted(lines):
+    """Dòng đếm các tháng bị lược (lines: [(dòng, số ngày)]); không lược gì thì chuỗi rỗng"""
+    if not lines:
+        return ""
+    return OMITTED_LINE.render(months=len(lines), days=sum(days for _, days in lines))
+
+
+def build_history_prompt(days_df, rollups, patterns=(), max_chars=HISTORY_MAX_CHARS, max_tokens=None):
+    """
+    Prompt nhiều tuần/tháng có giới hạn độ dài: ngày gần nhất giữ chi tiết như prompt tuần,
+    tuần cũ hơn thành 1 dòng tóm tắt, cũ hơn nữa gộp theo tháng — tất cả từ số tổng của
+    weekly_rollups nên không cần đọc lại check-in cũ.
+
+    Args:
+        days_df: check-in các ngày gần nhất (cột như build_weekly_prompt), phủ trọn tuần (từ thứ 2);
+            chỉ cần history_detail_days(max_chars) ngày
+        rollups: các dòng weekly_rollups (week_start + cột tổng) của cả khoảng thời gian
+        patterns: list Pattern của utils.pattern_detector
+        max_chars / max_tokens: ngân sách độ dài (max_tokens × CHARS_PER_TOKEN nếu có)
+
+    Độ dài ≤ ngân sách (trừ khi ngân sách nhỏ hơn phần khung cố định) và không tăng theo
+    độ dài lịch sử: tuần nào không vừa chi tiết thì xuống 1 dòng, không vừa nữa thì gộp tháng,
+    tháng cũ nhất không vừa thì chỉ còn 1 dòng "đã lược bớt".
+    """
+    if max_tokens is not None:
+        max_chars = max_tokens * CHARS_PER_TOKEN
+    rollups = {str(row['week_start'])[:10]: _sums(row) for row in rollups if row.get('checkin_count')}
+    days_by_week = {}
+    if len(days_df):
+        df = days_df.reset_index(drop=True)
+        columns = {column: df[column].tolist() for column in _DAY_COLUMNS}
+        columns['energy_level'] = pd.to_numeric(df['energy_level'], errors='coerce').fillna(0).tolist()
+        columns['task_count'] = pd.to_numeric(df['task_count'], errors='coerce').fillna(0).astype(int).tolist()
+        for row in zip(*(columns[column] for column in _DAY_COLUMNS)):
+            days_by_week.setdefault(_monday(row[0]), []).append(row)
+    if not rollups and not days_by_week:
+        return WEEKLY_EMPTY
+
+    weeks = sorted(set(rollups) | set(days_by_week), reverse=True)       # mới → cũ
+    totals = _merge(rollups.values())
+    out = [HISTORY_HEADER.render(weeks=len(weeks), **_period_values(totals))]
+    tail = [WEEKLY_PATTERNS]
+    for index, pattern in enumerate(patterns, 1):
+        tail.append(WEEKLY_PATTERN.render(index=index, text=render_pattern(pattern, emoji=False)))
+    tail.append(WEEKLY_FOOTER)
+    remaining = max_chars - sum(map(len, out)) - sum(map(len, tail))
+
+    # Chi phí gộp tháng cho mọi phần đuôi weeks[k:] (tính từ cũ → mới, mỗi tuần cập nhật 1 tháng)
+    month_cost = [0] * (len(weeks) + 1)
+    month_totals, month_len, total_len = {}, {}, 0
+    for k in range(len(weeks) - 1, -1, -1):
+        week = weeks[k]
+        if week in rollups:
+            month = week[:7]
+            month_totals[month] = _merge([month_totals[month], rollups[week]]) if month in month_totals else rollups[week]
+            length = len(PERIOD_LINE.render(label="00/00–00/00/0000", **_period_values(month_totals[month])))
+            total_len += length - month_len.get(month, 0)
+            month_len[month] = length
+        month_cost[k] = len(HISTORY_MONTHS) + total_len if month_len else 0
+
+    # 1. Chi tiết theo tuần, mới → cũ, chỉ khi phần còn lại vẫn đủ chỗ ở dạng gộp tháng
+    detail, used, k = [], 0, 0
+    while k < len(weeks) and weeks[k] in days_by_week:
+        blocks = [WEEKLY_DAY.render(date=date, mental_load=mental_load, energy_level=energy_level,
+                                    pressure_source=pressure_source, stars='⭐' * _safe_int(sleep_quality),
+                                    task_count=count, task_feeling=task_feeling)
+                  for date, mental_load, energy_level, pressure_source, sleep_quality, count, task_feeling
+                  in sorted(days_by_week[weeks[k]], key=lambda row: str(row[0]))]
+        cost = sum(map(len, blocks)) + (0 if detail else len(HISTORY_DAYS))
+        if used + cost + month_cost[k + 1] > remaining:
+            break
+        detail.append(blocks)
+        used += cost
+        k += 1
+
+    # 2. Dòng tóm tắt từng tuần
+    week_lines = []
+    while k < len(weeks):
+        if weeks[k] not in rollups:
+            k += 1
+            continue
+        line = PERIOD_LINE.render(label=f"Tuần {weeks[k]}", **_period_values(rollups[weeks[k]]))
+        cost = len(line) + (0 if week_lines else len(HISTORY_WEEKS))
+        if used + cost + month_cost[k + 1] > remaining:
+            break
+        week_lines.append(line)
+        used += cost
+        k += 1
+
+    # 3. Gộp tháng, mới → cũ; các tháng cũ nhất không vừa thì chỉ còn 1 dòng đếm
+    lines = _month_lines([week for week in weeks[k:] if week in rollups], rollups)
+    kept = 0
+    while kept < len(lines):
+        cost = len(lines[kept][0]) + len(_omitted(lines[kept + 1:])) + (0 if kept else len(HISTORY_MONTHS))
+        if used + cost > remaining:
+            break
+        used += cost - len(_omitted(lines[kept + 1:]))
+        kept += 1
+
+    # Cũ → mới: tháng, tuần, rồi các ngày chi tiết
+    if lines:
+        out.append(HISTORY_MONTHS)
+        out.append(_omitted(lines[kept:]))
+        out.extend(line for line, _ in reversed(lines[:kept]))
+    if week_lines:
+        out.append(HISTORY_WEEKS)
+        out.extend(reversed(week_lines))
+    if detail:
+        out.append(HISTORY_DAYS)
+        for blocks in reversed(detail):
+            out.extend(blocks)
+    out.extend(tail)
+    return "".join(out)
+
+
+def history_prompt_fingerprint(days_df, rollups, patterns=(), max_chars=HISTORY_MAX_CHARS):
+    """SHA-256 của đúng những gì build_history_prompt đọc"""
+    days = [days_df[column].tolist() for column in _DAY_COLUMNS] if len(days_df) else []
+    weeks = sorted([str(row['week_start'])[:10]] + [row.get(column) for column in _ROLLUP_SUMS]
+                   for row in rollups)
+    return fingerprint(['history', max_chars, days, weeks, [list(pattern) for pattern in patterns]])
+
+
+# ===== PROMPT HÀNG NGÀY =====
+
+def _framework(name, guide):
+    return {'name': name, 'title': name.upper(), 'guide': PromptTemplate(guide)}
+
+
+# Kho framework theo thứ; guide được điền total_h / total_m (tổng thời gian công việc)
+FRAMEWORKS = {
+    "Thứ 2": _framework(
+        "Xem lại tổng thể (GTD)",
+        """
 Hôm nay là Thứ Hai — chế độ ĐÁNH GIÁ TOÀN CẢNH.
 
 Nguồn gốc khoa học: David Allen — Getting Things Done (2001)
@@ -144,11 +439,10 @@ CÁC CÂU HỎI CẦN TRẢ LỜI:
 4. Nếu chỉ làm được 2 việc hôm nay, 2 việc nào ảnh hưởng lớn nhất?
 
 Hãy phân tích theo 4 câu hỏi trên rồi xếp lịch cụ thể.
-"""
-        },
-        "Thứ 3": {
-            "name": "Ma trận ưu tiên (Eisenhower)",
-            "guide": """
+"""),
+    "Thứ 3": _framework(
+        "Ma trận ưu tiên (Eisenhower)",
+        """
 Hôm nay là Thứ Ba — chế độ SẮP XẾP ƯU TIÊN.
 
 Nguồn gốc khoa học: Nguyên tắc Eisenhower — phổ biến bởi Stephen Covey trong "7 Thói quen"
@@ -162,11 +456,10 @@ CÁC CÂU HỎI CẦN TRẢ LỜI:
 4. Việc nào không gấp không quan trọng? → Bỏ hẳn
 
 Phân loại từng công việc trong danh sách vào 4 ô này.
-"""
-        },
-        "Thứ 4": {
-            "name": "Quản lý chu kỳ năng lượng (Ultradian)",
-            "guide": """
+"""),
+    "Thứ 4": _framework(
+        "Quản lý chu kỳ năng lượng (Ultradian)",
+        """
 Hôm nay là Thứ Tư — chế độ PHÂN BỔ THEO NĂNG LƯỢNG.
 
 Nguồn gốc khoa học: Peretz Lavie & Nathaniel Kleitman — Chu kỳ hoạt động não bộ 90 phút
@@ -180,11 +473,10 @@ CÁC CÂU HỎI CẦN TRẢ LỜI:
 4. Lịch cố định nằm vào lúc nào? → Tránh xếp việc khó ngay sau đó
 
 Sắp xếp lại danh sách theo đúng chu kỳ năng lượng.
-"""
-        },
-        "Thứ 5": {
-            "name": "Bớt tải nhận thức (Delegation)",
-            "guide": """
+"""),
+    "Thứ 5": _framework(
+        "Bớt tải nhận thức (Delegation)",
+        """
 Hôm nay là Thứ Năm — chế độ GIẢM TẢI CÔNG VIỆC.
 
 Nguồn gốc khoa học: Lý thuyết tải nhận thức — Sweller (1988)
@@ -198,11 +490,10 @@ CÁC CÂU HỎI CẦN TRẢ LỜI:
 4. Việc nào có thể xin gia hạn thêm thời gian?
 
 Mục tiêu: Giảm danh sách xuống còn phần CỐT LÕI thật sự cần bạn làm.
-"""
-        },
-        "Thứ 6": {
-            "name": "Nhìn lại để học hỏi (Reflection)",
-            "guide": """
+"""),
+    "Thứ 6": _framework(
+        "Nhìn lại để học hỏi (Reflection)",
+        """
 Hôm nay là Thứ Sáu — chế độ NHÌN LẠI TUẦN.
 
 Nguồn gốc khoa học: Chu trình học qua trải nghiệm — David Kolb
@@ -216,11 +507,10 @@ CÁC CÂU HỎI CẦN TRẢ LỜI:
 4. Xu hướng nào lặp lại nhiều lần? → Đây là điều quan trọng cần thay đổi
 
 Rút ra 2-3 bài học cụ thể cho tuần sau.
-"""
-        },
-        "Thứ 7": {
-            "name": "Lập kế hoạch dự phòng (If-Then)",
-            "guide": f"""
+"""),
+    "Thứ 7": _framework(
+        "Lập kế hoạch dự phòng (If-Then)",
+        """
 Hôm nay là Thứ Bảy — chế độ LÀM VIỆC THÔNG MINH + CHUẨN BỊ TUẦN SAU.
 
 Nguồn gốc khoa học: Kế hoạch thực thi — Peter Gollwitzer (NYU, 1999)
@@ -253,11 +543,10 @@ Sau khi xếp xong lịch hôm nay, trả lời thêm:
    - "Nếu [tình huống xảy ra] → tôi sẽ [làm gì ngay]"
    - Ví dụ: "Nếu Thứ 3 có thêm lịch học kèm → tôi dời luyện viết sang tối Thứ 2"
    - Ví dụ: "Nếu mệt sau 14 giờ → tôi làm luyện nói thay vì toán"
-""",
-        },
-        "Chủ nhật": {
-            "name": "Phục hồi có chủ đích (Active Recovery)",
-            "guide": """
+"""),
+    "Chủ nhật": _framework(
+        "Phục hồi có chủ đích (Active Recovery)",
+        """
 Hôm nay là Chủ Nhật — chế độ PHỤC HỒI CÓ CHỦ ĐÍCH.
 
 Nguồn gốc khoa học: Lý thuyết phục hồi — Kellmann (2010)
@@ -272,86 +561,46 @@ CÁC CÂU HỎI CẦN TRẢ LỜI:
 
 Gợi ý phục hồi tốt: đi bộ, đọc sách nhẹ, nấu ăn, gặp bạn bè, vẽ, nghe nhạc.
 Tránh: lướt mạng xã hội không có mục đích, xem phim liên tục nhiều tiếng.
-"""
-        }
-    }
+"""),
+}
 
-    # Xác định ngày trong tuần
-    weekday = datetime.strptime(date, "%Y-%m-%d").strftime("%A")
-    weekday_vn = {
-        "Monday": "Thứ 2", "Tuesday": "Thứ 3", "Wednesday": "Thứ 4",
-        "Thursday": "Thứ 5", "Friday": "Thứ 6", "Saturday": "Thứ 7",
-        "Sunday": "Chủ nhật"
-    }
-    current_weekday = weekday_vn.get(weekday, "Thứ 2")
-    framework = frameworks.get(current_weekday, frameworks["Thứ 2"])
+WEEKDAYS_VN = ("Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "Chủ nhật")
 
-    # ── Xây dựng prompt ────────────────────────────────────────────
-    prompt = f"""# BỐI CẢNH — HỌC SINH CẦN LẬP LỊCH HÔM NAY
+DAILY_HEADER = PromptTemplate("""# BỐI CẢNH — HỌC SINH CẦN LẬP LỊCH HÔM NAY
 
-## Ngày: {current_weekday}, {date}
-Phương pháp hôm nay: **{framework['name']}**
+## Ngày: {weekday}, {date}
+Phương pháp hôm nay: **{name}**
 
 ## 1. TRẠNG THÁI HIỆN TẠI
 - Năng lượng: {energy}/10
-- Trạng thái tinh thần: {data.get('mental_load', 'Chưa có')}
+- Trạng thái tinh thần: {mental_load}
 
-"""
+""")
 
-    # Lịch cố định
-    if fixed_schedule:
-        prompt += "## 2. LỊCH CỐ ĐỊNH (KHÔNG THỂ THAY ĐỔI)\n"
-        for s in fixed_schedule:
-            # Hỗ trợ cả key từ SQLite (start/end) và Supabase (start_time/end_time)
-            start_key = 'start_time' if 'start_time' in s else 'start'
-            end_key   = 'end_time'   if 'end_time'   in s else 'end'
-            name_key  = 'schedule_name' if 'schedule_name' in s else 'name'
-            prompt += f"- {s[start_key]} - {s[end_key]}: {s[name_key]}\n"
-        free_est = max(0, 960 - busy_minutes)
-        prompt += f"""
-**→ Tổng thời gian bận: khoảng {busy_minutes // 60} giờ {busy_minutes % 60} phút**
-**→ Thời gian rảnh ước tính còn lại trong ngày: khoảng {free_est // 60} giờ {free_est % 60} phút**
+FIXED_HEADER = "## 2. LỊCH CỐ ĐỊNH (KHÔNG THỂ THAY ĐỔI)\n"
+FIXED_LINE = PromptTemplate("- {start} - {end}: {name}\n")
+FIXED_SUMMARY = PromptTemplate("""
+**→ Tổng thời gian bận: khoảng {busy_h} giờ {busy_m} phút**
+**→ Thời gian rảnh ước tính còn lại trong ngày: khoảng {free_h} giờ {free_m} phút**
 **→ Hãy tìm KHOẢNG TRỐNG thực tế trước/sau/giữa các lịch cố định để xếp công việc!**
 
-"""
-    else:
-        prompt += "## 2. LỊCH CỐ ĐỊNH\nKhông có lịch cố định hôm nay.\n\n"
+""")
+NO_FIXED = "## 2. LỊCH CỐ ĐỊNH\nKhông có lịch cố định hôm nay.\n\n"
 
-    # Công việc
-    prompt += f"## 3. CÔNG VIỆC CẦN LÀM (Tổng: {total_h} giờ {total_m} phút)\n"
-    if tasks_meta:
-        for i, t in enumerate(tasks_meta, 1):
-            try:
-                phut = int(float(t.get("estimated_time") or 0))
-            except (TypeError, ValueError):
-                phut = 0
-            tg = f"{phut // 60} giờ {phut % 60} phút" if phut >= 60 else f"{phut} phút"
-            prompt += f"{i}. {t.get('task_name', '')} (Thời gian: {tg}, Ưu tiên: {t.get('priority', '')}, Loại: {t.get('task_type', '')})\n"
-    else:
-        for i, t in enumerate(tasks, 1):
-            prompt += f"{i}. {t}\n"
-
-    prompt += f"""
----
-
-# YÊU CẦU — TẠO LỊCH THÔNG MINH
-
-{framework['guide']}
-
-## NHIỆM VỤ CỦA BẠN (AI):
+TASKS_HEADER = PromptTemplate("## 3. CÔNG VIỆC CẦN LÀM (Tổng: {total_h} giờ {total_m} phút)\n")
+TASK_LINE = PromptTemplate("{index}. {name} (Thời gian: {duration}, Ưu tiên: {priority}, Loại: {task_type})\n")
+RAW_TASK_LINE = PromptTemplate("{index}. {task}\n")
 
-**1. PHÂN TÍCH THỜI GIAN TRỐNG:**
-"""
-    if fixed_schedule:
-        prompt += """   - Xác định các khoảng trống cụ thể (giờ bắt đầu - giờ kết thúc)
+REQUEST_HEAD = "\n---\n\n# YÊU CẦU — TẠO LỊCH THÔNG MINH\n\n"     # + guide của framework
+REQUEST_TAIL = "\n\n## NHIỆM VỤ CỦA BẠN (AI):\n\n**1. PHÂN TÍCH THỜI GIAN TRỐNG:**\n"
+ANALYSIS_FIXED = """   - Xác định các khoảng trống cụ thể (giờ bắt đầu - giờ kết thúc)
    - So sánh tổng thời gian trống với tổng thời gian công việc
    - Nếu không đủ thời gian → nói rõ việc nào nên dời sang ngày khác
 """
-    else:
-        prompt += """   - Cả ngày đều trống, nhưng đừng xếp quá 6-7 tiếng làm việc liên tục
+ANALYSIS_FREE = """   - Cả ngày đều trống, nhưng đừng xếp quá 6-7 tiếng làm việc liên tục
 """
 
-    prompt += f"""
+DAILY_FOOTER = PromptTemplate("""
 **2. TẠO LỊCH CỤ THỂ THEO GIỜ:**
    - Xếp công việc vào đúng khoảng trống thực tế
    - "Học sâu" → buổi sáng hoặc đầu chiều (não còn tỉnh táo)
@@ -359,7 +608,7 @@ Phương pháp hôm nay: **{framework['name']}**
    - Chèn nghỉ 15 phút sau mỗi 90 phút làm việc liên tục
    - Định dạng bắt buộc: HH:MM - HH:MM | Tên công việc
 
-**3. ÁP DỤNG PHƯƠNG PHÁP {framework['name']}:**
+**3. ÁP DỤNG PHƯƠNG PHÁP {name}:**
    - Phân tích công việc theo đúng phương pháp này
    - Đưa ra nhận xét cụ thể dựa trên danh sách công việc thực tế hôm nay
    - Không nói chung chung — áp dụng thẳng vào hoàn cảnh hôm nay
@@ -374,7 +623,7 @@ Phương pháp hôm nay: **{framework['name']}**
 # KẾT QUẢ TRẢ VỀ (Dùng đúng định dạng này):
 
 ```
-📅 LỊCH HÔM NAY — {framework['name'].upper()}
+📅 LỊCH HÔM NAY — {title}
 
 ⚡ PHÂN TÍCH NHANH:
 [Tổng thời gian trống | Tổng công việc | Có quá tải không?]
@@ -390,16 +639,116 @@ HH:MM - HH:MM | 🟡 [Việc ưu tiên trung bình]
 HH:MM - HH:MM | 🟢 [Công việc nhẹ]
 ... (tiếp tục đến cuối ngày)
 
-💡 ÁP DỤNG {framework['name'].upper()}:
+💡 ÁP DỤNG {title}:
 [Nhận xét + quy tắc dự phòng cụ thể từ công việc thực tế hôm nay]
 
 🎯 VIỆC ƯU TIÊN TUYỆT ĐỐI:
 [1-2 việc không thể bỏ nếu thời gian bị cắt]
 ```
-"""
-    return prompt
+""")
+
+
+def _block_keys(block):
+    """Key giờ/tên của 1 khối cố định: SQLite (start/end/name) hoặc Supabase (start_time/end_time/schedule_name)"""
+    return ('start_time' if 'start_time' in block else 'start',
+            'end_time' if 'end_time' in block else 'end',
+            'schedule_name' if 'schedule_name' in block else 'name')
+
+
+@functools.lru_cache(maxsize=1024)
+def _clock_minutes(text):
+    """'HH:MM' → số phút từ 0h (strptime như cũ, nhớ kết quả); sai định dạng → None"""
+    try:
+        parsed = datetime.strptime(text, "%H:%M")
+    except (TypeError, ValueError):
+        return None
+    return parsed.hour * 60 + parsed.minute
+
+
+@functools.lru_cache(maxsize=512)
+def _weekday_vn(date):
+    """'YYYY-MM-DD' → 'Thứ 2'...'Chủ nhật'"""
+    return WEEKDAYS_VN[datetime.strptime(date, "%Y-%m-%d").weekday()]
+
+
+def build_daily_framework_prompt_with_schedule(date, data, framework_name):
+    """
+    Tạo prompt hàng ngày kết hợp lịch cố định và framework khoa học.
+    """
+
+    tasks      = data.get('tasks', [])
+    tasks_meta = data.get('tasks_meta', [])
+    fixed_schedule = data.get('fixed_schedule', [])
+    energy     = data.get('energy_level', 5)
+
+    # Tính tổng thời gian — dùng _safe_int để xử lý mọi kiểu từ Supabase
+    total_minutes = sum(_safe_int(t.get('estimated_time')) for t in tasks_meta)
+
+    # Tính thời gian bận từ lịch cố định
+    busy_minutes = 0
+    for s in fixed_schedule:
+        try:
+            start_key, end_key, _ = _block_keys(s)
+            start = _clock_minutes(s[start_key])
+            end   = _clock_minutes(s[end_key])
+        except Exception:
+            continue
+        if start is not None and end is not None:
+            busy_minutes += end - start
+
+    current_weekday = _weekday_vn(date)
+    framework = FRAMEWORKS[current_weekday]
+    values = {
+        **framework,
+        'weekday': current_weekday, 'date': date, 'energy': energy,
+        'mental_load': data.get('mental_load', 'Chưa có'),
+        'total_h': total_minutes // 60, 'total_m': total_minutes % 60,
+    }
+
+    # ── Xây dựng prompt ────────────────────────────────────────────
+    out = DAILY_HEADER.render_into([], values)
+
+    # Lịch cố định
+    if fixed_schedule:
+        out.append(FIXED_HEADER)
+        for s in fixed_schedule:
+            start_key, end_key, name_key = _block_keys(s)
+            out.append(FIXED_LINE.render(start=s[start_key], end=s[end_key], name=s[name_key]))
+        free_est = max(0, 960 - busy_minutes)
+        out.append(FIXED_SUMMARY.render(busy_h=busy_minutes // 60, busy_m=busy_minutes % 60,
+                                        free_h=free_est // 60, free_m=free_est % 60))
+    else:
+        out.append(NO_FIXED)
+
+    # Công việc
+    TASKS_HEADER.render_into(out, values)
+    if tasks_meta:
+        for i, t in enumerate(tasks_meta, 1):
+            phut = _safe_int(t.get("estimated_time"))
+            tg = f"{phut // 60} giờ {phut % 60} phút" if phut >= 60 else f"{phut} phút"
+            out.append(TASK_LINE.render(index=i, name=t.get('task_name', ''), duration=tg,
+                                        priority=t.get('priority', ''), task_type=t.get('task_type', '')))
+    else:
+        for i, t in enumerate(tasks, 1):
+            out.append(RAW_TASK_LINE.render(index=i, task=t))
+
+    out.append(REQUEST_HEAD)
+    framework['guide'].render_into(out, values)
+    out.append(REQUEST_TAIL)
+    out.append(ANALYSIS_FIXED if fixed_schedule else ANALYSIS_FREE)
+    DAILY_FOOTER.render_into(out, values)
+    return "".join(out)
+
+
+def daily_prompt_fingerprint(date, data, framework_name):
+    """SHA-256 của đúng những gì prompt ngày đọc (bỏ id, created_at...): cùng fingerprint → cùng prompt"""
+    tasks_meta = [[t.get('task_name', ''), t.get('estimated_time'), t.get('priority', ''), t.get('task_type', '')]
+                  for t in data.get('tasks_meta', [])]
+    fixed = [[s.get(key) for key in _block_keys(s)] for s in data.get('fixed_schedule', [])]
+    return fingerprint(['daily', str(date), framework_name, data.get('energy_level', 5),
+                         data.get('mental_load', 'Chưa có'), data.get('tasks', []), tasks_meta, fixed])
 
 
 # Tương thích ngược
 def build_daily_framework_prompt(date, data, framework_name):
-    return build_daily_framework_prompt_with_schedule(date, data, framework_name)
\ No newline at end of file
+    return build_daily_framework_prompt_with_schedule(date, data, framework_name)
@@ -0,0 +1,138 @@
+"""
+Prompt AI của các trang: đọc dữ liệu qua utils/database.py, dựng bằng utils/prompt_builder.py.
+
+Prompt đã dựng nằm trong database.prompt_cache (cached_entry / store_entry của utils/cache.py):
+con trỏ (user, ngày/tuần, ...) → fingerprint dữ liệu → prompt. Hàm lưu của database xóa con trỏ theo tag; lưu lại mà
+dữ liệu không đổi thì fingerprint trùng nên không dựng lại template.
+"""
+
+import copy
+from datetime import datetime, timedelta
+
+from utils.cache import MISSING, cached_entry, store_entry
+from utils.database import (
+    STREAM_BATCH_SIZE, get_checkin_by_date, get_checkins_range, get_current_week_range, get_fixed_schedule,
+    get_task_metadata, get_week_checkins, get_week_rollups, prompt_cache, read_checkins_range, week_range,
+)
+from utils.pattern_detector import HEAVY_TASK_DAY, Pattern, detect_patterns, detect_week_highlights
+from utils.prompt_builder import (
+    HISTORY_MAX_CHARS, build_daily_framework_prompt_with_schedule, build_history_prompt, build_weekly_prompt,
+    daily_prompt_fingerprint, history_detail_days, history_prompt_fingerprint, iter_weekly_prompt,
+    weekly_prompt_fingerprint,
+)
+
+
+# ===== PROMPT ĐÃ DỰNG (cache) =====
+
+def get_daily_prompt(username, date, framework_name):
+    """Prompt ngày kèm dữ liệu dựng nó (mental_load, energy_level, tasks, tasks_meta, fixed_schedule, prompt);
+    None nếu chưa check-in. Giữ tới khi lưu lại check-in, metadata tasks hoặc lịch cố định của ngày đó"""
+    try:
+        pointer = ('daily_prompt', username, date, framework_name)
+        entry = cached_entry(prompt_cache, pointer)
+        if entry is MISSING:
+            checkin = get_checkin_by_date(username, date)
+            if not checkin:
+                return None
+            tasks_meta_df = get_task_metadata(username, date)
+            fixed_df = get_fixed_schedule(username, date)
+            data = {
+                'mental_load': checkin['mental_load'],
+                'energy_level': checkin['energy_level'],
+                'tasks': checkin['tasks'] or [],
+                'tasks_meta': tasks_meta_df.to_dict('records') if len(tasks_meta_df) > 0 else [],
+                'fixed_schedule': fixed_df.to_dict('records') if len(fixed_df) > 0 else []
+            }
+            tags = [(username, table, date) for table in ('daily_checkins', 'task_metadata', 'fixed_schedules')]
+            entry = store_entry(
+                prompt_cache, pointer, tags, daily_prompt_fingerprint(date, data, framework_name),
+                lambda: {**data, 'prompt': build_daily_framework_prompt_with_schedule(date, data, framework_name)}
+            )
+        return copy.deepcopy(entry)
+    except Exception as e:
+        print(f"Lỗi get_daily_prompt: {e}")
+        return None
+
+
+def get_weekly_prompt(username):
+    """Prompt tổng kết tuần hiện tại; giữ tới khi lưu check-in của 1 ngày trong tuần"""
+    try:
+        week_start, week_end = get_current_week_range()
+        pointer = ('weekly_prompt', username, week_start)
+        prompt = cached_entry(prompt_cache, pointer)
+        if prompt is MISSING:
+            df = get_week_checkins(username, week_start, week_end)
+            prompt = store_entry(
+                prompt_cache, pointer, [(username, 'daily_checkins', week_start)], weekly_prompt_fingerprint(df),
+                lambda: build_weekly_prompt(df, detect_week_highlights(df))
+            )
+        return prompt
+    except Exception as e:
+        print(f"Lỗi get_weekly_prompt: {e}")
+        return None
+
+
+def get_history_prompt(username, weeks=12, max_chars=HISTORY_MAX_CHARS):
+    """Prompt `weeks` tuần gần nhất (kể cả tuần này) gói trong max_chars ký tự: ngày gần nhất chi tiết,
+    cũ hơn tóm tắt từ weekly_rollups. Chỉ đọc số ngày vừa ngân sách, không đọc cả lịch sử"""
+    try:
+        week_start, week_end = get_current_week_range()
+        first_week = (datetime.strptime(week_start, "%Y-%m-%d") - timedelta(weeks=weeks - 1)).strftime("%Y-%m-%d")
+        pointer = ('history_prompt', username, week_start, weeks, max_chars)
+        prompt = cached_entry(prompt_cache, pointer)
+        if prompt is MISSING:
+            # Trọn tuần (từ thứ 2) chứa ngày cũ nhất có thể vừa ngân sách
+            detail_from = week_range(datetime.now() - timedelta(days=history_detail_days(max_chars)))[0]
+            days_df = get_checkins_range(username, max(first_week, detail_from), week_end)
+            rollups = get_week_rollups(username, first_week, week_start).to_dict('records')
+            patterns = detect_patterns(days_df)
+            prompt = store_entry(
+                prompt_cache, pointer, [(username, 'daily_checkins'), (username, 'weekly_rollups')],
+                history_prompt_fingerprint(days_df, rollups, patterns, max_chars),
+                lambda: build_history_prompt(days_df, rollups, patterns, max_chars)
+            )
+        return prompt
+    except Exception as e:
+        print(f"Lỗi get_history_prompt: {e}")
+        return None
+
+
+# ===== PROMPT ĐỌC DẦN (xuất file, khoảng ngày dài) =====
+
+def _checkins_summary(totals):
+    """Số liệu tổng của read_checkins_range → (phần tổng quan của iter_weekly_prompt, điểm đáng chú ý
+    như detect_week_highlights)"""
+    summary = {'days': totals['days'], 'missing_energy': bool(totals['missing_energy'])}
+    if not totals['days']:
+        return summary, []
+    best, worst = totals['best'], totals['worst']
+    summary.update(
+        avg_energy=None if totals['avg_energy'] is None else float(totals['avg_energy']),
+        avg_tasks=float(totals['avg_tasks']),
+        best_date=best['date'], best_energy=best['energy_level'],
+        worst_date=worst['date'], worst_energy=worst['energy_level'],
+    )
+
+    highlights = []
+    lowest = totals['lowest']
+    if lowest is not None and lowest['energy_level'] < 5:
+        highlights.append(Pattern('worst_day', lowest['date'], float(lowest['energy_level'])))
+    if totals['low_sleep']:
+        highlights.append(Pattern('low_sleep_days', None, float(totals['low_sleep'])))
+    if totals['heavy']:
+        highlights.append(Pattern('heavy_task_days', None, float(totals['heavy']), (HEAVY_TASK_DAY,)))
+    return summary, highlights
+
+
+def stream_checkins_prompt(username, start_date, end_date, batch_size=STREAM_BATCH_SIZE):
+    """
+    Prompt tuần cho mọi check-in từ start_date tới end_date, dạng generator các mảnh chuỗi.
+
+    Cùng nội dung build_weekly_prompt(get_checkins_range(...), detect_week_highlights(...)) nhưng
+    tổng quan tính bằng SQL, các ngày đọc dần qua read_checkins_range: bộ nhớ không tăng theo số
+    ngày, không có DataFrame hay chuỗi lớn. Không qua cache. Giữ 1 connection tới khi duyệt hết
+    (hoặc close() generator); với SQLite hãy duyệt hết trước khi gọi hàm database khác trong cùng thread.
+    Lỗi giữa chừng được ném ra cho nơi gọi (file đang ghi dở không được coi là xong).
+    """
+    with read_checkins_range(username, start_date, end_date, HEAVY_TASK_DAY, batch_size) as (totals, rows):
+        yield from iter_weekly_prompt(rows, *_checkins_summary(totals))
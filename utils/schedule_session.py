@@ -0,0 +1,432 @@
+"""
+Phiên xếp lịch trong ngày: sửa lịch tại chỗ khi 1 việc / 1 khối cố định thay đổi.
+
+create_daily_schedule xếp lại cả ngày mỗi lần gọi. ScheduleSession giữ lịch hiện
+tại theo phút và chỉ sửa vùng bị ảnh hưởng:
+- thêm việc / việc dài ra: đặt phần mới vào khoảng trống đầu tiên đúng buổi
+  (học sâu buổi sáng, họp chiều/tối, việc nhẹ từ trưa) nếu còn ngân sách
+- bớt việc / rút ngắn / xong sớm: trả lại phút trống rồi lấp bằng việc chưa xếp,
+  chỉ trong khoảng trống vừa mở ra
+- thêm khối cố định: dời các phần việc bị đè sang chỗ trống khác
+- thêm / bỏ khối cố định: BlockSet chỉ cập nhật phần hợp ở vùng của khối đó,
+  ngân sách tính lại từ khoảng trống của phần hợp (không dựng lại cả ngày)
+Sửa tại chỗ không được (hết chỗ hợp lệ, đè lên giờ ăn trưa, vượt ngân sách mới...)
+→ xếp lại cả ngày bằng đúng thuật toán của create_daily_schedule, giữ nguyên phần đã qua.
+
+    session = ScheduleSession(tasks, fixed_schedule, energy_level=6)
+    session.complete_task("Làm bài tập", now="14:30")
+    session.add_task({'name': 'Gọi điện', 'estimated_time': 30, 'priority': 'Cao', 'task_type': 'Công việc nhẹ'})
+    result = session.result()      # cùng dạng với create_daily_schedule
+"""
+
+from utils.intervals import MINUTES_PER_DAY, clock_range, parse_hhmm
+from utils.scheduler import (
+    BREAK_MINUTES, DEEP_BREAK_AFTER, DEEP_WORK_CAP, PRIORITY_MAP,
+    _block_id, _deep_chunks, _fill, _fixed_block_entries, _normalize_block, _normalize_task,
+    _prepare_day, _slot_type, _split_by_session, _summarize, _task_sessions, _work_budget,
+    get_color_by_priority,
+)
+
+
+def _is_piece(entry):
+    """Dòng lịch là 1 phần việc (không phải khối cố định / nghỉ)"""
+    return entry['type'] not in ('Cố định', 'Nghỉ')
+
+
+def _is_short_break(entry):
+    return entry['type'] == 'Nghỉ' and not entry['task'].startswith('🍱')
+
+
+def _piece_entry(task, start, end):
+    return {
+        'start': start,
+        'end': end,
+        'task': task['name'],
+        'type': task['task_type'],
+        'priority': task['priority'],
+        'color': '#8B5CF6' if task['task_type'] == 'Họp/Gặp mặt' else get_color_by_priority(task['priority'])
+    }
+
+
+def _break_entry(start):
+    return {
+        'start': start,
+        'end': start + BREAK_MINUTES,
+        'task': '☕ Nghỉ 10 phút',
+        'type': 'Nghỉ',
+        'priority': 'Hệ thống',
+        'color': '#10B981'
+    }
+
+
+class ScheduleSession:
+    """Lịch 1 ngày sửa được từng bước; mỗi thao tác trả về True nếu sửa tại chỗ, False nếu đã xếp lại cả ngày"""
+
+    def __init__(self, tasks_with_meta, fixed_schedule, work_start="06:00", work_end="22:00",
+                 energy_level=5, today_framework="", mode="greedy", energy_profile=None):
+        if mode not in ("greedy", "optimal"):
+            raise ValueError(f"mode không hợp lệ: {mode!r} (chọn 'greedy' hoặc 'optimal')")
+        self.work_start = work_start
+        self.work_end = work_end
+        self.energy_level = energy_level
+        self.today_framework = today_framework
+        self.mode = mode
+        # Buổi học sâu theo hồ sơ năng lượng của user (mặc định buổi sáng)
+        self._deep_sessions = energy_profile.deep_sessions() if energy_profile is not None else None
+        self._sessions = _task_sessions(self._deep_sessions)
+        self._tasks = {}                 # name → task đã chuẩn hóa, theo thứ tự nhập
+        for task in tasks_with_meta:
+            task = _normalize_task(task)
+            self._tasks[task['name']] = task
+        self._fixed = [_normalize_block(block) for block in fixed_schedule]
+        self._done = set()
+        self._now = None                 # phút hiện tại: phần lịch trước mốc này không bị đụng tới
+        self._entries = []
+        self.repairs = 0
+        self.rebuilds = 0
+        self._rebuild()
+        self.rebuilds = 0
+
+    # ===== KẾT QUẢ =====
+
+    def result(self):
+        """Lịch hiện tại, cùng dạng dict với create_daily_schedule"""
+        entries = [dict(entry) for entry in self._entries]
+        return _summarize(
+            list(self._tasks.values()), entries, self._worked(),
+            list(dict.fromkeys(entry['task'] for entry in self._entries if _is_piece(entry))),
+            list(self._unscheduled), self._max_work_time, self.energy_level, self.today_framework
+        )
+
+    # ===== THAO TÁC =====
+
+    def add_task(self, task):
+        """Thêm 1 việc: đặt vào khoảng trống đầu tiên đúng buổi"""
+        task = _normalize_task(task)
+        if task['name'] in self._tasks:
+            raise ValueError(f"Đã có công việc: {task['name']!r}")
+        self._tasks[task['name']] = task
+        self._unscheduled.append(task['name'])
+        if not self._place(task['name']):
+            return self._fallback()
+        return self._repaired()
+
+    def remove_task(self, name):
+        """Bỏ 1 việc (phần đã làm trước `now` vẫn giữ trong lịch)"""
+        self._task(name)
+        freed = self._cut(lambda entry: entry['task'] == name)
+        if any(_is_piece(entry) and entry['task'] == name for entry in self._entries):
+            self._done.add(name)
+        else:
+            del self._tasks[name]
+        self._sync_unscheduled()
+        self._top_up(freed)
+        return self._repaired()
+
+    def resize_task(self, name, minutes):
+        """Đổi thời lượng dự kiến của 1 việc"""
+        task = self._task(name)
+        task['estimated_time'] = int(minutes)
+        placed = self._placed(name)
+        if placed > task['estimated_time']:
+            freed = self._trim(name, placed - task['estimated_time'])
+            self._sync_unscheduled()
+            self._top_up(freed)
+        elif placed < task['estimated_time'] and name not in self._done:
+            if not self._extend(name) and not self._place(name):
+                return self._fallback()
+        self._sync_unscheduled()
+        return self._repaired()
+
+    def complete_task(self, name, now=None):
+        """Đánh dấu xong: phần còn lại sau `now` ('HH:MM') được trả lại và lấp bằng việc chưa xếp"""
+        self._task(name)
+        if now is not None:
+            self._advance(now)
+        self._done.add(name)
+        freed = self._cut(lambda entry: entry['task'] == name)
+        self._sync_unscheduled()
+        self._top_up(freed)
+        return self._repaired()
+
+    def add_fixed_block(self, block):
+        """Thêm 1 khối cố định: dời các phần việc bị đè sang chỗ trống khác"""
+        block = _normalize_block(block)
+        occurrences, display = _fixed_block_entries(block, self._day_start, self._day_end)
+        self._fixed.append(block)
+        self._blocks.add(_block_id(block), *clock_range(block['start'], block['end']))
+        self._refresh_budget()
+
+        def hit(entry):
+            return entry['type'] != 'Cố định' and any(s < entry['end'] and entry['start'] < e for s, e in occurrences)
+
+        victims = [entry for entry in self._entries if hit(entry)]
+        if any(not _is_short_break(entry) and not _is_piece(entry) for entry in victims) or \
+                any(self._now is not None and entry['start'] < self._now for entry in victims):
+            return self._fallback()
+        moved = {entry['task'] for entry in victims if _is_piece(entry)}
+        self._cut(hit)
+        self._entries.extend(display)
+        for start, end in occurrences:
+            self._occupancy.occupy(start, end)
+        self._restore_breaks()
+        if self._worked() > self._max_work_time:
+            return self._fallback()
+        for name in sorted(moved, key=self._rank):
+            if not self._place(name):
+                return self._fallback()
+        self._sync_unscheduled()
+        return self._repaired()
+
+    def remove_fixed_block(self, name):
+        """Bỏ khối cố định theo tên: lấp khoảng vừa trống bằng việc chưa xếp"""
+        freed = [(entry['start'], entry['end']) for entry in self._entries
+                 if entry['type'] == 'Cố định' and entry['task'] == name]
+        released = [interval for block in self._fixed if block['name'] == name
+                    for interval in _fixed_block_entries(block, self._day_start, self._day_end)[0]]
+        for block in self._fixed:
+            if block['name'] == name:
+                self._blocks.remove(_block_id(block))
+        self._fixed = [block for block in self._fixed if block['name'] != name]
+        self._entries = [entry for entry in self._entries
+                         if not (entry['type'] == 'Cố định' and entry['task'] == name)]
+        self._refresh_budget()
+        for start, end in released:
+            self._occupancy.release(start, end)
+            # Khối cố định khác chồng lên vùng vừa trả vẫn còn bận (phần hợp của BlockSet đã tính lại đúng vùng này)
+            for s, e in self._blocks.union.clip(start, end):
+                self._occupancy.occupy(s, e)
+        for entry in self._entries:
+            if entry['type'] != 'Cố định' and any(entry['start'] < r_end and r_start < entry['end']
+                                                  for r_start, r_end in released):
+                self._occupancy.occupy(entry['start'], entry['end'])
+        self._top_up(freed)
+        return self._repaired()
+
+    # ===== XẾP LẠI CẢ NGÀY =====
+
+    def _rebuild(self):
+        """Xếp lại phần còn lại của ngày; phần trước `now` giữ nguyên"""
+        locked = [entry for entry in self._entries
+                  if entry['type'] != 'Cố định' and self._now is not None and entry['end'] <= self._now]
+        done_minutes = {}
+        for entry in locked:
+            if _is_piece(entry):
+                done_minutes[entry['task']] = done_minutes.get(entry['task'], 0) + entry['end'] - entry['start']
+        remaining = []
+        for name, task in self._tasks.items():
+            left = task['estimated_time'] - done_minutes.get(name, 0)
+            if name not in self._done and left > 0:
+                remaining.append(dict(task, estimated_time=left))
+
+        day = _prepare_day(remaining, self._fixed, self.work_start, self.work_end, self.energy_level,
+                           locked=[(entry['start'], entry['end']) for entry in locked], not_before=self._now,
+                           deep_sessions=self._deep_sessions)
+        self._day_start, self._day_end = day['day_start'], day['day_end']
+        self._max_work_time = day['max_work_time']
+        entries, _, _, unscheduled = _fill(day, self.mode, budget=max(day['max_work_time'] - sum(done_minutes.values()), 0))
+        self._entries = day['fixed_entries'] + locked + entries
+        self._unscheduled = unscheduled
+        self._blocks = day['blocks']
+        self._occupancy = day['occupancy']      # khối cố định + phần đã khóa
+        for entry in entries:
+            self._occupancy.occupy(entry['start'], entry['end'])
+        self.rebuilds += 1
+
+    def _fallback(self):
+        self._rebuild()
+        return False
+
+    def _repaired(self):
+        self.repairs += 1
+        return True
+
+    # ===== SỬA TẠI CHỖ =====
+
+    def _task(self, name):
+        if name not in self._tasks:
+            raise ValueError(f"Không có công việc: {name!r}")
+        return self._tasks[name]
+
+    def _rank(self, name):
+        return PRIORITY_MAP.get(self._tasks[name]['priority'], 99)
+
+    def _advance(self, now):
+        minute = parse_hhmm(now) if isinstance(now, str) else int(now)
+        if minute < self._day_start:
+            minute += MINUTES_PER_DAY    # giờ qua nửa đêm
+        self._now = max(self._now or minute, minute)
+
+    def _window_start(self):
+        return max(self._day_start, self._now or self._day_start)
+
+    def _worked(self):
+        return sum(entry['end'] - entry['start'] for entry in self._entries if _is_piece(entry))
+
+    def _placed(self, name):
+        return sum(entry['end'] - entry['start'] for entry in self._entries
+                   if _is_piece(entry) and entry['task'] == name)
+
+    def _refresh_budget(self):
+        free = self._blocks.free(self._day_start, self._day_end, min_length=30)
+        self._max_work_time = _work_budget(sum(end - start for start, end in free), self.energy_level)
+
+    def _sync_unscheduled(self):
+        """Giữ thứ tự cũ của danh sách việc chưa xếp, thêm việc mới thiếu phút, bỏ việc đã đủ / đã xong"""
+        missing = [name for name, task in self._tasks.items()
+                   if name not in self._done and self._placed(name) < task['estimated_time']]
+        kept = [name for name in self._unscheduled if name in missing]
+        self._unscheduled = kept + [name for name in missing if name not in kept]
+
+    def _cut(self, match):
+        """Bỏ các phần việc / nghỉ khớp `match` từ `now` trở đi (phần đang làm dở cắt tại `now`);
+        nghỉ ngắn ngay sau phần bị bỏ cũng bỏ theo. Trả về các khoảng vừa trống"""
+        now = self._now
+        kept, freed, cut_ends = [], [], set()
+        for entry in sorted(self._entries, key=lambda e: e['start']):
+            if entry['type'] == 'Cố định' or not match(entry) or (now is not None and entry['end'] <= now):
+                if _is_short_break(entry) and entry['start'] in cut_ends:
+                    freed.append((entry['start'], entry['end']))
+                    continue
+                kept.append(entry)
+                continue
+            if now is not None and entry['start'] < now:
+                freed.append((now, entry['end']))
+                kept.append(dict(entry, end=now))
+            else:
+                freed.append((entry['start'], entry['end']))
+            if _is_piece(entry):
+                cut_ends.add(entry['end'])
+        self._entries = kept
+        for start, end in freed:
+            self._occupancy.release(start, end)
+        return freed
+
+    def _trim(self, name, minutes):
+        """Rút ngắn việc `minutes` phút, bớt từ phần muộn nhất (không đụng phần trước `now`)"""
+        freed = []
+        floor = self._now or 0
+        for entry in sorted((e for e in self._entries if _is_piece(e) and e['task'] == name),
+                            key=lambda e: -e['start']):
+            if minutes <= 0:
+                break
+            start = max(entry['start'], floor, entry['end'] - minutes)
+            if start >= entry['end']:
+                continue
+            minutes -= entry['end'] - start
+            freed.append((start, entry['end']))
+            if start == entry['start']:
+                freed.extend(self._cut(lambda e, entry=entry: e is entry))
+            else:
+                self._occupancy.release(start, entry['end'])
+                entry['end'] = start
+        return freed
+
+    def _extend(self, name):
+        """Kéo dài phần cuối của việc ngay tại chỗ nếu phút liền sau còn trống (học sâu không quá 90 phút/phiên)"""
+        task = self._tasks[name]
+        extra = task['estimated_time'] - self._placed(name)
+        pieces = [entry for entry in self._entries if _is_piece(entry) and entry['task'] == name]
+        if not pieces or self._worked() + extra > self._max_work_time:
+            return False
+        last = max(pieces, key=lambda e: e['start'])
+        end = last['end'] + extra
+        same_session = _slot_type(last['start']) == _slot_type(end - 1) and end <= self._day_end
+        if task['task_type'] == 'Học sâu' and end - last['start'] > DEEP_WORK_CAP:
+            return False
+        if not same_session or not self._occupancy.is_free(last['end'], end):
+            return False
+        rest = None
+        if task['task_type'] == 'Học sâu' and end - last['start'] >= DEEP_BREAK_AFTER:
+            occupancy = self._occupancy.copy()
+            occupancy.occupy(last['end'], end)
+            rest = self._break_after(occupancy, end)
+            if rest is False:
+                return False
+        self._occupancy.occupy(last['end'], end)
+        last['end'] = end
+        if rest is not None:
+            self._entries.append(_break_entry(rest))
+            self._occupancy.occupy(rest, rest + BREAK_MINUTES)
+        return True
+
+    def _needs_rest_at(self, minute, new=()):
+        """Có phiên học sâu ≥ 60 phút kết thúc đúng `minute` (việc khác không được bắt đầu ngay đó)"""
+        return any(e['type'] == 'Học sâu' and e['end'] == minute and e['end'] - e['start'] >= DEEP_BREAK_AFTER
+                   for e in (*self._entries, *new))
+
+    def _break_after(self, occupancy, minute, new=()):
+        """Lần nghỉ sau 1 phiên học sâu kết thúc ở `minute`, như keep_break của _pack: phút liền sau
+        còn trống (kể cả khi sang buổi khác) thì phải nghỉ. → phút bắt đầu nghỉ; None nếu không cần
+        (sát khối cố định / nghỉ / hết ngày); False nếu cần mà không đủ chỗ hoặc việc khác nối thẳng vào"""
+        if minute >= self._day_end:
+            return None
+        if not occupancy.is_free(minute, minute + 1):
+            return False if any(_is_piece(e) and e['start'] == minute for e in (*self._entries, *new)) else None
+        if minute + BREAK_MINUTES > self._day_end or not occupancy.is_free(minute, minute + BREAK_MINUTES):
+            return False
+        return minute
+
+    def _place(self, name, start=None, end=None):
+        """Đặt phần còn thiếu của việc vào khoảng trống đúng buổi trong [start, end); tất cả hoặc không"""
+        task = self._tasks[name]
+        minutes = task['estimated_time'] - self._placed(name)
+        if minutes <= 0 or name in self._done:
+            return True
+        if self._worked() + minutes > self._max_work_time:
+            return False
+        start = max(start if start is not None else self._day_start, self._window_start())
+        end = min(end if end is not None else self._day_end, self._day_end)
+        sessions = self._sessions.get(task['task_type'], self._sessions['Công việc nhẹ'])
+        deep = task['task_type'] == 'Học sâu'
+
+        occupancy = self._occupancy.copy()
+        new = []
+        for chunk in (_deep_chunks(minutes) if deep else [minutes]):
+            # Không còn khoảng trống nào đủ dài trong cửa sổ: khỏi dựng danh sách khoảng / cắt theo buổi
+            if occupancy.first_fit(start, end, chunk) is None:
+                return False
+            runs = [{'start': s, 'end': e} for s, e in occupancy.free_runs(start, end, chunk)]
+            spot = rest = None
+            for part in _split_by_session(runs, min_length=chunk):
+                if _slot_type(part[0]) not in sessions or self._needs_rest_at(part[0], new):
+                    continue
+                rest = self._break_after(occupancy, part[0] + chunk, new) if deep and chunk >= DEEP_BREAK_AFTER else None
+                if rest is not False:
+                    spot = part
+                    break
+            if spot is None:
+                return False
+            new.append(_piece_entry(task, spot[0], spot[0] + chunk))
+            occupancy.occupy(spot[0], spot[0] + chunk)
+            if rest is not None:
+                new.append(_break_entry(rest))
+                occupancy.occupy(rest, rest + BREAK_MINUTES)
+        self._entries.extend(new)
+        self._occupancy = occupancy
+        self._sync_unscheduled()
+        return True
+
+    def _restore_breaks(self):
+        """Phiên học sâu ≥ 60 phút vốn sát khối bận (không cần nghỉ) mà phút liền sau vừa trống
+        → đặt lại lần nghỉ trước khi lấp chỗ trống"""
+        for entry in list(self._entries):
+            if entry['type'] == 'Học sâu' and entry['end'] - entry['start'] >= DEEP_BREAK_AFTER:
+                rest = self._break_after(self._occupancy, entry['end'])
+                if rest:
+                    self._entries.append(_break_entry(rest))
+                    self._occupancy.occupy(rest, rest + BREAK_MINUTES)
+
+    def _top_up(self, freed):
+        """Lấp các khoảng trống vừa mở bằng việc chưa xếp (ưu tiên cao trước), chỉ trong đúng khoảng đó"""
+        if not freed:
+            return
+        self._restore_breaks()
+        runs = [
+            (s, e) for s, e in self._occupancy.free_runs(self._window_start(), self._day_end)
+            if any(fs < e and s < fe for fs, fe in freed)
+        ]
+        for name in sorted(self._unscheduled, key=self._rank):
+            for s, e in runs:
+                if self._place(name, s, e):
+                    break
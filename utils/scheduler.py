@@ -3,10 +3,89 @@ AI Scheduler - Tạo lịch thông minh CHỐNG BURN OUT
 Tích hợp 8 frameworks tâm lý học
 """
 
-from datetime import datetime, timedelta
+import functools
+import hashlib
+import json
+import math
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import numpy as np
+
+from utils.cache import MISSING, LRUCache
+from utils.intervals import MINUTES_PER_DAY, BlockSet, DayMap, clock_range, daily_occurrences, format_hhmm
+
+PRIORITY_MAP = {'Cao': 1, 'Trung bình': 2, 'Thấp': 3}
+
+# Trọng số khi tối ưu: Cao 3, Trung bình 2, Thấp 1 (không rõ ưu tiên = Thấp)
+PRIORITY_WEIGHTS = {name: len(PRIORITY_MAP) + 1 - rank for name, rank in PRIORITY_MAP.items()}
+
+DEEP_WORK_CAP = 90          # 1 phiên học sâu tối đa 90 phút
+DEEP_BREAK_AFTER = 60       # phiên học sâu ≥ 60 phút → nghỉ sau đó
+CONTINUOUS_WORK_LIMIT = 90  # làm liền ≥ 90 phút → nghỉ
+BREAK_MINUTES = 10
+LUNCH_MINUTES = 45
+MIN_DEEP_CHUNK = 20
+
+# Buổi được xếp cho từng loại việc (chế độ optimal và ScheduleSession)
+TASK_SESSIONS = {
+    'Học sâu': ('Sáng',),
+    'Họp/Gặp mặt': ('Chiều', 'Tối'),
+    'Công việc nhẹ': ('Trưa', 'Chiều', 'Tối'),
+}
+
+
+def _task_sessions(deep_sessions=None):
+    """Luật buổi khi học sâu dời sang `deep_sessions` (hồ sơ năng lượng của user): buổi học sâu
+    chỉ dành cho học sâu như buổi sáng mặc định, các buổi còn lại (trừ trưa) thành buổi hỗn hợp"""
+    if deep_sessions is None or tuple(deep_sessions) == TASK_SESSIONS['Học sâu']:
+        return TASK_SESSIONS
+    mixed = tuple(session for session in ('Sáng', 'Chiều', 'Tối') if session not in deep_sessions)
+    return {'Học sâu': tuple(deep_sessions), 'Họp/Gặp mặt': mixed, 'Công việc nhẹ': ('Trưa',) + mixed}
+
+
+def _slot_type(start):
+    """Buổi của khoảng trống theo giờ bắt đầu (phút)"""
+    hour = start // 60 % 24
+    if 6 <= hour < 12:
+        return 'Sáng'
+    elif 12 <= hour < 14:
+        return 'Trưa'
+    elif 14 <= hour < 18:
+        return 'Chiều'
+    return 'Tối'
+
+
+def _normalize_task(task):
+    """Bản sao của 1 task; database trả về 'task_name' nhưng code cần 'name'"""
+    task = dict(task)
+    if 'task_name' in task and 'name' not in task:
+        task['name'] = task['task_name']
+    task['estimated_time'] = int(task['estimated_time'])
+    return task
+
+
+def _normalize_block(block):
+    """Bản sao của 1 khối cố định; nhận cả dòng bảng fixed_schedules (schedule_name, start_time, end_time)"""
+    return {
+        'name': block.get('name', block.get('schedule_name')),
+        'start': block.get('start', block.get('start_time')),
+        'end': block.get('end', block.get('end_time')),
+    }
+
+
+def _resolve_energy(energy_level, energy_profile=None):
+    """energy_level=None → năng lượng hồ sơ dự đoán cho thứ hôm nay (không có thì 5)"""
+    if energy_level is None and energy_profile is not None:
+        energy_level = round(energy_profile.predict(datetime.now().weekday()) or 5)
+    return 5 if energy_level is None else energy_level
+
 
 def create_daily_schedule(tasks_with_meta, fixed_schedule, work_start="06:00", work_end="22:00", 
-                         energy_level=5, today_framework=""):
+                         energy_level=5, today_framework="", mode="greedy", use_cache=True,
+                         energy_profile=None):
     """
     Tạo lịch thông minh với logic chống burn out
     
@@ -17,74 +96,250 @@ def create_daily_schedule(tasks_with_meta, fixed_schedule, work_start="06:00", w
         work_end: str - Giờ đi ngủ
         energy_level: int - Năng lượng (1-10)
         today_framework: str - Framework hôm nay
+        mode: str - "greedy" (xếp lần lượt theo danh sách) hoặc "optimal"
+              (chọn + xếp để tổng độ ưu tiên được xếp là lớn nhất)
+        use_cache: bool - Dùng lại kết quả của đầu vào giống hệt (xem schedule_fingerprint)
+        energy_profile: EnergyProfile - Hồ sơ năng lượng đã học của user (get_energy_profile):
+                        học sâu xếp vào buổi user tỉnh táo nhất; energy_level=None thì
+                        dùng năng lượng dự đoán cho thứ hôm nay
     
     Returns:
         dict: Lịch đầy đủ với cảnh báo + gợi ý
     """
+    if mode not in ("greedy", "optimal"):
+        raise ValueError(f"mode không hợp lệ: {mode!r} (chọn 'greedy' hoặc 'optimal')")
+    deep_sessions = energy_profile.deep_sessions() if energy_profile is not None else None
+    energy_level = _resolve_energy(energy_level, energy_profile)
+    if not use_cache:
+        return _build_schedule(tasks_with_meta, fixed_schedule, work_start, work_end,
+                               energy_level, today_framework, mode, deep_sessions)
     
-    # Chuẩn hóa key names (database trả về 'task_name' nhưng code cần 'name')
-    for task in tasks_with_meta:
-        if 'task_name' in task and 'name' not in task:
-            task['name'] = task['task_name']
-    
-    # Parse time
-    day_start = datetime.strptime(work_start, "%H:%M")
-    day_end = datetime.strptime(work_end, "%H:%M")
-    
-    # Parse fixed schedule
-    fixed_blocks = []
-    for block in fixed_schedule:
-        fixed_blocks.append({
-            'start': datetime.strptime(block['start'], "%H:%M"),
-            'end': datetime.strptime(block['end'], "%H:%M"),
-            'name': block['name'],
-            'type': 'Cố định'
-        })
-    
-    fixed_blocks.sort(key=lambda x: x['start'])
+    cache, store = _schedule_store()
+    key = schedule_fingerprint(tasks_with_meta, fixed_schedule, work_start, work_end,
+                               energy_level, today_framework, mode, deep_sessions)
+    result = cache.get(key)
+    if result is MISSING:
+        result = None
+        if store:
+            result = store[0](key)
+        if result is None:
+            result = _build_schedule(tasks_with_meta, fixed_schedule, work_start, work_end,
+                                     energy_level, today_framework, mode, deep_sessions)
+            if store:
+                store[1](key, result)
+        cache.set(key, result)
+    return _copy_schedule(result)
+
+
+def _build_schedule(tasks_with_meta, fixed_schedule, work_start, work_end, energy_level, today_framework, mode,
+                    deep_sessions=None):
+    """Xếp lịch thật sự (không qua cache)"""
+    day = _prepare_day(tasks_with_meta, fixed_schedule, work_start, work_end, energy_level,
+                       deep_sessions=deep_sessions)
+    entries, worked_minutes, scheduled_tasks, unscheduled = _fill(day, mode)
+    return _summarize(day['tasks'], day['fixed_entries'] + entries, worked_minutes, scheduled_tasks,
+                      unscheduled, day['max_work_time'], energy_level, today_framework)
+
+
+# ===== CACHE KẾT QUẢ =====
+
+# Tăng số này khi đổi thuật toán xếp lịch: fingerprint đổi theo nên kết quả cũ
+# (cả bản đã lưu trong database) không bao giờ bị dùng lại
+SCHEDULER_VERSION = 2
+
+_schedule_cache = None
+_schedule_cache_size = None
+_persistent_store = None    # (get, save) do tầng lưu trữ đăng ký; None = chỉ cache trong bộ nhớ
+_schedule_cache_lock = threading.Lock()
+
+
+def register_schedule_store(get=None, save=None, maxsize=None):
+    """
+    Gắn tầng lưu trữ bền cho cache kết quả (utils/database.py gọi khi import) — scheduler
+    không import tầng database/UI nên process con của schedule_batch không kéo theo streamlit.
+
+    Args:
+        get: fingerprint → kết quả đã lưu (None nếu chưa có); None = không dùng tầng lưu trữ
+        save: (fingerprint, kết quả) → lưu lại
+        maxsize: số kết quả giữ trong bộ nhớ (None = SCHEDULE_CACHE_SIZE trong biến môi trường)
+    """
+    global _schedule_cache, _schedule_cache_size, _persistent_store
+    with _schedule_cache_lock:
+        _persistent_store = (get, save) if get and save else None
+        if maxsize is not None and maxsize != _schedule_cache_size:
+            _schedule_cache_size = maxsize
+            _schedule_cache = None
+
+
+def _schedule_store():
+    """(cache LRU trong bộ nhớ, (get, save) của tầng lưu trữ hoặc None) — tạo cache khi cần lần đầu"""
+    global _schedule_cache
+    if _schedule_cache is None:
+        with _schedule_cache_lock:
+            if _schedule_cache is None:
+                size = _schedule_cache_size or int(os.environ.get("SCHEDULE_CACHE_SIZE", 4096))
+                _schedule_cache = LRUCache(maxsize=size, ttl=None)
+    return _schedule_cache, _persistent_store
+
+
+def _plain(value):
+    """Số NumPy (từ DataFrame) → số Python để json.dumps được"""
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Không chuẩn hóa được {type(value).__name__}")
+
+
+def schedule_fingerprint(tasks_with_meta, fixed_schedule, work_start="06:00", work_end="22:00",
+                         energy_level=5, today_framework="", mode="greedy", deep_sessions=None):
+    """SHA-256 của đúng những gì create_daily_schedule đọc (bỏ id, username, ngày...):
+    2 lần gọi — kể cả của 2 user khác nhau — có cùng fingerprint thì cùng kết quả"""
+    tasks = [
+        [task['name'], task['estimated_time'], task['priority'], task['task_type']]
+        for task in map(_normalize_task, tasks_with_meta)
+    ]
+    fixed = [[block['name'], block['start'], block['end']] for block in map(_normalize_block, fixed_schedule)]
+    payload = json.dumps(
+        [SCHEDULER_VERSION, mode, work_start, work_end, energy_level, today_framework, tasks, fixed,
+         _task_sessions(deep_sessions)['Học sâu']],
+        ensure_ascii=False, separators=(',', ':'), default=_plain
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _copy_schedule(result):
+    """Bản sao đủ sâu để người gọi sửa lịch / cảnh báo không làm hỏng cache (nhanh hơn deepcopy nhiều)"""
+    return {
+        'schedule': [dict(entry) for entry in result['schedule']],
+        'warnings': list(result['warnings']),
+        'suggestions': list(result['suggestions']),
+        'stats': dict(result['stats']),
+    }
+
+
+def _work_budget(total_free_minutes, energy_level):
+    """LOGIC CHỐNG BURN OUT: chỉ nên làm 70% thời gian rảnh, giảm thêm khi năng lượng thấp"""
+    effective_free_time = int(total_free_minutes * 0.7)
+    if energy_level <= 3:
+        return int(effective_free_time * 0.6)
+    elif energy_level <= 6:
+        return int(effective_free_time * 0.8)
+    return effective_free_time
+
+
+def _fixed_block_entries(block, day_start, day_end):
+    """1 khối cố định → (các khoảng nó chiếm trên khung 2 ngày, các dòng hiển thị trong lịch)"""
+    start, end = clock_range(block['start'], block['end'])
+    # Khối lặp mỗi ngày: hiện ở mọi lần xuất hiện chạm khung làm việc (khối ngủ
+    # 23:00 → 07:00 chiếm cả đầu buổi sáng lẫn cuối buổi tối); không chạm thì hiện nguyên giờ
+    occurrences = [
+        (start + shift, end + shift) for shift in (-MINUTES_PER_DAY, 0, MINUTES_PER_DAY)
+        if start + shift < day_end and day_start < end + shift
+    ] or [(start, end)]
+    entries = [{
+        'start': s,
+        'end': e,
+        'task': block['name'],
+        'type': 'Cố định',
+        'priority': 'Hệ thống',
+        'color': '#9CA3AF'
+    } for s, e in occurrences]
+    return daily_occurrences(start, end), entries
+
+
+def _block_id(block):
+    """Id của khối cố định trong BlockSet: 2 khối trùng tên + giờ là 1 khối"""
+    return block['name'], block['start'], block['end']
+
+
+def _fixed_blocks(fixed_schedule):
+    """Các khối cố định đã chuẩn hóa → BlockSet (phần hợp gộp sẵn, thêm/xóa từng khối được)"""
+    return BlockSet((_block_id(block), *clock_range(block['start'], block['end'])) for block in fixed_schedule)
+
+
+def _prepare_day(tasks_with_meta, fixed_schedule, work_start, work_end, energy_level, locked=(), not_before=None,
+                 deep_sessions=None):
+    """Mô hình ngày theo phút trước khi xếp việc.
+
+    locked: các khoảng đã dùng (vd. việc đã làm xong) — không xếp chồng lên;
+    not_before: chỉ xếp từ phút này trở đi (xếp lại giữa ngày);
+    deep_sessions: buổi dành cho học sâu (mặc định buổi sáng, xem _task_sessions).
+    Ngân sách max_work_time luôn tính trên cả khung làm việc, chỉ trừ khối cố định.
+    """
+    # Làm trên bản sao đã chuẩn hóa: không sửa dict của người gọi
+    tasks_with_meta = [_normalize_task(task) for task in tasks_with_meta]
+    fixed_schedule = [_normalize_block(block) for block in fixed_schedule]
     
-    # Tìm khoảng trống
-    free_slots = []
-    current_time = day_start
+    # Khung làm việc + khối cố định theo phút; khối được phép chồng nhau hoặc qua nửa đêm
+    day_start, day_end = clock_range(work_start, work_end)
+    blocks = _fixed_blocks(fixed_schedule)
+    fixed_entries = [entry for block in fixed_schedule for entry in _fixed_block_entries(block, day_start, day_end)[1]]
+    fixed_entries.sort(key=lambda x: x['start'])
     
-    for block in fixed_blocks:
-        if current_time < block['start']:
-            free_duration = int((block['start'] - current_time).total_seconds() / 60)
-            if free_duration >= 30:
-                free_slots.append({
-                    'start': current_time,
-                    'end': block['start'],
-                    'duration': free_duration
-                })
-        current_time = max(current_time, block['end'])
+    # Ngân sách: tổng phút của các khoảng trống ≥ 30 phút giữa các khối cố định (đếm trên mảng)
+    occupancy = DayMap(blocks.union)
+    max_work_time = _work_budget(occupancy.free_minutes(day_start, day_end, min_length=30), energy_level)
+    # Tìm khoảng trống (≥ 30 phút) giữa các khối cố định
+    free_runs = blocks.free(day_start, day_end, min_length=30)
+    if locked or not_before is not None:
+        busy = blocks.union.copy()
+        for start, end in locked:
+            busy.add(start, end)
+            occupancy.occupy(start, end)
+        free_runs = busy.gaps(max(day_start, not_before or day_start), day_end, min_length=30)
+    free_slots = [{'start': start, 'end': end, 'duration': end - start} for start, end in free_runs]
+    return {
+        'tasks': tasks_with_meta,
+        'fixed': fixed_schedule,
+        'fixed_entries': fixed_entries,
+        'blocks': blocks,
+        'occupancy': occupancy,
+        'day_start': day_start,
+        'day_end': day_end,
+        'free_slots': free_slots,
+        'max_work_time': max_work_time,
+        'sessions': _task_sessions(deep_sessions),
+    }
+
+
+def _split_tasks(tasks_with_meta):
+    """Bản sao các task chia theo loại (học sâu, họp, việc nhẹ), học sâu + việc nhẹ theo ưu tiên;
+    chế độ optimal xếp theo đúng thứ tự deep_work + meetings + shallow"""
+    tasks_with_meta = [dict(task) for task in tasks_with_meta]   # greedy trừ dần estimated_time trên bản sao
+    deep_work = [t for t in tasks_with_meta if t['task_type'] == 'Học sâu']
+    meetings = [t for t in tasks_with_meta if t['task_type'] == 'Họp/Gặp mặt']
+    shallow = [t for t in tasks_with_meta if t['task_type'] == 'Công việc nhẹ']
     
-    if current_time < day_end:
-        free_duration = int((day_end - current_time).total_seconds() / 60)
-        if free_duration >= 30:
-            free_slots.append({
-                'start': current_time,
-                'end': day_end,
-                'duration': free_duration
-            })
+    deep_work.sort(key=lambda x: PRIORITY_MAP.get(x['priority'], 99))
+    shallow.sort(key=lambda x: PRIORITY_MAP.get(x['priority'], 99))
+    return deep_work, meetings, shallow
+
+
+def _fill(day, mode, budget=None, table=None):
+    """Xếp việc vào khoảng trống của `day` → (entries, phút làm, việc đã xếp, việc chưa xếp);
+    table: bảng knapsack dựng sẵn cho chế độ optimal (xem _fill_optimal)"""
+    budget = day['max_work_time'] if budget is None else budget
+    deep_work, meetings, shallow = _split_tasks(day['tasks'])
     
-    total_free_minutes = sum([slot['duration'] for slot in free_slots])
+    sessions = day.get('sessions', TASK_SESSIONS)
+    if mode == "optimal":
+        return _fill_optimal(day['free_slots'], deep_work + meetings + shallow, budget, sessions, table)
+    entries, worked_minutes, scheduled_tasks = _fill_greedy(
+        day['free_slots'], deep_work, meetings, shallow, budget, sessions['Học sâu']
+    )
+    unscheduled = [task['name'] for task in deep_work + meetings + shallow]
+    # Việc bị chia nhiều phần chỉ tính 1 lần
+    return entries, worked_minutes, list(dict.fromkeys(scheduled_tasks)), unscheduled
+
+
+def _summarize(tasks_with_meta, schedule, worked_minutes, scheduled_tasks, unscheduled,
+               max_work_time, energy_level, today_framework):
+    """Cảnh báo + gợi ý + thống kê; đổi lịch (theo phút, sửa tại chỗ) sang 'HH:MM' ở bước cuối này"""
     total_task_time = sum([t['estimated_time'] for t in tasks_with_meta])
-    
-    # LOGIC CHỐNG BURN OUT
     warnings = []
     suggestions = []
     
-    # Chỉ nên làm 70% thời gian rảnh
-    effective_free_time = int(total_free_minutes * 0.7)
-    
-    # Điều chỉnh theo năng lượng
     if energy_level <= 3:
-        max_work_time = int(effective_free_time * 0.6)
         warnings.append(f"⚠️ Năng lượng thấp ({energy_level}/10) - Chỉ nên làm {max_work_time//60}h{max_work_time%60}'")
-    elif energy_level <= 6:
-        max_work_time = int(effective_free_time * 0.8)
-    else:
-        max_work_time = effective_free_time
     
     # Phát hiện overload
     if total_task_time > max_work_time:
@@ -92,60 +347,66 @@ def create_daily_schedule(tasks_with_meta, fixed_schedule, work_start="06:00", w
         warnings.append(f"🔥 CẢNH BÁO KIỆT SỨC: {total_task_time//60}h{total_task_time%60}' công việc vs {max_work_time//60}h{max_work_time%60}' khả dụng")
         warnings.append(f"⚠️ Cần giảm {overload//60}h{overload%60}' để tránh burn out!")
     
-    # Phân loại tasks
-    deep_work = [t for t in tasks_with_meta if t['task_type'] == 'Học sâu']
-    meetings = [t for t in tasks_with_meta if t['task_type'] == 'Họp/Gặp mặt']
-    shallow = [t for t in tasks_with_meta if t['task_type'] == 'Công việc nhẹ']
-    
-    priority_map = {'Cao': 1, 'Trung bình': 2, 'Thấp': 3}
-    deep_work.sort(key=lambda x: priority_map.get(x['priority'], 99))
-    shallow.sort(key=lambda x: priority_map.get(x['priority'], 99))
-    
     # FRAMEWORK INSIGHTS
     insights = get_framework_insights(today_framework, tasks_with_meta, energy_level)
     suggestions.extend(insights)
     
-    # TẠO LỊCH
+    # Tasks chưa xếp được
+    if len(unscheduled) > 0:
+        warnings.append(f"⚠️ Không xếp được {len(unscheduled)} công việc: {', '.join(unscheduled)}")
+        
+        low_priority = [t for t in tasks_with_meta if t['name'] in unscheduled and t['priority'] == 'Thấp']
+        if len(low_priority) > 0:
+            suggestions.append(f"💡 Có thể nhờ bạn giúp: {', '.join([t['name'] for t in low_priority])}")
+        
+        medium_priority = [t for t in tasks_with_meta if t['name'] in unscheduled and t['priority'] == 'Trung bình']
+        if len(medium_priority) > 0:
+            suggestions.append(f"💡 Có thể dời sang mai: {', '.join([t['name'] for t in medium_priority])}")
+    
+    # Sắp xếp theo phút (giờ qua nửa đêm vẫn xếp sau cùng); chỉ đổi sang 'HH:MM' ở bước cuối này
+    schedule.sort(key=lambda x: x['start'])
+    for entry in schedule:
+        entry['start'], entry['end'] = format_hhmm(entry['start']), format_hhmm(entry['end'])
+    
+    # Stats
+    stats = {
+        'total_tasks': len(tasks_with_meta),
+        'scheduled_tasks': len(scheduled_tasks),
+        'unscheduled_tasks': len(unscheduled),
+        'actual_work_time': worked_minutes,
+        'breaks_count': len([s for s in schedule if s['type'] == 'Nghỉ'])
+    }
+    
+    return {
+        'schedule': schedule,
+        'warnings': warnings,
+        'suggestions': suggestions,
+        'stats': stats
+    }
+
+
+def _fill_greedy(free_slots, deep_work, meetings, shallow, max_work_time, deep_sessions=('Sáng',)):
+    """Xếp tham lam theo thứ tự danh sách: sáng (deep_sessions) học sâu, trưa nghỉ + việc nhẹ, buổi khác họp rồi việc nhẹ.
+    Việc đã xếp hết bị bỏ khỏi deep_work/meetings/shallow — phần còn lại là việc chưa xếp được"""
     schedule = []
     scheduled_tasks = []
     worked_minutes = 0
     last_break_time = None
     
-    # Thêm fixed schedule
-    for block in fixed_blocks:
-        schedule.append({
-            'start': block['start'].strftime("%H:%M"),
-            'end': block['end'].strftime("%H:%M"),
-            'task': block['name'],
-            'type': 'Cố định',
-            'priority': 'Hệ thống',
-            'color': '#9CA3AF'
-        })
-    
     # Xếp tasks vào free slots
     for slot in free_slots:
         slot_start = slot['start']
         slot_remaining = slot['duration']
         current_time = slot_start
-        hour = slot_start.hour
-        
-        # Xác định slot type
-        if 6 <= hour < 12:
-            slot_type = 'Sáng'
-        elif 12 <= hour < 14:
-            slot_type = 'Trưa'
-        elif 14 <= hour < 18:
-            slot_type = 'Chiều'
-        else:
-            slot_type = 'Tối'
+        slot_type = _slot_type(slot_start)
         
         # Slot buổi trưa - ưu tiên ăn + nghỉ
         if slot_type == 'Trưa':
             lunch_duration = min(45, slot_remaining)
-            lunch_end = current_time + timedelta(minutes=lunch_duration)
+            lunch_end = current_time + lunch_duration
             schedule.append({
-                'start': current_time.strftime("%H:%M"),
-                'end': lunch_end.strftime("%H:%M"),
+                'start': current_time,
+                'end': lunch_end,
                 'task': '🍱 Ăn trưa + nghỉ ngơi',
                 'type': 'Nghỉ',
                 'priority': 'Hệ thống',
@@ -164,10 +425,10 @@ def create_daily_schedule(tasks_with_meta, fixed_schedule, work_start="06:00", w
                     if task_duration < 15:
                         continue
                     
-                    task_end = current_time + timedelta(minutes=task_duration)
+                    task_end = current_time + task_duration
                     schedule.append({
-                        'start': current_time.strftime("%H:%M"),
-                        'end': task_end.strftime("%H:%M"),
+                        'start': current_time,
+                        'end': task_end,
                         'task': task['name'],
                         'type': task['task_type'],
                         'priority': task['priority'],
@@ -185,8 +446,8 @@ def create_daily_schedule(tasks_with_meta, fixed_schedule, work_start="06:00", w
                         task['estimated_time'] -= task_duration
                     break
         
-        # Slot buổi sáng - Deep work (năng lượng cao)
-        elif slot_type == 'Sáng':
+        # Slot buổi sáng (hoặc buổi user tỉnh táo nhất) - Deep work (năng lượng cao)
+        elif slot_type in deep_sessions:
             for task in deep_work[:]:
                 if worked_minutes >= max_work_time or slot_remaining < 20:
                     break
@@ -195,10 +456,10 @@ def create_daily_schedule(tasks_with_meta, fixed_schedule, work_start="06:00", w
                 if task_duration < 20:
                     continue
                 
-                task_end = current_time + timedelta(minutes=task_duration)
+                task_end = current_time + task_duration
                 schedule.append({
-                    'start': current_time.strftime("%H:%M"),
-                    'end': task_end.strftime("%H:%M"),
+                    'start': current_time,
+                    'end': task_end,
                     'task': task['name'],
                     'type': task['task_type'],
                     'priority': task['priority'],
@@ -217,10 +478,10 @@ def create_daily_schedule(tasks_with_meta, fixed_schedule, work_start="06:00", w
                 
                 # Auto break sau 60+ phút
                 if task_duration >= 60 and slot_remaining >= 10:
-                    break_end = current_time + timedelta(minutes=10)
+                    break_end = current_time + 10
                     schedule.append({
-                        'start': current_time.strftime("%H:%M"),
-                        'end': break_end.strftime("%H:%M"),
+                        'start': current_time,
+                        'end': break_end,
                         'task': '☕ Nghỉ 10 phút',
                         'type': 'Nghỉ',
                         'priority': 'Hệ thống',
@@ -231,17 +492,18 @@ def create_daily_schedule(tasks_with_meta, fixed_schedule, work_start="06:00", w
                     last_break_time = current_time
                 break
         
-        # Slot chiều/tối - Mix
+        # Slot chiều/tối (và các buổi không dành cho học sâu) - Mix
         else:
             # Meetings trước
             for task in meetings[:]:
-                if worked_minutes >= max_work_time or slot_remaining < task['estimated_time']:
+                # Họp không chia nhỏ được: phải vừa cả slot lẫn phần ngân sách còn lại
+                if worked_minutes + task['estimated_time'] > max_work_time or slot_remaining < task['estimated_time']:
                     continue
                 
-                task_end = current_time + timedelta(minutes=task['estimated_time'])
+                task_end = current_time + task['estimated_time']
                 schedule.append({
-                    'start': current_time.strftime("%H:%M"),
-                    'end': task_end.strftime("%H:%M"),
+                    'start': current_time,
+                    'end': task_end,
                     'task': task['name'],
                     'type': 'Họp/Gặp mặt',
                     'priority': task['priority'],
@@ -263,10 +525,10 @@ def create_daily_schedule(tasks_with_meta, fixed_schedule, work_start="06:00", w
                 if task_duration < 15:
                     continue
                 
-                task_end = current_time + timedelta(minutes=task_duration)
+                task_end = current_time + task_duration
                 schedule.append({
-                    'start': current_time.strftime("%H:%M"),
-                    'end': task_end.strftime("%H:%M"),
+                    'start': current_time,
+                    'end': task_end,
                     'task': task['name'],
                     'type': 'Công việc nhẹ',
                     'priority': task['priority'],
@@ -284,12 +546,12 @@ def create_daily_schedule(tasks_with_meta, fixed_schedule, work_start="06:00", w
                     task['estimated_time'] -= task_duration
                 
                 # Check break
-                if last_break_time and (current_time - last_break_time).total_seconds() >= 90*60:
+                if last_break_time and current_time - last_break_time >= 90:
                     if slot_remaining >= 10:
-                        break_end = current_time + timedelta(minutes=10)
+                        break_end = current_time + 10
                         schedule.append({
-                            'start': current_time.strftime("%H:%M"),
-                            'end': break_end.strftime("%H:%M"),
+                            'start': current_time,
+                            'end': break_end,
                             'task': '☕ Nghỉ 10 phút',
                             'type': 'Nghỉ',
                             'priority': 'Hệ thống',
@@ -299,44 +561,243 @@ def create_daily_schedule(tasks_with_meta, fixed_schedule, work_start="06:00", w
                         slot_remaining -= 10
                         last_break_time = current_time
     
-    # Tasks chưa xếp được
-    unscheduled = []
-    for task in deep_work + meetings + shallow:
-        unscheduled.append(task['name'])
-    
-    if len(unscheduled) > 0:
-        warnings.append(f"⚠️ Không xếp được {len(unscheduled)} công việc: {', '.join(unscheduled)}")
-        
-        low_priority = [t for t in tasks_with_meta if t['name'] in unscheduled and t['priority'] == 'Thấp']
-        if len(low_priority) > 0:
-            suggestions.append(f"💡 Có thể nhờ bạn giúp: {', '.join([t['name'] for t in low_priority])}")
-        
-        medium_priority = [t for t in tasks_with_meta if t['name'] in unscheduled and t['priority'] == 'Trung bình']
-        if len(medium_priority) > 0:
-            suggestions.append(f"💡 Có thể dời sang mai: {', '.join([t['name'] for t in medium_priority])}")
-    
-    # Sắp xếp schedule theo thời gian
-    schedule.sort(key=lambda x: datetime.strptime(x['start'], "%H:%M"))
-    
-    # Stats
-    stats = {
-        'total_tasks': len(tasks_with_meta),
-        'scheduled_tasks': len(scheduled_tasks),
-        'unscheduled_tasks': len(unscheduled),
-        'actual_work_time': worked_minutes,
-        'breaks_count': len([s for s in schedule if s['type'] == 'Nghỉ'])
-    }
-    
-    return {
-        'schedule': schedule,
-        'warnings': warnings,
-        'suggestions': suggestions,
-        'stats': stats
+    return schedule, worked_minutes, scheduled_tasks
+
+
+def _deep_chunks(minutes):
+    """Chia việc học sâu thành các phiên ≤ DEEP_WORK_CAP, đều nhau (100 → 50 + 50, không phải 90 + 10)"""
+    count = max(1, math.ceil(minutes / DEEP_WORK_CAP))
+    if count > 1 and minutes // count < MIN_DEEP_CHUNK:
+        count = max(1, minutes // MIN_DEEP_CHUNK)
+    return [minutes // count + (1 if i < minutes % count else 0) for i in range(count)]
+
+
+# Mốc chuyển buổi (phút) trên khung 2 ngày: 00h, 06h, 12h, 14h, 18h
+_SESSION_BOUNDARIES = sorted(
+    hour * 60 + day * MINUTES_PER_DAY for day in (0, 1) for hour in (0, 6, 12, 14, 18)
+)
+
+
+def _split_by_session(free_slots, min_length=15):
+    """Cắt khoảng trống tại các mốc chuyển buổi để mỗi phần có đúng 1 loại buổi
+    (khoảng 11:30 → 22:00 thành Sáng 11:30-12:00, Trưa, Chiều, Tối)"""
+    parts = []
+    for slot in free_slots:
+        cuts = [slot['start']] + [b for b in _SESSION_BOUNDARIES if slot['start'] < b < slot['end']] + [slot['end']]
+        parts.extend((a, b) for a, b in zip(cuts, cuts[1:]) if b - a >= min_length)
+    return parts
+
+
+def _knapsack(durations, values, capacity):
+    """0/1 knapsack chính xác: chỉ số các món có tổng durations ≤ capacity và tổng values lớn nhất.
+    Quy hoạch động trên mảng NumPy (mỗi món 1 phép toán vector), bước = ước chung của các durations"""
+    return _knapsack_pick(_knapsack_table(durations, values, capacity), durations, capacity)
+
+
+def _knapsack_table(durations, values, capacity):
+    """Bảng quy hoạch động của _knapsack; dùng lại được cho mọi sức chứa ≤ capacity
+    (cột c của bảng không phụ thuộc các cột lớn hơn)"""
+    positive = [d for d in durations if d > 0]
+    step = functools.reduce(math.gcd, positive) if positive else 1
+    cap = max(capacity, 0) // step
+    best = np.zeros(cap + 1, dtype=np.int64)
+    take = np.zeros((len(durations), cap + 1), dtype=bool)
+    for i, (duration, value) in enumerate(zip(durations, values)):
+        weight = duration // step
+        if weight > cap:
+            continue
+        candidate = best[:cap + 1 - weight] + value
+        better = candidate > best[weight:]
+        take[i, weight:] = better
+        best[weight:] = np.where(better, candidate, best[weight:])
+    return take, step
+
+
+def _knapsack_pick(table, durations, capacity):
+    """Truy vết bảng _knapsack_table ở sức chứa `capacity` → chỉ số các món được chọn"""
+    take, step = table
+    chosen = []
+    remaining = min(max(capacity, 0) // step, take.shape[1] - 1)
+    for i in range(len(durations) - 1, -1, -1):
+        if take[i, remaining]:
+            chosen.append(i)
+            remaining -= durations[i] // step
+    return chosen[::-1]
+
+
+def _pack(pieces, capacities, keep_break=()):
+    """Best-fit decreasing: xếp từng phần (footprint, task, slot được phép, phút làm) vào slot vừa khít nhất.
+    footprint > phút làm nghĩa là phần đó kèm 1 lần nghỉ; lần nghỉ cuối cùng của slot được bỏ nếu hết chỗ,
+    trừ các slot trong keep_break (nối liền slot làm việc kế tiếp nên lần nghỉ cuối vẫn cần).
+    Trả về (list (slot, phần), None) nếu xếp hết, hoặc (None, phần không xếp được)"""
+    used = [0] * len(capacities)
+    with_break = [False] * len(capacities)
+    placed = []
+    for piece in sorted(pieces, key=lambda x: -x[0]):
+        footprint, _, allowed, minutes = piece
+        best, best_left = None, None
+        for j in allowed:
+            droppable = BREAK_MINUTES if (with_break[j] or footprint > minutes) and j not in keep_break else 0
+            left = capacities[j] - (used[j] + footprint - droppable)
+            if left >= 0 and (best is None or left < best_left):
+                best, best_left = j, left
+        if best is None:
+            return None, piece
+        used[best] += footprint
+        with_break[best] = with_break[best] or footprint > minutes
+        placed.append((best, piece))
+    return placed, None
+
+
+def _optimal_table(tasks, budget):
+    """Bảng knapsack của chế độ optimal: ưu tiên trước, hòa thì nhiều phút hơn.
+    Giá trị w·(budget + 1) + phút giữ đúng thứ tự đó ở mọi sức chứa ≤ budget"""
+    durations = [task['estimated_time'] for task in tasks]
+    values = [PRIORITY_WEIGHTS.get(task['priority'], 1) * (budget + 1) + d
+              for task, d in zip(tasks, durations)]
+    return _knapsack_table(durations, values, budget)
+
+
+def _fill_optimal(free_slots, tasks, max_work_time, sessions=TASK_SESSIONS, table=None):
+    """Chọn + xếp việc để tổng trọng số ưu tiên được xếp là lớn nhất trong ngân sách max_work_time.
+
+    1. Knapsack chính xác trên số phút làm việc (ưu tiên trước, hòa thì nhiều phút hơn)
+    2. Cắt khoảng trống theo buổi, xếp vào slot bằng best-fit decreasing theo đúng luật buổi: học sâu buổi sáng (chia phiên
+       ≤ 90 phút, nghỉ 10 phút sau phiên ≥ 60 phút), họp chiều/tối, việc nhẹ sau giờ ăn trưa/chiều/tối
+    3. Không xếp vừa → bỏ việc trọng số thấp nhất đang tranh cùng slot; rồi thử thêm lại các việc
+       còn sót theo thứ tự ưu tiên nếu vừa ngân sách và vừa slot
+    Mọi bước đều đa thức (knapsack O(n·ngân sách), xếp O(n·slot)) nên 50+ việc vẫn xong trong vài ms.
+    table: bảng knapsack dựng sẵn bằng _optimal_table (trên cùng danh sách tasks) ở ngân sách
+    ≥ max_work_time — nhiều kịch bản chỉ khác ngân sách dùng chung 1 bảng
+    """
+    slots = []
+    for start, end in _split_by_session(free_slots):
+        slot_type = _slot_type(start)
+        lunch = min(LUNCH_MINUTES, end - start) if slot_type == 'Trưa' else 0
+        slots.append({'start': start, 'end': end, 'type': slot_type, 'lunch': lunch,
+                      'capacity': end - start - lunch})
+    capacities = [slot['capacity'] for slot in slots]
+    # Slot kết thúc đúng lúc slot sau bắt đầu làm việc (không có ăn trưa xen giữa): không được bỏ lần nghỉ cuối
+    keep_break = {
+        j for j in range(len(slots) - 1)
+        if slots[j]['end'] == slots[j + 1]['start'] and not slots[j + 1]['lunch']
     }
+    morning, afternoon, light = (
+        [j for j, slot in enumerate(slots) if slot['type'] in sessions[task_type]]
+        for task_type in ('Học sâu', 'Họp/Gặp mặt', 'Công việc nhẹ')
+    )
+
+    def pieces_of(i):
+        task = tasks[i]
+        minutes = task['estimated_time']
+        if task['task_type'] == 'Học sâu':
+            return [(chunk + (BREAK_MINUTES if chunk >= DEEP_BREAK_AFTER else 0), i, morning, chunk)
+                    for chunk in _deep_chunks(minutes)]
+        if task['task_type'] == 'Họp/Gặp mặt':
+            return [(minutes, i, afternoon, minutes)]
+        return [(minutes, i, light, minutes)]
+
+    weights = [PRIORITY_WEIGHTS.get(task['priority'], 1) for task in tasks]
+    durations = [task['estimated_time'] for task in tasks]
+    budget = max(max_work_time, 0)
+    selected = set(_knapsack_pick(table or _optimal_table(tasks, budget), durations, budget))
+
+    pieces = [pieces_of(i) for i in range(len(tasks))]
+
+    def try_pack(chosen):
+        return _pack([piece for i in sorted(chosen) for piece in pieces[i]], capacities, keep_break)
+
+    placed, failed = try_pack(selected)
+    while placed is None:
+        rivals = [i for i in selected if set(pieces[i][0][2]) & set(failed[2])] or [failed[1]]
+        selected.discard(min(rivals, key=lambda i: (weights[i], -durations[i], -i)))
+        placed, failed = try_pack(selected)
+
+    used = sum(durations[i] for i in selected)
+    for i in sorted(set(range(len(tasks))) - selected, key=lambda i: (-weights[i], durations[i], i)):
+        if used + durations[i] > budget:
+            continue
+        attempt, _ = try_pack(selected | {i})
+        if attempt is not None:
+            selected.add(i)
+            placed = attempt
+            used += durations[i]
+
+    # Dựng lịch từng slot: ăn trưa trước, họp trước việc nhẹ, ưu tiên cao trước
+    by_slot = {}
+    for j, piece in placed:
+        by_slot.setdefault(j, []).append(piece)
+    schedule = []
+    worked_minutes = 0
+    for j, slot in enumerate(slots):
+        current = slot['start']
+        if slot['lunch']:
+            schedule.append({
+                'start': current,
+                'end': current + slot['lunch'],
+                'task': '🍱 Ăn trưa + nghỉ ngơi',
+                'type': 'Nghỉ',
+                'priority': 'Hệ thống',
+                'color': '#10B981'
+            })
+            current += slot['lunch']
+        pieces = sorted(by_slot.get(j, []), key=lambda p: (
+            tasks[p[1]]['task_type'] != 'Họp/Gặp mặt', PRIORITY_MAP.get(tasks[p[1]]['priority'], 99), p[1]
+        ))
+        # Phần kèm nghỉ xếp cuối để lần nghỉ cuối (có thể bị bỏ khi hết chỗ) nằm ở cuối slot
+        pieces.sort(key=lambda p: p[0] > p[3])
+        slack = slot['capacity'] - sum(p[0] for p in pieces)
+        since_break = 0
+        for k, (footprint, i, _, minutes) in enumerate(pieces):
+            task = tasks[i]
+            schedule.append({
+                'start': current,
+                'end': current + minutes,
+                'task': task['name'],
+                'type': task['task_type'],
+                'priority': task['priority'],
+                'color': '#8B5CF6' if task['task_type'] == 'Họp/Gặp mặt' else get_color_by_priority(task['priority'])
+            })
+            current += minutes
+            worked_minutes += minutes
+            since_break += minutes
+            # Nghỉ sau phiên học sâu dài (đã giữ chỗ trong footprint) hoặc khi làm liền quá lâu
+            rest = footprint > minutes and (k < len(pieces) - 1 or slack >= 0)
+            if not rest and since_break >= CONTINUOUS_WORK_LIMIT and slack >= BREAK_MINUTES:
+                rest = True
+                slack -= BREAK_MINUTES
+            if rest:
+                schedule.append({
+                    'start': current,
+                    'end': current + BREAK_MINUTES,
+                    'task': '☕ Nghỉ 10 phút',
+                    'type': 'Nghỉ',
+                    'priority': 'Hệ thống',
+                    'color': '#10B981'
+                })
+                current += BREAK_MINUTES
+                since_break = 0
+
+    scheduled_tasks = [tasks[i]['name'] for i in sorted(selected)]
+    unscheduled = [task['name'] for i, task in enumerate(tasks) if i not in selected]
+    return schedule, worked_minutes, scheduled_tasks, unscheduled
+
+
+_insights_cache = LRUCache(maxsize=1024, ttl=None)
 
 
 def get_framework_insights(framework_name, tasks, energy_level):
-    """Framework-specific insights (Tiếng Việt)"""
+    """Framework-specific insights (Tiếng Việt) — cache theo đúng các trường được đọc"""
+    key = (framework_name, energy_level,
+           tuple((t['priority'], t['task_type'], t['estimated_time']) for t in tasks))
+    insights = _insights_cache.get(key)
+    if insights is MISSING:
+        insights = _framework_insights(framework_name, tasks, energy_level)
+        _insights_cache.set(key, insights)
+    return list(insights)
+
+
+def _framework_insights(framework_name, tasks, energy_level):
     insights = []
     
     if "Eisenhower" in framework_name or "Ưu tiên" in framework_name:
@@ -368,4 +829,93 @@ def get_color_by_priority(priority):
         'Trung bình': '#F59E0B',    # Vàng
         'Thấp': '#3B82F6'           # Xanh
     }
-    return colors.get(priority, '#6B7280')
\ No newline at end of file
+    return colors.get(priority, '#6B7280')
+
+
+# ===== BATCH (nhiều user, chạy đêm) =====
+
+def _records(rows):
+    """DataFrame hoặc list dict → list dict"""
+    if rows is None:
+        return []
+    if hasattr(rows, 'to_dict'):
+        return rows.to_dict('records')
+    return list(rows)
+
+
+def group_scheduling_inputs(task_rows, fixed_rows, user_options=None, user_col='username'):
+    """Gom dòng task_metadata / fixed_schedules (của CÙNG 1 ngày, nhiều user) theo user.
+
+    Trả về list (username, tasks, fixed_schedule, kwargs) theo thứ tự user xuất hiện;
+    kwargs lấy từ user_options[username] (vd. energy_level, work_start, work_end)
+    """
+    user_options = user_options or {}
+    grouped = {}
+    for row in _records(task_rows):
+        grouped.setdefault(row[user_col], ([], []))[0].append(row)
+    for row in _records(fixed_rows):
+        grouped.setdefault(row[user_col], ([], []))[1].append(row)
+    return [
+        (username, tasks, fixed, dict(user_options.get(username, {})))
+        for username, (tasks, fixed) in grouped.items()
+    ]
+
+
+def _schedule_chunk(jobs, mode):
+    """Chạy trong process con: lỗi của 1 user không làm hỏng cả chunk"""
+    results = []
+    for username, tasks, fixed, kwargs in jobs:
+        try:
+            results.append((username, create_daily_schedule(tasks, fixed, mode=mode, **kwargs), None))
+        except Exception as e:
+            results.append((username, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def schedule_batch(task_rows, fixed_rows, user_options=None, mode="greedy",
+                   max_workers=None, chunk_size=200):
+    """Xếp lịch cho nhiều user trên ProcessPoolExecutor, trả kết quả dần (generator).
+
+    Args:
+        task_rows / fixed_rows: dòng task_metadata / fixed_schedules của 1 ngày (DataFrame hoặc list dict)
+        user_options: dict username → kwargs cho create_daily_schedule
+        mode: "greedy" hoặc "optimal"
+        max_workers: số process (None = số CPU, 1 = chạy ngay trong process hiện tại)
+        chunk_size: số user mỗi lần gửi sang process con
+
+    Yields:
+        (username, kết quả create_daily_schedule) theo thứ tự chunk xong trước;
+        user lỗi dữ liệu → (username, None) và in lỗi
+    """
+    if mode not in ("greedy", "optimal"):
+        raise ValueError(f"mode không hợp lệ: {mode!r} (chọn 'greedy' hoặc 'optimal')")
+
+    jobs = group_scheduling_inputs(task_rows, fixed_rows, user_options)
+    chunks = (jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size))
+
+    def emit(results):
+        for username, result, error in results:
+            if error:
+                print(f"Lỗi schedule_batch ({username}): {error}")
+            yield username, result
+
+    if max_workers == 1:
+        for chunk in chunks:
+            yield from emit(_schedule_chunk(chunk, mode))
+        return
+
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Chỉ giữ ~2 chunk mỗi worker đang chờ để bộ nhớ không phình theo số user
+        limit = 2 * workers
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(_schedule_chunk, chunk, mode))
+            if len(pending) >= limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from emit(future.result())
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from emit(future.result())
@@ -0,0 +1,169 @@
+"""
+Kế hoạch nhiều ngày dựa trên scheduler 1 ngày.
+
+create_daily_schedule chỉ xếp 1 ngày, việc dư thành gợi ý "Có thể dời sang mai".
+plan_week nhận việc của cả tuần + lịch cố định từng ngày + năng lượng TB theo thứ
+(lịch sử daily_checkins) và rải việc sang các ngày:
+
+1. Mỗi ngày có ngân sách chống burn out riêng (khoảng trống thật của ngày đó,
+   giảm theo năng lượng thường thấy vào thứ đó) và sức chứa buổi sáng cho học sâu
+2. Giao việc cho ngày: ưu tiên cao trước; giữ ở ngày gốc nếu còn vừa, không thì
+   sang ngày (sau ngày gốc, trước hạn) còn nhiều ngân sách nhất
+3. Xếp từng ngày bằng đúng thuật toán 1 ngày; phần không xếp vừa chuyển sang ngày kế tiếp
+
+7 ngày × 50 việc chỉ là 7 lần xếp 1 ngày nên đủ nhanh để gọi mỗi lần trang tải lại.
+"""
+
+from datetime import datetime, timedelta
+
+from utils.scheduler import (
+    PRIORITY_MAP, _fill, _normalize_block, _normalize_task,
+    _prepare_day, _slot_type, _split_by_session, _summarize,
+)
+
+
+def _task_date(task, key):
+    """Ngày của task dạng 'YYYY-MM-DD' (nhận cả date/datetime), None nếu không có"""
+    value = task.get(key)
+    if value is None or value != value:     # None hoặc NaN từ DataFrame
+        return None
+    return value.strftime("%Y-%m-%d") if hasattr(value, 'strftime') else str(value)[:10]
+
+
+def _placed_minutes(entries):
+    placed = {}
+    for entry in entries:
+        if entry['type'] not in ('Cố định', 'Nghỉ'):
+            placed[entry['task']] = placed.get(entry['task'], 0) + entry['end'] - entry['start']
+    return placed
+
+
+def _add_task(day_tasks, task):
+    """Thêm việc vào 1 ngày; trùng tên (vd. việc lặp hằng ngày + phần dời từ hôm trước) thì cộng dồn thời gian"""
+    for existing in day_tasks:
+        if existing['name'] == task['name']:
+            existing['estimated_time'] += task['estimated_time']
+            return
+    day_tasks.append(dict(task))
+
+
+def plan_week(tasks, fixed_by_day, start_date, energy_by_weekday=None, days=7,
+              work_start="06:00", work_end="22:00", default_energy=5, mode="optimal", energy_profile=None):
+    """
+    Rải việc của nhiều ngày theo ngân sách chống burn out của từng ngày
+
+    Args:
+        tasks: List[dict] - Tasks với metadata; 'checkin_date' (hoặc 'date') là ngày dự định,
+               'deadline' (nếu có) là ngày muộn nhất được làm
+        fixed_by_day: dict 'YYYY-MM-DD' → List[dict] lịch cố định của ngày đó
+        start_date: str - Ngày đầu tiên của kế hoạch ('YYYY-MM-DD')
+        energy_by_weekday: dict thứ (0 = thứ 2) → năng lượng TB (thứ chưa có thì dùng default_energy)
+        days: int - Số ngày lên kế hoạch
+        default_energy: int - Năng lượng cho thứ chưa có lịch sử
+        mode: str - Cách xếp từng ngày; mặc định "optimal" vì greedy coi cả khoảng
+              trống 11:30 → 22:00 là buổi sáng nên dồn việc nhẹ/họp sang ngày sau
+        energy_profile: EnergyProfile - Hồ sơ năng lượng đã học (get_energy_profile): năng lượng
+                        dự đoán theo thứ thay cho energy_by_weekday, học sâu vào buổi tỉnh táo nhất
+
+    Returns:
+        dict: 'days' (list: date, energy, result dạng create_daily_schedule),
+              'moved' (tên → (ngày gốc, ngày mới)), 'unplanned' (tên), 'stats'
+    """
+    if mode not in ("greedy", "optimal"):
+        raise ValueError(f"mode không hợp lệ: {mode!r} (chọn 'greedy' hoặc 'optimal')")
+    energy_by_weekday = energy_by_weekday or {}
+    deep_sessions = None
+    if energy_profile is not None:
+        energy_by_weekday = {**energy_by_weekday, **energy_profile.weekday_energy()}
+        deep_sessions = energy_profile.deep_sessions()
+    first = datetime.strptime(start_date, "%Y-%m-%d")
+    dates = [(first + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+
+    # 1. Ngân sách + sức chứa buổi sáng của từng ngày
+    plan = []
+    for i, date in enumerate(dates):
+        energy = energy_by_weekday.get((first + timedelta(days=i)).weekday(), default_energy)
+        fixed = [_normalize_block(block) for block in fixed_by_day.get(date, [])]
+        day = _prepare_day([], fixed, work_start, work_end, energy, deep_sessions=deep_sessions)
+        morning = sum(
+            end - start for start, end in _split_by_session(day['free_slots'])
+            if _slot_type(start) in day['sessions']['Học sâu']
+        )
+        plan.append({'date': date, 'energy': energy, 'day': day, 'tasks': [],
+                     'budget_left': day['max_work_time'], 'morning_left': morning})
+
+    # 2. Giao việc cho ngày
+    tasks = [_normalize_task(task) for task in tasks]
+    unplanned = []
+    moved = {}
+    order = sorted(range(len(tasks)), key=lambda i: (
+        PRIORITY_MAP.get(tasks[i]['priority'], 99),
+        _task_date(tasks[i], 'checkin_date') or _task_date(tasks[i], 'date') or start_date,
+        -tasks[i]['estimated_time'], i,
+    ))
+    homes = {}
+    for i in order:
+        task = tasks[i]
+        home = max(_task_date(task, 'checkin_date') or _task_date(task, 'date') or start_date, start_date)
+        homes.setdefault(task['name'], home)
+        deadline = _task_date(task, 'deadline') or dates[-1]
+        minutes = task['estimated_time']
+        deep = task['task_type'] == 'Học sâu'
+        fits = [
+            d for d in plan
+            if home <= d['date'] <= deadline and d['budget_left'] >= minutes
+            and (not deep or d['morning_left'] >= minutes)
+        ]
+        if not fits:
+            unplanned.append(task['name'])
+            continue
+        target = next((d for d in fits if d['date'] == home), None) or max(fits, key=lambda d: d['budget_left'])
+        _add_task(target['tasks'], task)
+        target['budget_left'] -= minutes
+        if deep:
+            target['morning_left'] -= minutes
+        if target['date'] != home:
+            moved[task['name']] = (home, target['date'])
+
+    # 3. Xếp từng ngày; phần không vừa chuyển sang ngày kế tiếp (nếu còn trong hạn)
+    carry = []
+    results = []
+    for k, d in enumerate(plan):
+        day_tasks = d['tasks']
+        for task in carry:
+            _add_task(day_tasks, task)
+        day = dict(d['day'], tasks=day_tasks)
+        entries, worked, scheduled, unscheduled = _fill(day, mode)
+        placed = _placed_minutes(entries)
+        next_date = dates[k + 1] if k + 1 < len(dates) else None
+        carry, carried, dropped = [], [], []
+        for task in day_tasks:
+            if task['name'] not in unscheduled:
+                continue
+            left = task['estimated_time'] - placed.get(task['name'], 0)
+            if next_date and next_date <= (_task_date(task, 'deadline') or dates[-1]):
+                carry.append(dict(task, estimated_time=left))
+                carried.append(task['name'])
+                moved[task['name']] = (homes[task['name']], next_date)
+            else:
+                dropped.append(task['name'])
+        unplanned.extend(dropped)
+        result = _summarize(day_tasks, day['fixed_entries'] + entries, worked, scheduled, dropped,
+                            day['max_work_time'], round(d['energy']), "")
+        if carried:
+            result['suggestions'].append(f"➡️ Chuyển sang {next_date}: {', '.join(carried)}")
+        results.append({'date': d['date'], 'energy': d['energy'], 'result': result})
+
+    unplanned = list(dict.fromkeys(unplanned))
+    return {
+        'days': results,
+        'moved': moved,
+        'unplanned': unplanned,
+        'stats': {
+            'total_tasks': len(tasks),
+            'planned_tasks': sum(task['name'] not in unplanned for task in tasks),
+            'unplanned_tasks': sum(task['name'] in unplanned for task in tasks),
+            'work_minutes': sum(r['result']['stats']['actual_work_time'] for r in results),
+            'budget_minutes': sum(d['day']['max_work_time'] for d in plan),
+        }
+    }
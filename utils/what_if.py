@@ -0,0 +1,139 @@
+"""
+Giả lập "nếu... thì sao" cho lịch 1 ngày.
+
+    simulate_day(tasks, fixed_schedule, [
+        {'name': 'Năng lượng 4', 'energy_level': 4},
+        {'name': 'Bỏ báo cáo', 'drop_tasks': ['Viết báo cáo']},
+        {'name': 'Lớp lùi 1 tiếng', 'shift_fixed': {'Học trên lớp': 60}},
+    ], energy_level=7)
+
+Mỗi kịch bản là 1 biến thể của cùng 1 ngày (năng lượng khác, bỏ bớt việc, dời
+khối cố định). Thay vì gọi create_daily_schedule cho từng kịch bản:
+- mô hình khoảng trống (DayMap, free slots) dựng 1 lần cho mỗi cách đặt khối cố định
+- ngân sách chống burn out của mọi mức năng lượng tính 1 lần bằng mảng NumPy;
+  năng lượng chỉ có 3 mức ngân sách nên nhiều kịch bản trùng nhau → xếp 1 lần
+- chế độ optimal: 1 bảng knapsack cho mỗi tập việc, dùng chung cho mọi ngân sách
+- không dựng cảnh báo / gợi ý, chỉ tính thống kê để so sánh
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.intervals import clock_range, format_hhmm
+from utils.scheduler import (
+    _fill, _normalize_block, _normalize_task, _optimal_table, _prepare_day, _resolve_energy, _split_tasks,
+)
+
+BASELINE = "Hiện tại"
+
+
+def _work_budgets(total_free_minutes, energy_levels):
+    """_work_budget cho nhiều mức năng lượng cùng lúc (cùng phép nhân số thực nên kết quả khớp từng số)"""
+    energy = np.asarray(energy_levels, dtype=float)
+    factor = np.where(energy <= 3, 0.6, np.where(energy <= 6, 0.8, 1.0))
+    return (int(total_free_minutes * 0.7) * factor).astype(int)
+
+
+def _shift_blocks(fixed, shifts):
+    """Dời khối cố định theo tên: {'Học trên lớp': 60} → lùi 60 phút (số âm = sớm hơn)"""
+    if not shifts:
+        return fixed
+    shifted = []
+    for block in fixed:
+        minutes = shifts.get(block['name'], 0)
+        if minutes:
+            start, end = clock_range(block['start'], block['end'])
+            block = dict(block, start=format_hhmm(start + minutes), end=format_hhmm(end + minutes))
+        shifted.append(block)
+    return shifted
+
+
+def simulate_day(tasks_with_meta, fixed_schedule, scenarios, work_start="06:00", work_end="22:00",
+                 energy_level=5, mode="greedy", energy_profile=None):
+    """
+    So sánh nhiều kịch bản của 1 ngày
+
+    Args:
+        tasks_with_meta, fixed_schedule, work_start, work_end, energy_level, mode, energy_profile:
+            ngày gốc, như create_daily_schedule
+        scenarios: List[dict] - mỗi kịch bản gồm (đều không bắt buộc):
+            'name': tên hiển thị,
+            'energy_level': năng lượng thay cho energy_level gốc (None = như ngày gốc),
+            'drop_tasks': tên các việc bỏ đi,
+            'shift_fixed': {tên khối cố định: số phút dời (âm = sớm hơn)}
+
+    Returns:
+        DataFrame: 1 dòng / kịch bản (dòng đầu là ngày gốc "Hiện tại") với max_work_time,
+        actual_work_time, scheduled_tasks, unscheduled_tasks, breaks_count, unscheduled (tên)
+        và work_time_change / unscheduled_change so với ngày gốc
+    """
+    if mode not in ("greedy", "optimal"):
+        raise ValueError(f"mode không hợp lệ: {mode!r} (chọn 'greedy' hoặc 'optimal')")
+    deep_sessions = energy_profile.deep_sessions() if energy_profile is not None else None
+    energy_level = _resolve_energy(energy_level, energy_profile)
+    tasks = [_normalize_task(task) for task in tasks_with_meta]
+    fixed = [_normalize_block(block) for block in fixed_schedule]
+    scenarios = [{'name': BASELINE}] + list(scenarios)
+
+    # 1. Mô hình khoảng trống: 1 lần cho mỗi cách đặt khối cố định
+    days = {}
+    plans = []
+    for scenario in scenarios:
+        shifts = scenario.get('shift_fixed') or {}
+        fixed_key = tuple(sorted(shifts.items()))
+        if fixed_key not in days:
+            days[fixed_key] = _prepare_day([], _shift_blocks(fixed, shifts), work_start, work_end,
+                                           energy_level, deep_sessions=deep_sessions)
+        dropped = frozenset(scenario.get('drop_tasks') or ())
+        energy = scenario.get('energy_level')
+        plans.append((fixed_key, dropped, energy_level if energy is None else energy))
+
+    # 2. Ngân sách của mọi kịch bản cùng lúc
+    budgets = np.empty(len(plans), dtype=int)
+    for fixed_key, day in days.items():
+        members = [k for k, plan in enumerate(plans) if plan[0] == fixed_key]
+        total_free = sum(slot['duration'] for slot in day['free_slots'])
+        budgets[members] = _work_budgets(total_free, [plans[k][2] for k in members])
+
+    # 3. Xếp: kịch bản trùng (khối cố định, tập việc, ngân sách) chỉ xếp 1 lần;
+    #    optimal dựng 1 bảng knapsack cho mỗi (khối cố định, tập việc) ở ngân sách lớn nhất
+    table_budgets = {}
+    for k, (fixed_key, dropped, _) in enumerate(plans):
+        table_budgets[fixed_key, dropped] = max(table_budgets.get((fixed_key, dropped), 0), int(budgets[k]))
+    tables = {}
+    outcomes = {}
+    rows = []
+    for k, (fixed_key, dropped, energy) in enumerate(plans):
+        budget = int(budgets[k])
+        key = (fixed_key, dropped, budget)
+        if key not in outcomes:
+            kept = [task for task in tasks if task['name'] not in dropped]
+            day = dict(days[fixed_key], tasks=kept)
+            table = None
+            if mode == "optimal":
+                if (fixed_key, dropped) not in tables:
+                    ordered = [task for group in _split_tasks(kept) for task in group]   # thứ tự _fill dùng
+                    tables[fixed_key, dropped] = _optimal_table(ordered, table_budgets[fixed_key, dropped])
+                table = tables[fixed_key, dropped]
+            entries, worked, scheduled, unscheduled = _fill(day, mode, budget, table=table)
+            outcomes[key] = {
+                'actual_work_time': worked,
+                'scheduled_tasks': len(scheduled),
+                'unscheduled_tasks': len(unscheduled),
+                'breaks_count': sum(entry['type'] == 'Nghỉ' for entry in entries),
+                'unscheduled': unscheduled,
+            }
+        rows.append((scenarios[k].get('name', f"Kịch bản {k}"), energy, budget, outcomes[key]))
+
+    base = rows[0][3]
+    return pd.DataFrame({
+        'scenario': [name for name, _, _, _ in rows],
+        'energy_level': [energy for _, energy, _, _ in rows],
+        'max_work_time': [budget for _, _, budget, _ in rows],
+        **{column: [outcome[column] for _, _, _, outcome in rows]
+           for column in ('actual_work_time', 'scheduled_tasks', 'unscheduled_tasks', 'breaks_count')},
+        # mỗi dòng 1 list riêng dù các kịch bản trùng nhau dùng chung kết quả
+        'unscheduled': [list(outcome['unscheduled']) for _, _, _, outcome in rows],
+        'work_time_change': [outcome['actual_work_time'] - base['actual_work_time'] for _, _, _, outcome in rows],
+        'unscheduled_change': [outcome['unscheduled_tasks'] - base['unscheduled_tasks'] for _, _, _, outcome in rows],
+    })